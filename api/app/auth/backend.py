@@ -9,17 +9,29 @@ from starlette.authentication import (
 from dbmanager.dbmanager import DBManager
 
 import exceptions as exc
+import concurrency
+from concurrency import run_blocking
 from auth.models import DDSUser
+from auth.principals import Principal, hash_api_key, make_principal_cache
 from auth import scopes
 
+principal_cache = make_principal_cache()
+DBManager.add_user_change_listener(principal_cache.invalidate)
+
 
 class DDSAuthenticationBackend(AuthenticationBackend):
-    """Class managing authentication and authorization"""
+    """Class managing authentication and authorization.
+    Authenticated principals are cached, so polling requests
+    do not hit the database each time."""
 
     async def authenticate(self, conn):
         """Authenticate user based on `User-Token` header"""
         if "User-Token" in conn.headers:
-            return self._manage_user_token_auth(conn.headers["User-Token"])
+            return await run_blocking(
+                concurrency.AUTH,
+                self._manage_user_token_auth,
+                conn.headers["User-Token"],
+            )
         return AuthCredentials([scopes.ANONYMOUS]), UnauthenticatedUser()
 
     def _manage_user_token_auth(self, user_token: str):
@@ -27,15 +39,44 @@ class DDSAuthenticationBackend(AuthenticationBackend):
             user_id, api_key = self.get_authorization_scheme_param(user_token)
         except exc.BaseDDSException as err:
             raise err.wrap_around_http_exception()
-        user_dto = DBManager().get_user_details(user_id)
-        eligible_scopes = [scopes.AUTHENTICATED] + self._get_scopes_for_user(
-            user_dto=user_dto
-        )
-        if user_dto.api_key != api_key:
+        principal = principal_cache.get(user_id)
+        if principal is not None and principal_cache.is_rejected(
+            user_id, api_key
+        ):
+            raise exc.AuthenticationFailed(
+                user_id
+            ).wrap_around_http_exception()
+        if principal is None or not principal.verify(api_key):
+            # NOTE: on the API key mismatch, the principal is reloaded
+            # once in case the key was changed in the meantime
+            principal = self._load_principal(user_id)
+            if principal is not None and not principal.verify(api_key):
+                principal_cache.put_rejected(user_id, api_key)
+        if principal is None or not principal.verify(api_key):
             raise exc.AuthenticationFailed(
-                user_dto
+                user_id
             ).wrap_around_http_exception()
-        return AuthCredentials(eligible_scopes), DDSUser(username=user_id)
+        return AuthCredentials(list(principal.scopes)), DDSUser(
+            username=user_id
+        )
+
+    def _load_principal(self, user_id: str) -> Principal | None:
+        if principal_cache.is_unknown(user_id):
+            return None
+        user_dto = DBManager().get_user_details(user_id)
+        if user_dto is None:
+            principal_cache.put_unknown(user_id)
+            return None
+        principal = Principal(
+            user_id=user_id,
+            api_key_hash=hash_api_key(user_dto.api_key),
+            scopes=tuple(
+                [scopes.AUTHENTICATED]
+                + self._get_scopes_for_user(user_dto=user_dto)
+            ),
+        )
+        principal_cache.put(principal)
+        return principal
 
     def _get_scopes_for_user(self, user_dto) -> list[str]:
         if user_dto is None:
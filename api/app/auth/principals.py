@@ -0,0 +1,142 @@
+"""The module contains the in-process cache of authenticated principals"""
+import os
+import hmac
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from datastore.cache import TTLCache
+
+DEFAULT_AUTH_CACHE_TTL_SEC = 60
+DEFAULT_AUTH_CACHE_NEGATIVE_TTL_SEC = 10
+DEFAULT_AUTH_CACHE_MAX_ENTRIES = 10_000
+_MAX_REJECTED_KEYS_PER_USER = 16
+
+
+def hash_api_key(api_key: str) -> str:
+    """Compute SHA-256 digest of the API key"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authentication details of the user. Only the hash of the API key
+    is kept in memory."""
+
+    user_id: str
+    api_key_hash: str
+    scopes: tuple[str, ...]
+
+    def verify(self, api_key: str) -> bool:
+        """Check if the API key matches the one of the user"""
+        return hmac.compare_digest(self.api_key_hash, hash_api_key(api_key))
+
+
+class PrincipalCache:
+    """Thread-safe cache of principals keyed by the user ID.
+
+    Unknown user IDs and API keys rejected for known users are cached,
+    too (with the separate, usually shorter TTL), so requests with
+    non-existing users or wrong keys do not hit the database each time.
+
+    Parameters
+    ----------
+    ttl : float
+        Time to live (in seconds) of known principals
+    negative_ttl : float
+        Time to live (in seconds) of unknown user IDs and rejected keys
+    max_entries : int, optional
+        Maximum number of entries of known and of unknown users
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_AUTH_CACHE_TTL_SEC,
+        negative_ttl: float = DEFAULT_AUTH_CACHE_NEGATIVE_TTL_SEC,
+        max_entries: Optional[int] = DEFAULT_AUTH_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self._principals = TTLCache(ttl=ttl, max_entries=max_entries)
+        self._unknown = TTLCache(ttl=negative_ttl, max_entries=max_entries)
+        self._rejected = TTLCache(ttl=negative_ttl, max_entries=max_entries)
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return str(user_id).lower()
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        """Get the cached principal or `None` if not cached"""
+        return self._principals.get(self._key(user_id))
+
+    def is_unknown(self, user_id: str) -> bool:
+        """Check if the user ID was recently found not to exist"""
+        return self._unknown.get(self._key(user_id), False)
+
+    def is_rejected(self, user_id: str, api_key: str) -> bool:
+        """Check if the API key was recently rejected for the user"""
+        rejected = self._rejected.get(self._key(user_id), frozenset())
+        return hash_api_key(api_key) in rejected
+
+    def put(self, principal: Principal) -> None:
+        """Cache the principal"""
+        key = self._key(principal.user_id)
+        self._unknown.invalidate(key)
+        self._rejected.invalidate(key)
+        self._principals.put(key, principal)
+
+    def put_rejected(self, user_id: str, api_key: str) -> None:
+        """Cache the API key as rejected for the user"""
+        key = self._key(user_id)
+        rejected = self._rejected.get(key, frozenset())
+        if len(rejected) >= _MAX_REJECTED_KEYS_PER_USER:
+            # NOTE: the user is not tracked by keys tried at random
+            rejected = frozenset()
+        self._rejected.put(key, rejected | {hash_api_key(api_key)})
+
+    def put_unknown(self, user_id: str) -> None:
+        """Cache the user ID as not existing"""
+        key = self._key(user_id)
+        self._principals.invalidate(key)
+        self._rejected.invalidate(key)
+        self._unknown.put(key, True)
+
+    def invalidate(self, user_id) -> None:
+        """Remove all cached information about the user"""
+        key = self._key(user_id)
+        self._principals.invalidate(key)
+        self._unknown.invalidate(key)
+        self._rejected.invalidate(key)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._principals.clear()
+        self._unknown.clear()
+        self._rejected.clear()
+
+    def stats(self) -> dict:
+        """Get statistics of cached known and unknown users"""
+        return {
+            "principals": self._principals.stats(),
+            "unknown": self._unknown.stats(),
+            "rejected": self._rejected.stats(),
+        }
+
+
+def make_principal_cache() -> PrincipalCache:
+    """Create the principal cache configured with environment variables.
+    `AUTH_CACHE_TTL_SEC=0` effectively disables caching."""
+    return PrincipalCache(
+        ttl=float(
+            os.environ.get("AUTH_CACHE_TTL_SEC", DEFAULT_AUTH_CACHE_TTL_SEC)
+        ),
+        negative_ttl=float(
+            os.environ.get(
+                "AUTH_CACHE_NEGATIVE_TTL_SEC",
+                DEFAULT_AUTH_CACHE_NEGATIVE_TTL_SEC,
+            )
+        ),
+        max_entries=int(
+            os.environ.get(
+                "AUTH_CACHE_MAX_ENTRIES", DEFAULT_AUTH_CACHE_MAX_ENTRIES
+            )
+        ),
+    )
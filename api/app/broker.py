@@ -0,0 +1,205 @@
+"""Module with the pooled, persistent publisher of broker messages"""
+import os
+import queue
+import threading
+from typing import Optional
+
+import pika
+from pika.exceptions import AMQPError
+
+from utils.api_logging import get_dds_logger
+
+log = get_dds_logger(__name__)
+
+DEFAULT_BROKER_POOL_SIZE = 4
+DEFAULT_BROKER_POOL_TIMEOUT_SEC = 10.0
+DEFAULT_BROKER_HEARTBEAT_SEC = 60
+
+
+class BrokerUnavailableError(Exception):
+    """Raised if the message could not be published to the broker"""
+
+
+class _PublisherChannel:
+    """Single long-lived connection with the channel in the confirm mode.
+
+    `pika.BlockingConnection` is not thread-safe, so each instance is
+    used by one thread at a time (guaranteed by `BrokerPublisher`).
+    """
+
+    def __init__(self, parameters: pika.ConnectionParameters) -> None:
+        self._parameters = parameters
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._channel = None
+        self._declared_queues: set[str] = set()
+
+    def _ensure_open(self) -> None:
+        if self._connection is not None and self._connection.is_open:
+            # NOTE: blocking connection handles heartbeats only when used,
+            # so process pending events to detect connections dropped
+            # by the broker while idle
+            self._connection.process_data_events(time_limit=0)
+            if self._channel is not None and self._channel.is_open:
+                return
+        self.close()
+        self._connection = pika.BlockingConnection(self._parameters)
+        self._channel = self._connection.channel()
+        self._channel.confirm_delivery()
+
+    def _declare_queue(self, name: str) -> None:
+        # NOTE: messages published to queues not declared yet (e.g. before
+        # any executor consumes them) would be dropped by the broker
+        if name in self._declared_queues:
+            return
+        self._channel.queue_declare(queue=name, durable=True)
+        self._declared_queues.add(name)
+
+    def publish(self, routing_key: str, body: str) -> None:
+        """Publish the persistent message and wait for the broker confirm"""
+        self._ensure_open()
+        self._declare_queue(routing_key)
+        self._channel.basic_publish(
+            exchange="",
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # make message persistent
+            ),
+        )
+
+    def close(self) -> None:
+        """Close the connection, ignoring errors"""
+        if self._connection is not None and self._connection.is_open:
+            try:
+                self._connection.close()
+            except AMQPError:
+                log.debug(
+                    "error while closing broker connection", exc_info=True
+                )
+        self._connection = None
+        self._channel = None
+        self._declared_queues.clear()
+
+
+class BrokerPublisher:
+    """Thread-safe pool of persistent broker connections.
+
+    Connections are opened lazily and reused across requests. Each message
+    is published with the publisher confirm. If publishing fails,
+    the connection is reopened and publishing is retried once.
+
+    Parameters
+    ----------
+    host : str
+        Host of the broker
+    pool_size : int
+        Maximum number of open connections
+    timeout : float
+        Maximum time (in seconds) to wait for the free connection
+    """
+
+    def __init__(
+        self,
+        host: str,
+        pool_size: int = DEFAULT_BROKER_POOL_SIZE,
+        timeout: float = DEFAULT_BROKER_POOL_TIMEOUT_SEC,
+    ) -> None:
+        self.timeout = timeout
+        parameters = pika.ConnectionParameters(
+            host=host,
+            heartbeat=int(
+                os.environ.get(
+                    "BROKER_HEARTBEAT_SEC", DEFAULT_BROKER_HEARTBEAT_SEC
+                )
+            ),
+            blocked_connection_timeout=timeout,
+        )
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(_PublisherChannel(parameters))
+
+    def publish(self, routing_key: str, body: str) -> None:
+        """Publish the persistent message to the queue
+
+        Parameters
+        ----------
+        routing_key : str
+            Name of the queue
+        body : str
+            Content of the message
+
+        Raises
+        -------
+        BrokerUnavailableError
+            If the message could not be published
+        """
+        try:
+            channel = self._pool.get(timeout=self.timeout)
+        except queue.Empty as err:
+            raise BrokerUnavailableError(
+                "no broker connection available"
+            ) from err
+        try:
+            for attempt in (1, 2):
+                try:
+                    channel.publish(routing_key=routing_key, body=body)
+                    return
+                except AMQPError as err:
+                    log.warning(
+                        "publishing to `%s` failed (attempt %d): %s",
+                        routing_key,
+                        attempt,
+                        err,
+                    )
+                    channel.close()
+                    last_error = err
+            raise BrokerUnavailableError(
+                f"could not publish message to `{routing_key}`"
+            ) from last_error
+        finally:
+            self._pool.put(channel)
+
+    def close(self) -> None:
+        """Close all open connections"""
+        channels = []
+        while True:
+            try:
+                channels.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        for channel in channels:
+            channel.close()
+            self._pool.put(channel)
+
+
+_publisher: Optional[BrokerPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher() -> BrokerPublisher:
+    """Get the publisher shared by the API process"""
+    global _publisher  # pylint: disable=global-statement
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = BrokerPublisher(
+                host=os.getenv("BROKER_SERVICE_HOST", "broker"),
+                pool_size=int(
+                    os.environ.get(
+                        "BROKER_POOL_SIZE", DEFAULT_BROKER_POOL_SIZE
+                    )
+                ),
+                timeout=float(
+                    os.environ.get(
+                        "BROKER_POOL_TIMEOUT_SEC",
+                        DEFAULT_BROKER_POOL_TIMEOUT_SEC,
+                    )
+                ),
+            )
+        return _publisher
+
+
+def close_publisher() -> None:
+    """Close connections of the shared publisher"""
+    with _publisher_lock:
+        if _publisher is not None:
+            _publisher.close()
@@ -1 +1,2 @@
 from .on_startup import all_onstartup_callbacks
+from .on_shutdown import all_onshutdown_callbacks
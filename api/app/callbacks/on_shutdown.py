@@ -0,0 +1,20 @@
+"""Module with functions call during API server shutdown"""
+from utils.api_logging import get_dds_logger
+
+from broker import close_publisher
+from status_events import get_hub
+
+log = get_dds_logger(__name__)
+
+
+def _close_broker_connections() -> None:
+    log.info("closing broker connections...")
+    close_publisher()
+
+
+def _stop_status_events_hub() -> None:
+    log.info("stopping request status events hub...")
+    get_hub().stop()
+
+
+all_onshutdown_callbacks = [_close_broker_connections, _stop_status_events_hub]
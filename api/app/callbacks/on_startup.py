@@ -1,15 +1,31 @@
 """Module with functions call during API server startup"""
+import os
+import asyncio
+
 from utils.api_logging import get_dds_logger
+from utils.env import is_true
 
 from datastore.datastore import Datastore
 
+from status_events import get_hub
+
 log = get_dds_logger(__name__)
 
 
 def _load_cache() -> None:
-    log.info("loading cache started...")
-    Datastore()._load_cache()
-    log.info("cache loaded succesfully!")
+    log.info("building catalog snapshot...")
+    data_store = Datastore()
+    _ = data_store.snapshot
+    if not is_true(os.environ.get("CACHE_WARMUP_ON_STARTUP", True)):
+        log.info("catalog snapshot built. products will be cached lazily")
+        return
+    log.info("catalog snapshot built. loading cache in the background...")
+    data_store.start_cache_warmup()
+
+
+async def _start_status_events_hub() -> None:
+    log.info("starting request status events hub...")
+    get_hub().start(asyncio.get_running_loop())
 
 
-all_onstartup_callbacks = [_load_cache]
+all_onstartup_callbacks = [_load_cache, _start_status_events_hub]
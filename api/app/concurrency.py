@@ -0,0 +1,103 @@
+"""Module with utilities running blocking code outside the event loop.
+
+Handlers of the API use synchronous DB, catalog and broker clients.
+They are executed in worker threads, with the concurrency bounded per
+group of endpoints. Heavy endpoints (e.g. estimates) cannot then exhaust
+threads needed by light ones (e.g. status checks).
+
+The limit for each group can be set with the environment variable
+`API_MAX_CONCURRENCY_<GROUP>`, e.g. `API_MAX_CONCURRENCY_ESTIMATE=2`.
+"""
+import os
+import functools
+from typing import Any, Callable
+
+import anyio
+import anyio.to_thread
+
+from utils.api_logging import get_dds_logger
+
+log = get_dds_logger(__name__)
+
+AUTH = "auth"
+CATALOG = "catalog"
+ESTIMATE = "estimate"
+EXECUTE = "execute"
+DIRECT_QUERY = "direct_query"
+REQUESTS = "requests"
+DOWNLOAD = "download"
+
+DEFAULT_MAX_CONCURRENCY = {
+    AUTH: 32,
+    CATALOG: 16,
+    ESTIMATE: 4,
+    EXECUTE: 8,
+    DIRECT_QUERY: 4,
+    REQUESTS: 32,
+    DOWNLOAD: 16,
+}
+
+_limiters: dict[str, anyio.CapacityLimiter] = {}
+
+
+def get_max_concurrency(group: str) -> int:
+    """Get the maximal number of concurrent threads for the group"""
+    return int(
+        os.environ.get(
+            f"API_MAX_CONCURRENCY_{group.upper()}",
+            DEFAULT_MAX_CONCURRENCY[group],
+        )
+    )
+
+
+def get_limiter(group: str) -> anyio.CapacityLimiter:
+    """Get the capacity limiter of the group of endpoints.
+    Limiters are created lazily, as they need the running event loop.
+    The method is always called from the event loop thread."""
+    if (limiter := _limiters.get(group)) is None:
+        limiter = anyio.CapacityLimiter(get_max_concurrency(group))
+        _limiters[group] = limiter
+        log.debug(
+            "concurrency limit for `%s` set to %d",
+            group,
+            limiter.total_tokens,
+        )
+    return limiter
+
+
+async def run_blocking(
+    group: str, func: Callable, *args: Any, **kwargs: Any
+) -> Any:
+    """Run the blocking function in the worker thread, waiting for
+    the free slot of the group of endpoints
+
+    Parameters
+    ----------
+    group : str
+        Name of the group of endpoints limiting the concurrency
+    func : callable
+        Blocking function
+    *args, **kwargs
+        Arguments passed to the function
+
+    Returns
+    -------
+    result : Any
+        Result of the function
+    """
+    return await anyio.to_thread.run_sync(
+        functools.partial(func, *args, **kwargs),
+        limiter=get_limiter(group),
+    )
+
+
+def limiters_stats() -> dict[str, dict[str, float]]:
+    """Get the number of busy threads and waiting tasks per group"""
+    return {
+        group: {
+            "borrowed": limiter.borrowed_tokens,
+            "total": limiter.total_tokens,
+            "waiting": limiter.statistics().tasks_waiting,
+        }
+        for group, limiter in _limiters.items()
+    }
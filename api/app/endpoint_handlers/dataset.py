@@ -1,9 +1,22 @@
 """Modules realizing logic for dataset-related endpoints"""
 import os
-import pika
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timedelta
 from typing import Optional
 
-from dbmanager.dbmanager import DBManager
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from geokube.core.datacube import DataCube
+from geokube.core.dataset import Dataset
+from geokube.core.field import Field
+
+from dbmanager.dbmanager import DBManager, RequestStatus
 from geoquery.geoquery import GeoQuery
 from geoquery.task import TaskList
 from datastore.datastore import Datastore, DEFAULT_MAX_REQUEST_SIZE_GB
@@ -11,10 +24,8 @@ from datastore import exception as datastore_exception
 
 from utils.metrics import log_execution_time
 from utils.api_logging import get_dds_logger
-from auth.manager import (
-    is_role_eligible_for_product,
-)
 import exceptions as exc
+from broker import get_publisher, BrokerUnavailableError
 from api_utils import make_bytes_readable_dict
 from validation import assert_product_exists
 
@@ -23,16 +34,75 @@ log = get_dds_logger(__name__)
 data_store = Datastore()
 
 MESSAGE_SEPARATOR = os.environ["MESSAGE_SEPARATOR"]
+# NOTE: finished requests older than that are not reused. `0` disables
+# the reuse of requests
+REQUEST_REUSE_MAX_AGE_SEC = int(
+    os.environ.get("REQUEST_REUSE_MAX_AGE_SEC", 24 * 60 * 60)
+)
+# NOTE: requests are routed to lanes by their estimated size, so small
+# requests are not blocked by large ones. Executors drain lanes with
+# configurable weights
+QUERY_QUEUE = "query_queue"
+QUERY_SMALL_QUEUE = "query_small_queue"
+SMALL_REQUEST_MAX_BYTES = int(
+    os.environ.get("SMALL_REQUEST_MAX_BYTES", 100 * 1024**2)
+)
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+# NOTE: queries estimated below that size can be computed by the API
+# and streamed directly to the client. `0` disables direct queries
+DIRECT_QUERY_MAX_BYTES = int(
+    os.environ.get("DIRECT_QUERY_MAX_BYTES", 10 * 1024**2)
+)
+DIRECT_QUERY_TMP_DIR = os.environ.get("DIRECT_QUERY_TMP_DIR")
+_DIRECT_QUERY_FORMATS = {
+    "netcdf": ("nc", "application/x-netcdf"),
+    "geojson": ("json", "application/geo+json"),
+    "csv": ("csv", "text/csv"),
+}
+
+# NOTE: serialized `GET /datasets` responses keyed by the catalog version
+# and the set of user's roles
+_datasets_listing_cache: dict[tuple[str, frozenset[str]], bytes] = {}
+_datasets_listing_lock = threading.Lock()
+
+
+def _list_eligible_datasets(user_roles_names: list[str]) -> list[dict]:
+    eligible_products = data_store.eligible_products(role=user_roles_names)
+    datasets = []
+    for dataset_id in data_store.dataset_list():
+        log.debug(
+            "getting info and eligible products for `%s`",
+            dataset_id,
+        )
+        dataset_info = data_store.dataset_info(dataset_id=dataset_id)
+        eligible_prods = {
+            prod_name: prod_info
+            for prod_name, prod_info in dataset_info["products"].items()
+            if (dataset_id, prod_name) in eligible_products
+        }
+        if len(eligible_prods) == 0:
+            log.debug(
+                "no eligible products for dataset `%s` for the role `%s`."
+                " dataset skipped",
+                dataset_id,
+                user_roles_names,
+            )
+            continue
+        dataset_info["products"] = eligible_prods
+        datasets.append(dataset_info)
+    return datasets
 
 
 @log_execution_time(log)
-def get_datasets(user_roles_names: list[str]) -> list[dict]:
+def get_datasets(user_roles_names: list[str]) -> Response:
     """Realize the logic for the endpoint:
 
     `GET /datasets`
 
     Get datasets names, their metadata and products names (if eligible for a user).
     If no eligible products are found for a dataset, it is not included.
+    Serialized listing is cached per catalog version and set of user's roles.
 
     Parameters
     ----------
@@ -41,55 +111,26 @@ def get_datasets(user_roles_names: list[str]) -> list[dict]:
 
     Returns
     -------
-    datasets : list of dict
-        A list of dictionaries with datasets information (including metadata and
-        eligible products lists)
-
-    Raises
-    -------
-    MissingKeyInCatalogEntryError
-        If the dataset catalog entry does not contain the required key
+    response : fastapi.Response
+        JSON response with a list of dictionaries with datasets information
+        (including metadata and eligible products lists)
     """
     log.debug(
         "getting all eligible products for datasets...",
     )
-    datasets = []
-    for dataset_id in data_store.dataset_list():
-        log.debug(
-            "getting info and eligible products for `%s`",
-            dataset_id,
-        )
-        dataset_info = data_store.dataset_info(dataset_id=dataset_id)
-        try:
-            eligible_prods = {
-                prod_name: prod_info
-                for prod_name, prod_info in dataset_info["products"].items()
-                if is_role_eligible_for_product(
-                    product_role_name=prod_info.get("role"),
-                    user_roles_names=user_roles_names,
-                )
-            }
-        except KeyError as err:
-            log.error(
-                "dataset `%s` does not have products defined",
-                dataset_id,
-                exc_info=True,
-            )
-            raise exc.MissingKeyInCatalogEntryError(
-                key="products", dataset=dataset_id
-            ) from err
-        else:
-            if len(eligible_prods) == 0:
-                log.debug(
-                    "no eligible products for dataset `%s` for the role `%s`."
-                    " dataset skipped",
-                    dataset_id,
-                    user_roles_names,
-                )
-            else:
-                dataset_info["products"] = eligible_prods
-                datasets.append(dataset_info)
-    return datasets
+    key = (data_store.catalog_version, frozenset(user_roles_names or ()))
+    if (content := _datasets_listing_cache.get(key)) is None:
+        log.debug("listing for roles `%s` not cached", user_roles_names)
+        content = json.dumps(
+            jsonable_encoder(_list_eligible_datasets(user_roles_names))
+        ).encode("utf-8")
+        with _datasets_listing_lock:
+            for stale_key in [
+                k for k in _datasets_listing_cache if k[0] != key[0]
+            ]:
+                del _datasets_listing_cache[stale_key]
+            _datasets_listing_cache[key] = content
+    return Response(content=content, media_type="application/json")
 
 
 @log_execution_time(log)
@@ -211,6 +252,101 @@ def estimate(
     )
 
 
+def _route_request(estimate_size_bytes: Optional[int]) -> tuple[str, int]:
+    """Get the queue and the priority of the request of the given
+    estimated size"""
+    if (
+        estimate_size_bytes is not None
+        and estimate_size_bytes <= SMALL_REQUEST_MAX_BYTES
+    ):
+        return QUERY_SMALL_QUEUE, PRIORITY_HIGH
+    return QUERY_QUEUE, PRIORITY_NORMAL
+
+
+def _submit_request(
+    request_id: int, message: str, routing_key: str = QUERY_QUEUE
+) -> None:
+    """Publish the message of the request to the queue of the broker.
+    If it fails, the request is marked as failed."""
+    try:
+        get_publisher().publish(routing_key=routing_key, body=message)
+    except BrokerUnavailableError as err:
+        log.error(
+            "request `%s` could not be submitted: %s",
+            request_id,
+            err,
+        )
+        DBManager().update_request(
+            request_id=request_id,
+            worker_id=None,
+            status=RequestStatus.FAILED,
+            fail_reason="Request could not be submitted for execution",
+        )
+        raise exc.RequestSubmissionFailed(request_id=request_id) from err
+
+
+def _compute_query_hash(
+    dataset_id: str, product_id: str, query: GeoQuery
+) -> str:
+    """Compute the hash identifying the result of the query. It includes
+    the catalog version, so the results are not reused across catalog
+    changes."""
+    key = json.dumps(
+        [
+            data_store.catalog_version,
+            dataset_id,
+            product_id,
+            query.canonical(),
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _create_request(
+    user_id: str,
+    dataset_id: str,
+    product_id: str,
+    query: GeoQuery,
+    estimate_size_bytes: int,
+    priority: int,
+) -> tuple[int, bool]:
+    """Create the request, linked to the identical one being done (with
+    the resulting file still available) or pending if there is any.
+    Returns ID of the new request and whether it should be executed."""
+    query_hash = _compute_query_hash(dataset_id, product_id, query)
+    if REQUEST_REUSE_MAX_AGE_SEC <= 0:
+        request_id = DBManager().create_request(
+            user_id=user_id,
+            dataset=dataset_id,
+            product=product_id,
+            query=query.original_query_json(),
+            query_hash=query_hash,
+            estimate_size_bytes=estimate_size_bytes,
+            priority=priority,
+        )
+        return request_id, True
+    request_id, reused_request_id = DBManager().create_or_link_request(
+        user_id=user_id,
+        dataset=dataset_id,
+        product=product_id,
+        query=query.original_query_json(),
+        query_hash=query_hash,
+        created_after=datetime.utcnow()
+        - timedelta(seconds=REQUEST_REUSE_MAX_AGE_SEC),
+        estimate_size_bytes=estimate_size_bytes,
+        priority=priority,
+    )
+    if reused_request_id is None:
+        return request_id, True
+    log.info(
+        "request `%s` reuses the request `%s`",
+        request_id,
+        reused_request_id,
+    )
+    return request_id, False
+
+
 @log_execution_time(log)
 @assert_product_exists
 def query(
@@ -224,6 +360,9 @@ def query(
     `POST /datasets/{dataset_id}/{product_id}/execute`
 
     Query the data and return the ID of the request.
+    If the identical query was already executed (and its result is still
+    available) or is pending, the new request is linked to it
+    and the query is not executed again.
 
     Parameters
     ----------
@@ -247,7 +386,8 @@ def query(
         if the allowed size is below the estimated one
     EmptyDatasetError
         if estimated size is zero
-
+    RequestSubmissionFailed
+        if the request could not be published to the broker
     """
     log.debug("geoquery: %s", query)
     estimated_size = estimate(dataset_id, product_id, query, "GB").get("value")
@@ -265,34 +405,26 @@ def query(
         raise exc.EmptyDatasetError(
             dataset_id=dataset_id, product_id=product_id
         )
-    broker_conn = pika.BlockingConnection(
-        pika.ConnectionParameters(
-            host=os.getenv("BROKER_SERVICE_HOST", "broker")
-        )
-    )
-    broker_channel = broker_conn.channel()
-
-    request_id = DBManager().create_request(
+    estimate_size_bytes = data_store.estimate(dataset_id, product_id, query)
+    routing_key, priority = _route_request(estimate_size_bytes)
+    request_id, to_execute = _create_request(
         user_id=user_id,
-        dataset=dataset_id,
-        product=product_id,
-        query=query.original_query_json(),
+        dataset_id=dataset_id,
+        product_id=product_id,
+        query=query,
+        estimate_size_bytes=estimate_size_bytes,
+        priority=priority,
     )
+    if not to_execute:
+        return request_id
 
     # TODO: find a separator; for the moment use "\"
     message = MESSAGE_SEPARATOR.join(
         [str(request_id), "query", dataset_id, product_id, query.json()]
     )
-
-    broker_channel.basic_publish(
-        exchange="",
-        routing_key="query_queue",
-        body=message,
-        properties=pika.BasicProperties(
-            delivery_mode=2,  # make message persistent
-        ),
+    _submit_request(
+        request_id=request_id, message=message, routing_key=routing_key
     )
-    broker_conn.close()
     return request_id
 
 
@@ -325,34 +457,133 @@ def run_workflow(
         if the allowed size is below the estimated one
     EmptyDatasetError
         if estimated size is zero
-
+    RequestSubmissionFailed
+        if the request could not be published to the broker
     """
     log.debug("geoquery: %s", workflow)
-    broker_conn = pika.BlockingConnection(
-        pika.ConnectionParameters(
-            host=os.getenv("BROKER_SERVICE_HOST", "broker")
-        )
-    )
-    broker_channel = broker_conn.channel()
     request_id = DBManager().create_request(
         user_id=user_id,
         dataset=workflow.dataset_id,
         product=workflow.product_id,
         query=workflow.json(),
+        priority=PRIORITY_NORMAL,
     )
 
     # TODO: find a separator; for the moment use "\"
     message = MESSAGE_SEPARATOR.join(
         [str(request_id), "workflow", workflow.json()]
     )
+    _submit_request(request_id=request_id, message=message)
+    return request_id
+
+
+def _write_direct_query_result(
+    kube: DataCube, out_format: str, path: str
+) -> None:
+    match out_format:
+        case "netcdf":
+            kube.to_netcdf(path)
+        case "geojson":
+            kube.to_geojson(path)
+        case "csv":
+            kube.to_xarray().to_dataframe().to_csv(path)
+
+
+@log_execution_time(log)
+@assert_product_exists
+def stream_query(
+    user_roles_names: list[str],
+    dataset_id: str,
+    product_id: str,
+    query: GeoQuery,
+):
+    """Realize the logic for the endpoint:
+
+    `POST /datasets/{dataset_id}/{product_id}/stream`
+
+    Compute the small query in the API process and stream the result
+    to the client. Neither the broker nor the downloads volume is used.
+    The result is written to the temporary file removed once sent.
+
+    Parameters
+    ----------
+    user_roles_names : list of str
+        List of user's roles
+    dataset_id : str
+        ID of the dataset
+    product_id : str
+        ID of the product
+    query : GeoQuery
+        Query to perform. The format can be `netcdf` (default),
+        `geojson` or `csv`
 
-    broker_channel.basic_publish(
-        exchange="",
-        routing_key="query_queue",
-        body=message,
-        properties=pika.BasicProperties(
-            delivery_mode=2,  # make message persistent
-        ),
+    Returns
+    -------
+    response : FileResponse
+        The response with the result of the query
+
+    Raises
+    -------
+    AuthorizationFailed
+        If user is not authorized for the product
+    DirectQueryTooLargeError
+        If the estimated size exceeds the direct query limit
+    DirectQueryUnsupportedError
+        If the format or the type of the result is not supported
+    EmptyDatasetError
+        if estimated size is zero
+    """
+    if not data_store.is_product_valid_for_role(
+        dataset_id, product_id, role=user_roles_names
+    ):
+        raise exc.AuthorizationFailed
+    out_format = (query.format or "netcdf").lower()
+    if out_format not in _DIRECT_QUERY_FORMATS:
+        raise exc.DirectQueryUnsupportedError(
+            reason=f"format `{out_format}` is not supported"
+        )
+    # NOTE: the type is checked on the lazy product, before computing
+    if isinstance(
+        data_store.get_cached_product_or_read(dataset_id, product_id),
+        Dataset,
+    ):
+        raise exc.DirectQueryUnsupportedError(
+            reason="the product consists of many datacubes"
+        )
+    estimate_size_bytes = data_store.estimate(dataset_id, product_id, query)
+    if estimate_size_bytes == 0:
+        raise exc.EmptyDatasetError(
+            dataset_id=dataset_id, product_id=product_id
+        )
+    if estimate_size_bytes > DIRECT_QUERY_MAX_BYTES:
+        raise exc.DirectQueryTooLargeError(
+            dataset_id=dataset_id,
+            product_id=product_id,
+            estimated_size_bytes=estimate_size_bytes,
+            allowed_size_bytes=DIRECT_QUERY_MAX_BYTES,
+        )
+    log.debug("computing direct query: %s", query)
+    kube = data_store.query(dataset_id, product_id, query, compute=True)
+    if isinstance(kube, Field):
+        kube = DataCube(
+            fields=[kube],
+            properties=kube.properties,
+            encoding=kube.encoding,
+        )
+    extension, media_type = _DIRECT_QUERY_FORMATS[out_format]
+    filename = f"{dataset_id}_{product_id}.{extension}"
+    tmp_dir = tempfile.mkdtemp(
+        prefix="direct-query-", dir=DIRECT_QUERY_TMP_DIR
+    )
+    path = os.path.join(tmp_dir, filename)
+    try:
+        _write_direct_query_result(kube, out_format, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return FileResponse(
+        path=path,
+        filename=filename,
+        media_type=media_type,
+        background=BackgroundTask(shutil.rmtree, tmp_dir, ignore_errors=True),
     )
-    broker_conn.close()
-    return request_id
@@ -1,7 +1,13 @@
 """Module with functions to handle file related endpoints"""
 import os
+import mimetypes
+from email.utils import formatdate
+from typing import Optional
+from urllib.parse import quote
 
-from fastapi.responses import FileResponse
+import anyio
+from fastapi import Response
+from starlette.types import Receive, Scope, Send
 from dbmanager.dbmanager import DBManager, RequestStatus
 
 from utils.api_logging import get_dds_logger
@@ -10,30 +16,169 @@ import exceptions as exc
 
 log = get_dds_logger(__name__)
 
+_BLOCK_SIZE = 1024**2
+# NOTE: ASGI extension for sending files without copying to user space
+_ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+
+class FileRangeResponse(Response):
+    """Response sending the whole file or its byte range.
+
+    The file is sent with the ASGI zero-copy extension (`sendfile`)
+    if the server supports it. Otherwise, it is read in blocks without
+    blocking the event loop.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file
+    offset : int
+        Position of the first byte to send
+    length : int
+        Number of bytes to send
+    status_code : int
+        Status code of the response
+    headers : dict, optional
+        Headers of the response
+    media_type : str, optional
+        Media type of the response
+    """
+
+    def __init__(
+        self,
+        path: str,
+        offset: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+    ) -> None:
+        super().__init__(
+            status_code=status_code, headers=headers, media_type=media_type
+        )
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        async with await anyio.open_file(self.path, "rb") as file:
+            if _ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": _ZEROCOPY_EXTENSION,
+                        "file": file.wrapped.fileno(),
+                        "offset": self.offset,
+                        "count": self.length,
+                        "more_body": False,
+                    }
+                )
+                return
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(_BLOCK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": True,
+                    }
+                )
+        await send({"type": "http.response.body", "body": b""})
+
+
+def _make_etag(stat_result: os.stat_result) -> str:
+    """Make the strong ETag from the size and the modification time.
+    Results are written once and renamed, so they change together."""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check the `If-None-Match` header with the weak comparison"""
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag.removeprefix("W/") for tag in tags)
+
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse the single byte range of the `Range` header into the first
+    and the last position. Returns `None` if the header should be ignored
+    (multiple ranges, other units or invalid syntax)."""
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            if not last.isdigit():
+                return None
+            suffix_length = int(last)
+            if suffix_length <= 0 or size == 0:
+                raise exc.RangeNotSatisfiableError(size=size)
+            return max(size - suffix_length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start < 0 or (last and end < start):
+        return None
+    if start >= size:
+        raise exc.RangeNotSatisfiableError(size=size)
+    return start, min(end, size - 1)
+
 
 @log_execution_time(log)
-def download_request_result(request_id: int):
+def download_request_result(
+    request_id: int,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+):
     """Realize the logic for the endpoint:
 
     `GET /download/{request_id}`
 
-    Get location path of the file being the result of
-    the request with `request_id`.
+    Get the file being the result of the request with `request_id`.
+    Single byte ranges (`Range` and `If-Range` headers) and conditional
+    requests (`If-None-Match` header) are supported, so interrupted
+    downloads can be resumed.
 
     Parameters
     ----------
     request_id : int
         ID of the request
+    range_header : str, optional
+        Value of the `Range` header
+    if_range : str, optional
+        Value of the `If-Range` header
+    if_none_match : str, optional
+        Value of the `If-None-Match` header
 
     Returns
     -------
-    path : str
-        The location of the resulting file
+    response : Response
+        The response with the file, its range or `304 Not Modified`
 
     Raises
     -------
     RequestNotYetAccomplished
         If dds request was not yet finished
+    RangeNotSatisfiableError
+        If the requested range is outside of the file
     FileNotFoundError
         If file was not found
     """
@@ -41,26 +186,58 @@ def download_request_result(request_id: int):
         "preparing downloads for request id: %s",
         request_id,
     )
-    (
-        request_status,
-        _,
-    ) = DBManager().get_request_status_and_reason(request_id=request_id)
-    if request_status is not RequestStatus.DONE:
+    download = DBManager().get_request_download(request_id=request_id)
+    if (
+        download is None
+        or RequestStatus(download["status"]) is not RequestStatus.DONE
+    ):
         log.debug(
             "request with id: '%s' does not exist or it is not finished yet!",
             request_id,
         )
         raise exc.RequestNotYetAccomplished(request_id=request_id)
-    download_details = DBManager().get_download_details_for_request(
-        request_id=request_id
-    )
-    if not os.path.exists(download_details.location_path):
+    path = download["location_path"]
+    try:
+        stat_result = os.stat(path)
+    except (FileNotFoundError, TypeError) as err:
         log.error(
             "file '%s' does not exists!",
-            download_details.location_path,
+            path,
+        )
+        raise FileNotFoundError from err
+    size = stat_result.st_size
+    etag = _make_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    filename = os.path.basename(path)
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "accept-ranges": "bytes",
+        "content-disposition": (
+            f"attachment; filename*=utf-8''{quote(filename)}"
+        ),
+    }
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = (
+        mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    )
+    byte_range = None
+    # NOTE: the range is ignored if the file changed since the client
+    # got its part
+    if range_header and if_range in (None, etag, last_modified):
+        byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        return FileRangeResponse(
+            path, offset=0, length=size, headers=headers, media_type=media_type
         )
-        raise FileNotFoundError
-    return FileResponse(
-        path=download_details.location_path,
-        filename=download_details.location_path.split(os.sep)[-1],
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(
+        path,
+        offset=start,
+        length=end - start + 1,
+        status_code=206,
+        headers=headers,
+        media_type=media_type,
     )
@@ -1,32 +1,168 @@
 """Modules with functions realizing logic for requests-related endpoints"""
-from dbmanager.dbmanager import DBManager
+import os
+import json
+import time
+import base64
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from dbmanager.dbmanager import DBManager, Request, RequestStatus
 
 from utils.api_logging import get_dds_logger
 from utils.metrics import log_execution_time
 import exceptions as exc
+import concurrency
+from concurrency import run_blocking
+from status_events import get_hub, wait_for_event
 
 log = get_dds_logger(__name__)
 
+# NOTE: if no event arrives within that time, the keep-alive comment is
+# sent and the status is re-read from the database
+REQUEST_EVENTS_KEEPALIVE_SEC = float(
+    os.environ.get("REQUEST_EVENTS_KEEPALIVE_SEC", 15)
+)
+REQUEST_EVENTS_MAX_DURATION_SEC = float(
+    os.environ.get("REQUEST_EVENTS_MAX_DURATION_SEC", 60 * 60)
+)
+REQUESTS_STATUS_BATCH_MAX = int(
+    os.environ.get("REQUESTS_STATUS_BATCH_MAX", 1000)
+)
+REQUESTS_PAGE_DEFAULT_LIMIT = int(
+    os.environ.get("REQUESTS_PAGE_DEFAULT_LIMIT", 100)
+)
+REQUESTS_PAGE_MAX_LIMIT = int(os.environ.get("REQUESTS_PAGE_MAX_LIMIT", 1000))
+_REQUEST_FIELDS = frozenset(Request.__table__.columns.keys())
+_FINAL_STATUSES = frozenset(
+    {
+        RequestStatus.DONE.name,
+        RequestStatus.FAILED.name,
+        RequestStatus.TIMEOUT.name,
+    }
+)
+
+
+def _encode_cursor(item: dict) -> str:
+    return (
+        base64.urlsafe_b64encode(
+            json.dumps(
+                [item["created_on"].isoformat(), item["request_id"]]
+            ).encode("utf-8")
+        )
+        .decode("ascii")
+        .rstrip("=")
+    )
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_on, request_id = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        return datetime.fromisoformat(created_on), int(request_id)
+    except (ValueError, TypeError) as err:
+        raise exc.InvalidRequestsQueryError(
+            f"cursor `{cursor}` is not valid"
+        ) from err
+
+
+def _parse_statuses(statuses: Optional[list[str]]):
+    if not statuses:
+        return None
+    try:
+        return [RequestStatus[status.upper()] for status in statuses]
+    except KeyError as err:
+        raise exc.InvalidRequestsQueryError(
+            f"status {err} is not valid. use one of:"
+            f" {[status.name for status in RequestStatus]}"
+        ) from err
+
+
+def _parse_fields(fields: Optional[str]):
+    if not fields:
+        return None, True
+    fields = [field.strip() for field in fields.split(",") if field.strip()]
+    if unknown := set(fields) - _REQUEST_FIELDS - {"download"}:
+        raise exc.InvalidRequestsQueryError(
+            f"fields {sorted(unknown)} are not valid. use any of:"
+            f" {sorted(_REQUEST_FIELDS | {'download'})}"
+        )
+    columns = [field for field in fields if field != "download"]
+    return columns, "download" in fields
+
 
 @log_execution_time(log)
-def get_requests(user_id: str):
+def get_requests(
+    user_id: str,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    status: Optional[list[str]] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
+):
     """Realize the logic for the endpoint:
 
     `GET /requests`
 
-    Get details of all requests for the user.
+    Get details of requests for the user, from the newest ones.
+    If `limit` or `after` is passed, requests are paginated with
+    the cursor. If there are more requests, the cursor of the next page
+    is returned in the `X-Next-Cursor` header. Otherwise, all requests
+    are returned, as before pagination was introduced.
 
     Parameters
     ----------
     user_id : str
         ID of the user for whom requests are taken
+    limit : int, optional
+        Maximum number of requests on the page. If `None` and `after`
+        is passed, `REQUESTS_PAGE_DEFAULT_LIMIT` is used
+    after : str, optional
+        Cursor returned with the previous page
+    status : list of str, optional
+        Statuses of requests to return
+    created_from, created_to : datetime, optional
+        Range of creation time of requests to return
+    fields : str, optional
+        Comma-separated names of fields to return. All if `None`
 
     Returns
     -------
-    requests : list
-        List of all requests done by the user
+    response : fastapi.responses.JSONResponse
+        JSON response with the list of requests
+
+    Raises
+    -------
+    InvalidRequestsQueryError
+        If the cursor, statuses, fields or limit are not valid
     """
-    return DBManager().get_requests_for_user_id(user_id=user_id)
+    # NOTE: clients not aware of pagination get all requests
+    paginated = limit is not None or after is not None
+    if paginated:
+        limit = limit or REQUESTS_PAGE_DEFAULT_LIMIT
+        if not 0 < limit <= REQUESTS_PAGE_MAX_LIMIT:
+            raise exc.InvalidRequestsQueryError(
+                f"limit must be between 1 and {REQUESTS_PAGE_MAX_LIMIT}"
+            )
+    columns, with_download = _parse_fields(fields)
+    requests = DBManager().get_requests_page_for_user_id(
+        user_id=user_id,
+        limit=limit + 1 if paginated else None,
+        after=_decode_cursor(after) if after else None,
+        statuses=_parse_statuses(status),
+        created_from=created_from,
+        created_to=created_to,
+        columns=columns,
+        with_download=with_download,
+    )
+    headers = {}
+    if paginated and len(requests) > limit:
+        requests = requests[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(requests[-1])
+    return JSONResponse(content=jsonable_encoder(requests), headers=headers)
 
 
 @log_execution_time(log)
@@ -62,6 +198,60 @@ def get_request_status(user_id: str, request_id: int):
     return {"status": status.name, "fail_reason": reason}
 
 
+@log_execution_time(log)
+def get_requests_statuses(user_id: str, request_ids: list[int]):
+    """Realize the logic for the endpoint:
+
+    `POST /requests/status`
+
+    Get status, fail reason, resulting size and download URI for many
+    requests of the user at once.
+
+    Parameters
+    ----------
+    user_id : str
+        ID of the user whose requests' statuses are about to be checked
+    request_ids : list of int
+        IDs of requests
+
+    Returns
+    -------
+    statuses : dict
+        Details of found requests (under the `requests` key) and
+        the list of IDs not found for the user (under the `not_found` key)
+
+    Raises
+    -------
+    TooManyRequestIdsError
+        If more than `REQUESTS_STATUS_BATCH_MAX` IDs were passed
+    """
+    request_ids = list(dict.fromkeys(request_ids))
+    if len(request_ids) > REQUESTS_STATUS_BATCH_MAX:
+        raise exc.TooManyRequestIdsError(
+            count=len(request_ids), max_count=REQUESTS_STATUS_BATCH_MAX
+        )
+    rows = DBManager().get_requests_statuses(
+        request_ids=request_ids, user_id=user_id
+    )
+    found = {row["request_id"]: row for row in rows}
+    return {
+        "requests": [
+            {
+                "request_id": request_id,
+                "status": found[request_id]["status"].name,
+                "fail_reason": found[request_id]["fail_reason"],
+                "size_bytes": found[request_id]["size_bytes"],
+                "download_uri": found[request_id]["download_uri"],
+            }
+            for request_id in request_ids
+            if request_id in found
+        ],
+        "not_found": [
+            request_id for request_id in request_ids if request_id not in found
+        ],
+    }
+
+
 @log_execution_time(log)
 def get_request_resulting_size(request_id: int):
     """Realize the logic for the endpoint:
@@ -138,3 +328,82 @@ def get_request_uri(request_id: int):
             request_id=request_id, request_status=request_status
         )
     return download_details.download_uri
+
+
+def get_watched_request_ids(request_id: int) -> list[int]:
+    """Get IDs of requests whose status events affect the status
+    of the request, i.e. the request itself and the request it reuses
+
+    Raises
+    -------
+    RequestNotFound
+        If the request was not found
+    """
+    if (request := DBManager().get_request_details(request_id)) is None:
+        raise exc.RequestNotFound(request_id=request_id)
+    if request.reused_request_id is None:
+        return [request_id]
+    return [request_id, request.reused_request_id]
+
+
+def _format_event(status: dict) -> str:
+    return f"event: status\ndata: {json.dumps(status)}\n\n"
+
+
+async def stream_request_status(
+    user_id: str,
+    request_id: int,
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[str]:
+    """Realize the logic for the endpoint:
+
+    `GET /requests/{request_id}/events`
+
+    Generate server-sent events with the request status. The current
+    status is sent immediately and then on each change, until the request
+    is finished. Changes are signalled by events published by executors,
+    so the database is read only when something happens (or on keep-alive).
+
+    Parameters
+    ----------
+    user_id : str
+        ID of the user whose request's status is about to be checked
+    request_id : int
+        ID of the request
+    is_disconnected : callable
+        Coroutine function checking if the client disconnected
+
+    Yields
+    ------
+    event : str
+        Server-sent event
+    """
+    watched_ids = await run_blocking(
+        concurrency.REQUESTS, get_watched_request_ids, request_id
+    )
+    last_status = None
+    deadline = time.monotonic() + REQUEST_EVENTS_MAX_DURATION_SEC
+    with get_hub().subscribe(watched_ids) as waiter:
+        while time.monotonic() < deadline:
+            # NOTE: clear before reading, so no change is missed
+            waiter.clear()
+            status = await run_blocking(
+                concurrency.REQUESTS,
+                get_request_status,
+                user_id=user_id,
+                request_id=request_id,
+            )
+            if status != last_status:
+                last_status = status
+                yield _format_event(status)
+            if status["status"] in _FINAL_STATUSES:
+                return
+            if not await wait_for_event(
+                waiter, timeout=REQUEST_EVENTS_KEEPALIVE_SEC
+            ):
+                yield ": keep-alive\n\n"
+            if await is_disconnected():
+                log.debug(
+                    "client watching request `%s` disconnected", request_id
+                )
+                return
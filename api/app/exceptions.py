@@ -180,3 +180,94 @@ class EmptyDatasetError(BaseDDSException):
             product_id=product_id,
         )
         super().__init__(self.msg)
+
+
+class RequestSubmissionFailed(BaseDDSException):
+    """Raised if the request could not be submitted for execution"""
+
+    msg: str = (
+        "Request with id: {request_id} could not be submitted. Try again"
+        " later!"
+    )
+    code: int = 503
+
+    def __init__(self, request_id):
+        self.msg = self.msg.format(request_id=request_id)
+        super().__init__(self.msg)
+
+
+class TooManyRequestIdsError(BaseDDSException):
+    """Raised if too many request IDs were passed at once"""
+
+    msg: str = (
+        "{count} request IDs were passed, but at most {max_count} are"
+        " allowed at once"
+    )
+    code: int = 413
+
+    def __init__(self, count: int, max_count: int) -> None:
+        self.msg = self.msg.format(count=count, max_count=max_count)
+        super().__init__(self.msg)
+
+
+class InvalidRequestsQueryError(BaseDDSException):
+    """Raised if parameters of the requests listing are not valid"""
+
+    msg: str = "Invalid query of requests: {reason}"
+
+    def __init__(self, reason: str) -> None:
+        self.msg = self.msg.format(reason=reason)
+        super().__init__(self.msg)
+
+
+class RangeNotSatisfiableError(BaseDDSException):
+    """Raised if the requested range is outside of the file"""
+
+    msg: str = "Requested range is not satisfiable for the file of size {size}"
+    code: int = 416
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.msg = self.msg.format(size=size)
+        super().__init__(self.msg)
+
+    def wrap_around_http_exception(self) -> HTTPException:
+        """Wrap an exception around `fastapi.HTTPExcetion` with
+        the `Content-Range` header"""
+        return HTTPException(
+            status_code=self.code,
+            detail=self.msg,
+            headers={"Content-Range": f"bytes */{self.size}"},
+        )
+
+
+class DirectQueryTooLargeError(BaseDDSException):
+    """Raised if the query is too large to be streamed directly"""
+
+    msg: str = (
+        "Estimated size of the query is {estimated_size_bytes} bytes, but"
+        " at most {allowed_size_bytes} bytes can be streamed directly. Use"
+        " `POST /datasets/{dataset_id}/{product_id}/execute` instead"
+    )
+    code: int = 413
+
+    def __init__(
+        self, dataset_id, product_id, estimated_size_bytes, allowed_size_bytes
+    ):
+        self.msg = self.msg.format(
+            dataset_id=dataset_id,
+            product_id=product_id,
+            estimated_size_bytes=estimated_size_bytes,
+            allowed_size_bytes=allowed_size_bytes,
+        )
+        super().__init__(self.msg)
+
+
+class DirectQueryUnsupportedError(BaseDDSException):
+    """Raised if the result of the query cannot be streamed directly"""
+
+    msg: str = "Result of the query cannot be streamed directly: {reason}"
+
+    def __init__(self, reason: str) -> None:
+        self.msg = self.msg.format(reason=reason)
+        super().__init__(self.msg)
@@ -1,15 +1,18 @@
 """Main module with dekube-dds API endpoints defined"""
 __version__ = "2.0"
 import os
+from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Request, status
+from fastapi import Body, FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.authentication import requires
 
 from aioprometheus import (
     Counter,
+    Gauge,
     Summary,
     timer,
     MetricsMiddleware,
@@ -17,6 +20,7 @@ from aioprometheus import (
 from aioprometheus.asgi.starlette import metrics
 
 from geoquery.geoquery import GeoQuery
+from datastore.datastore import Datastore
 from geoquery.task import TaskList
 
 from utils.api_logging import get_dds_logger
@@ -27,10 +31,13 @@ from endpoint_handlers import (
     request_handler,
 )
 from auth.backend import DDSAuthenticationBackend
-from callbacks import all_onstartup_callbacks
+from callbacks import all_onstartup_callbacks, all_onshutdown_callbacks
 from encoders import extend_json_encoders
 from const import venv, tags
 from auth import scopes
+from status_events import get_hub
+import concurrency
+from concurrency import run_blocking
 
 logger = get_dds_logger(__name__)
 
@@ -51,6 +58,7 @@ app = FastAPI(
     },
     root_path=os.environ.get(venv.ENDPOINT_PREFIX, "/api"),
     on_startup=all_onstartup_callbacks,
+    on_shutdown=all_onshutdown_callbacks,
 )
 
 # ======== Authentication backend ========= #
@@ -72,13 +80,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "ETag",
+        "Content-Range",
+        "Accept-Ranges",
+    ],
     **cors_kwargs,
 )
 
 
 # ======== Prometheus metrics ========= #
 app.add_middleware(MetricsMiddleware)
-app.add_route("/metrics", metrics)
 
 app.state.api_request_duration_seconds = Summary(
     "api_request_duration_seconds", "Requests duration"
@@ -86,6 +99,42 @@ app.state.api_request_duration_seconds = Summary(
 app.state.api_http_requests_total = Counter(
     "api_http_requests_total", "Total number of requests"
 )
+app.state.product_cache_stats = Gauge(
+    "product_cache_stats",
+    "Product cache statistics (hits, misses, evictions, entries, bytes)",
+)
+app.state.estimate_cache_stats = Gauge(
+    "estimate_cache_stats",
+    "Estimate cache statistics (hits, misses, evictions, entries, hit_rate)",
+)
+app.state.status_events_stats = Gauge(
+    "status_events_stats",
+    "Request status events hub (connected, watched requests, subscriptions)",
+)
+app.state.api_concurrency_limiters = Gauge(
+    "api_concurrency_limiters",
+    "Busy threads, limits and waiting tasks per group of endpoints",
+)
+
+
+async def metrics_with_cache_stats(request: Request):
+    """Refresh cache and concurrency statistics and expose all metrics"""
+    data_store = Datastore()
+    for stat, value in data_store.cache_stats().items():
+        app.state.product_cache_stats.set({"stat": stat}, value)
+    for stat, value in data_store.estimate_cache.stats().items():
+        app.state.estimate_cache_stats.set({"stat": stat}, value)
+    for stat, value in get_hub().stats().items():
+        app.state.status_events_stats.set({"stat": stat}, value)
+    for group, stats in concurrency.limiters_stats().items():
+        for stat, value in stats.items():
+            app.state.api_concurrency_limiters.set(
+                {"group": group, "stat": stat}, value
+            )
+    return await metrics(request)
+
+
+app.add_route("/metrics", metrics_with_cache_stats)
 
 
 # ======== Endpoints definitions ========= #
@@ -95,6 +144,23 @@ async def dds_info():
     return f"DDS API {__version__}"
 
 
+@app.get("/ready", tags=[tags.BASIC])
+async def readiness():
+    """Check if the API is ready to serve requests, i.e. the catalog
+    listing index is built. Cache warm-up progress is reported, too."""
+    data_store = Datastore()
+    if not data_store.is_listing_ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Catalog listing is not ready yet",
+        )
+    return {
+        "listing_ready": True,
+        "cache_ready": data_store.is_cache_ready,
+        "cache_warmup": data_store.cache_warmup_report(),
+    }
+
+
 @app.get("/datasets", tags=[tags.DATASET])
 @timer(
     app.state.api_request_duration_seconds, labels={"route": "GET /datasets"}
@@ -103,8 +169,10 @@ async def get_datasets(request: Request):
     """List all products eligible for a user defined by user_token"""
     app.state.api_http_requests_total.inc({"route": "GET /datasets"})
     try:
-        return dataset_handler.get_datasets(
-            user_roles_names=request.auth.scopes
+        return await run_blocking(
+            concurrency.CATALOG,
+            dataset_handler.get_datasets,
+            user_roles_names=request.auth.scopes,
         )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
@@ -124,7 +192,9 @@ async def get_first_product_details(
         {"route": "GET /datasets/{dataset_id}"}
     )
     try:
-        return dataset_handler.get_product_details(
+        return await run_blocking(
+            concurrency.CATALOG,
+            dataset_handler.get_product_details,
             user_roles_names=request.auth.scopes,
             dataset_id=dataset_id,
         )
@@ -147,7 +217,9 @@ async def get_product_details(
         {"route": "GET /datasets/{dataset_id}/{product_id}"}
     )
     try:
-        return dataset_handler.get_product_details(
+        return await run_blocking(
+            concurrency.CATALOG,
+            dataset_handler.get_product_details,
             user_roles_names=request.auth.scopes,
             dataset_id=dataset_id,
             product_id=product_id,
@@ -171,8 +243,11 @@ async def get_metadata(
         {"route": "GET /datasets/{dataset_id}/{product_id}/metadata"}
     )
     try:
-        return dataset_handler.get_metadata(
-            dataset_id=dataset_id, product_id=product_id
+        return await run_blocking(
+            concurrency.CATALOG,
+            dataset_handler.get_metadata,
+            dataset_id=dataset_id,
+            product_id=product_id,
         )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
@@ -195,7 +270,9 @@ async def estimate(
         {"route": "POST /datasets/{dataset_id}/{product_id}/estimate"}
     )
     try:
-        return dataset_handler.estimate(
+        return await run_blocking(
+            concurrency.ESTIMATE,
+            dataset_handler.estimate,
             dataset_id=dataset_id,
             product_id=product_id,
             query=query,
@@ -222,7 +299,9 @@ async def query(
         {"route": "POST /datasets/{dataset_id}/{product_id}/execute"}
     )
     try:
-        return dataset_handler.query(
+        return await run_blocking(
+            concurrency.EXECUTE,
+            dataset_handler.query,
             user_id=request.user.id,
             dataset_id=dataset_id,
             product_id=product_id,
@@ -232,6 +311,35 @@ async def query(
         raise err.wrap_around_http_exception() from err
 
 
+@app.post("/datasets/{dataset_id}/{product_id}/stream", tags=[tags.DATASET])
+@timer(
+    app.state.api_request_duration_seconds,
+    labels={"route": "POST /datasets/{dataset_id}/{product_id}/stream"},
+)
+@requires([scopes.AUTHENTICATED])
+async def stream_query(
+    request: Request,
+    dataset_id: str,
+    product_id: str,
+    query: GeoQuery,
+):
+    """Compute the small query and stream its result directly"""
+    app.state.api_http_requests_total.inc(
+        {"route": "POST /datasets/{dataset_id}/{product_id}/stream"}
+    )
+    try:
+        return await run_blocking(
+            concurrency.DIRECT_QUERY,
+            dataset_handler.stream_query,
+            user_roles_names=request.auth.scopes,
+            dataset_id=dataset_id,
+            product_id=product_id,
+            query=query,
+        )
+    except exc.BaseDDSException as err:
+        raise err.wrap_around_http_exception() from err
+
+
 @app.post("/datasets/workflow", tags=[tags.DATASET])
 @timer(
     app.state.api_request_duration_seconds,
@@ -245,7 +353,9 @@ async def workflow(
     """Schedule the job of workflow processing"""
     app.state.api_http_requests_total.inc({"route": "POST /datasets/workflow"})
     try:
-        return dataset_handler.run_workflow(
+        return await run_blocking(
+            concurrency.EXECUTE,
+            dataset_handler.run_workflow,
             user_id=request.user.id,
             workflow=tasks,
         )
@@ -260,11 +370,52 @@ async def workflow(
 @requires([scopes.AUTHENTICATED])
 async def get_requests(
     request: Request,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    status_: Optional[list[str]] = Query(None, alias="status"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
 ):
-    """Get all requests for the user"""
+    """Get requests for the user, from the newest ones. All requests
+    are returned unless `limit` or `after` is passed. The cursor of
+    the next page (passed as `after`) is in the `X-Next-Cursor` header"""
     app.state.api_http_requests_total.inc({"route": "GET /requests"})
     try:
-        return request_handler.get_requests(request.user.id)
+        return await run_blocking(
+            concurrency.REQUESTS,
+            request_handler.get_requests,
+            user_id=request.user.id,
+            limit=limit,
+            after=after,
+            status=status_,
+            created_from=created_from,
+            created_to=created_to,
+            fields=fields,
+        )
+    except exc.BaseDDSException as err:
+        raise err.wrap_around_http_exception() from err
+
+
+@app.post("/requests/status", tags=[tags.REQUEST])
+@timer(
+    app.state.api_request_duration_seconds,
+    labels={"route": "POST /requests/status"},
+)
+@requires([scopes.AUTHENTICATED])
+async def get_requests_statuses(
+    request: Request,
+    request_ids: list[int] = Body(..., embed=True),
+):
+    """Get statuses of many requests of the user at once"""
+    app.state.api_http_requests_total.inc({"route": "POST /requests/status"})
+    try:
+        return await run_blocking(
+            concurrency.REQUESTS,
+            request_handler.get_requests_statuses,
+            user_id=request.user.id,
+            request_ids=request_ids,
+        )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
 
@@ -284,13 +435,50 @@ async def get_request_status(
         {"route": "GET /requests/{request_id}/status"}
     )
     try:
-        return request_handler.get_request_status(
-            user_id=request.user.id, request_id=request_id
+        return await run_blocking(
+            concurrency.REQUESTS,
+            request_handler.get_request_status,
+            user_id=request.user.id,
+            request_id=request_id,
         )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
 
 
+@app.get("/requests/{request_id}/events", tags=[tags.REQUEST])
+@requires([scopes.AUTHENTICATED])
+async def get_request_status_events(
+    request: Request,
+    request_id: int,
+):
+    """Stream status changes of the request as server-sent events"""
+    app.state.api_http_requests_total.inc(
+        {"route": "GET /requests/{request_id}/events"}
+    )
+    try:
+        events = request_handler.stream_request_status(
+            user_id=request.user.id,
+            request_id=request_id,
+            is_disconnected=request.is_disconnected,
+        )
+        # NOTE: the first event is awaited here, so errors (e.g. missing
+        # request) result in the proper HTTP status
+        first_event = await events.__anext__()
+    except exc.BaseDDSException as err:
+        raise err.wrap_around_http_exception() from err
+
+    async def all_events():
+        yield first_event
+        async for event in events:
+            yield event
+
+    return StreamingResponse(
+        all_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/requests/{request_id}/size", tags=[tags.REQUEST])
 @timer(
     app.state.api_request_duration_seconds,
@@ -306,8 +494,10 @@ async def get_request_resulting_size(
         {"route": "GET /requests/{request_id}/size"}
     )
     try:
-        return request_handler.get_request_resulting_size(
-            request_id=request_id
+        return await run_blocking(
+            concurrency.REQUESTS,
+            request_handler.get_request_resulting_size,
+            request_id=request_id,
         )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
@@ -328,7 +518,11 @@ async def get_request_uri(
         {"route": "GET /requests/{request_id}/uri"}
     )
     try:
-        return request_handler.get_request_uri(request_id=request_id)
+        return await run_blocking(
+            concurrency.REQUESTS,
+            request_handler.get_request_uri,
+            request_id=request_id,
+        )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
 
@@ -348,7 +542,14 @@ async def download_request_result(
         {"route": "GET /download/{request_id}"}
     )
     try:
-        return file_handler.download_request_result(request_id=request_id)
+        return await run_blocking(
+            concurrency.DOWNLOAD,
+            file_handler.download_request_result,
+            request_id=request_id,
+            range_header=request.headers.get("Range"),
+            if_range=request.headers.get("If-Range"),
+            if_none_match=request.headers.get("If-None-Match"),
+        )
     except exc.BaseDDSException as err:
         raise err.wrap_around_http_exception() from err
     except FileNotFoundError as err:
@@ -0,0 +1,172 @@
+"""Module with the hub of request status events published by executors"""
+import os
+import json
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+import pika
+from pika.exceptions import AMQPError
+
+from utils.api_logging import get_dds_logger
+
+log = get_dds_logger(__name__)
+
+REQUEST_STATUS_EXCHANGE = os.environ.get(
+    "REQUEST_STATUS_EXCHANGE", "request_status"
+)
+_RECONNECT_DELAY_SEC = 5.0
+
+
+class StatusEventHub:
+    """Consumer of the request status exchange waking up local waiters.
+
+    The hub consumes the fanout exchange in the background thread using
+    an exclusive, auto-deleted queue. Coroutines subscribe to request IDs
+    and are woken up (through the event loop) when an event for any of
+    them arrives. Events carry no state to rely on. Subscribers should
+    read the current status from the database when woken up.
+
+    Parameters
+    ----------
+    host : str
+        Host of the broker
+    """
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: dict[int, set[asyncio.Event]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._thread: Optional[threading.Thread] = None
+        self.is_connected = False
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start consuming events in the background daemon thread"""
+        self._loop = loop
+        self._thread = threading.Thread(
+            target=self._run, name="status-events", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop consuming events"""
+        self._stop.set()
+        if (connection := self._connection) is not None:
+            try:
+                connection.add_callback_threadsafe(connection.close)
+            except AMQPError:
+                log.debug("could not close status events connection")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._consume()
+            except Exception as err:  # pylint: disable=broad-except
+                log.warning(
+                    "status events connection lost: %s. reconnecting in"
+                    " %.1f sec",
+                    err,
+                    _RECONNECT_DELAY_SEC,
+                )
+            finally:
+                self.is_connected = False
+                self._connection = None
+            # NOTE: events could have been missed, so waiters re-check
+            self._wake_all()
+            self._stop.wait(_RECONNECT_DELAY_SEC)
+
+    def _consume(self) -> None:
+        self._connection = pika.BlockingConnection(
+            pika.ConnectionParameters(host=self.host, heartbeat=30)
+        )
+        channel = self._connection.channel()
+        channel.exchange_declare(
+            exchange=REQUEST_STATUS_EXCHANGE, exchange_type="fanout"
+        )
+        queue = channel.queue_declare(queue="", exclusive=True).method.queue
+        channel.queue_bind(exchange=REQUEST_STATUS_EXCHANGE, queue=queue)
+        channel.basic_consume(
+            queue=queue, on_message_callback=self._on_message, auto_ack=True
+        )
+        self.is_connected = True
+        log.info("consuming request status events")
+        channel.start_consuming()
+
+    def _on_message(self, channel, method_frame, header_frame, body) -> None:
+        try:
+            request_id = int(json.loads(body)["request_id"])
+        except (ValueError, KeyError, TypeError):
+            log.warning("improper status event: %s", body)
+            return
+        with self._lock:
+            waiters = list(self._waiters.get(request_id, ()))
+        for waiter in waiters:
+            self._loop.call_soon_threadsafe(waiter.set)
+
+    def _wake_all(self) -> None:
+        if self._loop is None:
+            return
+        with self._lock:
+            waiters = {w for ws in self._waiters.values() for w in ws}
+        for waiter in waiters:
+            self._loop.call_soon_threadsafe(waiter.set)
+
+    @contextmanager
+    def subscribe(
+        self, request_ids: Iterable[int]
+    ) -> Iterator[asyncio.Event]:
+        """Subscribe to events of requests. The returned event is set
+        when a status event for any of requests arrives and should be
+        cleared by the subscriber before reading the status."""
+        request_ids = set(request_ids)
+        waiter = asyncio.Event()
+        with self._lock:
+            for request_id in request_ids:
+                self._waiters.setdefault(request_id, set()).add(waiter)
+        try:
+            yield waiter
+        finally:
+            with self._lock:
+                for request_id in request_ids:
+                    waiters = self._waiters.get(request_id)
+                    if waiters is None:
+                        continue
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[request_id]
+
+    def stats(self) -> dict:
+        """Get the number of watched requests and of subscriptions"""
+        with self._lock:
+            return {
+                "connected": int(self.is_connected),
+                "requests": len(self._waiters),
+                "subscriptions": len(
+                    {w for ws in self._waiters.values() for w in ws}
+                ),
+            }
+
+
+_hub: Optional[StatusEventHub] = None
+
+
+def get_hub() -> StatusEventHub:
+    """Get the hub shared by the API process"""
+    global _hub  # pylint: disable=global-statement
+    if _hub is None:
+        _hub = StatusEventHub(host=os.getenv("BROKER_SERVICE_HOST", "broker"))
+    return _hub
+
+
+async def wait_for_event(waiter: asyncio.Event, timeout: float) -> bool:
+    """Wait until the event is set or the timeout expires.
+    Returns `True` if the event was set."""
+    try:
+        await asyncio.wait_for(waiter.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
@@ -0,0 +1,124 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from dbmanager.dbmanager import DBManager
+from fastapi import HTTPException
+
+from auth import backend
+from auth.principals import Principal, PrincipalCache, hash_api_key
+
+
+def _principal(user_id, api_key="key"):
+    return Principal(
+        user_id=user_id,
+        api_key_hash=hash_api_key(api_key),
+        scopes=("authenticated",),
+    )
+
+
+def test_cache_hit_and_miss():
+    cache = PrincipalCache()
+    user_id = str(uuid.uuid4())
+    assert cache.get(user_id) is None
+    cache.put(_principal(user_id))
+    assert cache.get(user_id.upper()) == _principal(user_id)
+
+
+def test_cache_entries_expire():
+    cache = PrincipalCache(ttl=0.05, negative_ttl=0.05)
+    user_id = str(uuid.uuid4())
+    cache.put(_principal(user_id))
+    cache.put_rejected(user_id, "wrong")
+    time.sleep(0.1)
+    assert cache.get(user_id) is None
+    assert not cache.is_rejected(user_id, "wrong")
+
+
+def test_unknown_user_replaced_by_principal():
+    cache = PrincipalCache()
+    user_id = str(uuid.uuid4())
+    cache.put_unknown(user_id)
+    assert cache.is_unknown(user_id)
+    cache.put(_principal(user_id))
+    assert not cache.is_unknown(user_id)
+
+
+def test_user_change_listener_invalidates_cache():
+    user_id = str(uuid.uuid4())
+    backend.principal_cache.put(_principal(user_id))
+    backend.principal_cache.put_rejected(user_id, "wrong")
+    object.__new__(DBManager)._notify_user_changed(user_id)
+    assert backend.principal_cache.get(user_id) is None
+    assert not backend.principal_cache.is_rejected(user_id, "wrong")
+
+
+class _FakeDBManager:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.calls = 0
+
+    def __call__(self):
+        return self
+
+    def get_user_details(self, user_id):
+        self.calls += 1
+        if self.api_key is None:
+            return None
+        return SimpleNamespace(api_key=self.api_key, roles=[])
+
+
+@pytest.fixture
+def user_id():
+    backend.principal_cache.clear()
+    yield str(uuid.uuid4())
+    backend.principal_cache.clear()
+
+
+def _authenticate(user_id, api_key):
+    return backend.DDSAuthenticationBackend()._manage_user_token_auth(
+        f"{user_id}:{api_key}"
+    )
+
+
+def test_authenticated_principal_is_cached(user_id, monkeypatch):
+    db = _FakeDBManager("key")
+    monkeypatch.setattr(backend, "DBManager", db)
+    for _ in range(3):
+        credentials, user = _authenticate(user_id, "key")
+    assert db.calls == 1
+    assert user.username == user_id
+    assert "authenticated" in credentials.scopes
+
+
+def test_wrong_key_rejected_without_reloading(user_id, monkeypatch):
+    db = _FakeDBManager("key")
+    monkeypatch.setattr(backend, "DBManager", db)
+    _authenticate(user_id, "key")
+    for _ in range(3):
+        with pytest.raises(HTTPException) as err:
+            _authenticate(user_id, "wrong")
+        assert err.value.status_code == 401
+    assert db.calls == 2
+    _authenticate(user_id, "key")
+    assert db.calls == 2
+
+
+def test_rotated_key_is_reloaded(user_id, monkeypatch):
+    db = _FakeDBManager("old")
+    monkeypatch.setattr(backend, "DBManager", db)
+    _authenticate(user_id, "old")
+    db.api_key = "new"
+    _authenticate(user_id, "new")
+    assert db.calls == 2
+
+
+def test_unknown_user_is_cached(user_id, monkeypatch):
+    db = _FakeDBManager(None)
+    monkeypatch.setattr(backend, "DBManager", db)
+    for _ in range(3):
+        with pytest.raises(HTTPException) as err:
+            _authenticate(user_id, "key")
+        assert err.value.status_code == 401
+    assert db.calls == 1
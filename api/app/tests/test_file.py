@@ -0,0 +1,155 @@
+import os
+
+import pytest
+from dbmanager.dbmanager import RequestStatus
+
+import exceptions as exc
+from endpoint_handlers import file_handler
+from endpoint_handlers.file import _etag_matches, _make_etag, _parse_range
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize(
+    "range_header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, SIZE - 1)),
+        ("bytes=-100", (SIZE - 100, SIZE - 1)),
+        ("bytes=-5000", (0, SIZE - 1)),
+        ("bytes=900-5000", (900, SIZE - 1)),
+        ("bytes=999-999", (999, 999)),
+        ("BYTES = 0-0", (0, 0)),
+    ],
+)
+def test_parse_range(range_header, expected):
+    assert _parse_range(range_header, SIZE) == expected
+
+
+@pytest.mark.parametrize(
+    "range_header",
+    [
+        "bytes=0-9,20-29",
+        "items=0-9",
+        "bytes=10",
+        "bytes=a-b",
+        "bytes=20-10",
+        "bytes=--5",
+    ],
+)
+def test_ignored_range(range_header):
+    assert _parse_range(range_header, SIZE) is None
+
+
+@pytest.mark.parametrize(
+    "range_header, size",
+    [("bytes=1000-", SIZE), ("bytes=5000-6000", SIZE), ("bytes=-0", SIZE)],
+)
+def test_unsatisfiable_range(range_header, size):
+    with pytest.raises(exc.RangeNotSatisfiableError) as err:
+        _parse_range(range_header, size)
+    http_err = err.value.wrap_around_http_exception()
+    assert http_err.status_code == 416
+    assert http_err.headers == {"Content-Range": f"bytes */{size}"}
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ("*", True),
+        ('"xyz"', False),
+        ("abc", False),
+    ],
+)
+def test_etag_matches(if_none_match, matches):
+    assert _etag_matches(if_none_match, '"abc"') is matches
+
+
+class _FakeDBManager:
+    def __init__(self, download):
+        self.download = download
+
+    def __call__(self):
+        return self
+
+    def get_request_download(self, request_id):
+        return self.download
+
+
+@pytest.fixture
+def result(tmp_path, monkeypatch):
+    path = tmp_path / "result.nc"
+    path.write_bytes(os.urandom(SIZE))
+    monkeypatch.setattr(
+        file_handler,
+        "DBManager",
+        _FakeDBManager(
+            {"status": RequestStatus.DONE, "location_path": str(path)}
+        ),
+    )
+    yield path
+
+
+def test_download_whole_file(result):
+    response = file_handler.download_request_result(1)
+    assert response.status_code == 200
+    assert (response.offset, response.length) == (0, SIZE)
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == _make_etag(os.stat(result))
+
+
+def test_download_range(result):
+    response = file_handler.download_request_result(
+        1, range_header="bytes=100-199"
+    )
+    assert response.status_code == 206
+    assert (response.offset, response.length) == (100, 100)
+    assert response.headers["content-range"] == f"bytes 100-199/{SIZE}"
+    assert response.headers["content-length"] == "100"
+
+
+def test_download_not_modified(result):
+    etag = _make_etag(os.stat(result))
+    response = file_handler.download_request_result(1, if_none_match=etag)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+def test_download_range_if_range_matches(result):
+    etag = _make_etag(os.stat(result))
+    response = file_handler.download_request_result(
+        1, range_header="bytes=-10", if_range=etag
+    )
+    assert response.status_code == 206
+    assert (response.offset, response.length) == (SIZE - 10, 10)
+
+
+def test_download_whole_file_if_range_does_not_match(result):
+    response = file_handler.download_request_result(
+        1, range_header="bytes=100-199", if_range='"outdated"'
+    )
+    assert response.status_code == 200
+    assert (response.offset, response.length) == (0, SIZE)
+    assert "content-range" not in response.headers
+
+
+def test_download_unsatisfiable_range(result):
+    with pytest.raises(exc.RangeNotSatisfiableError):
+        file_handler.download_request_result(
+            1, range_header=f"bytes={SIZE}-"
+        )
+
+
+def test_download_of_unfinished_request(result, monkeypatch):
+    monkeypatch.setattr(
+        file_handler,
+        "DBManager",
+        _FakeDBManager(
+            {"status": RequestStatus.RUNNING, "location_path": None}
+        ),
+    )
+    with pytest.raises(exc.RequestNotYetAccomplished):
+        file_handler.download_request_result(1)
@@ -22,11 +22,11 @@ def assert_product_exists(func):
         args_dict = bind_arguments(sig, *args, **kwargs)
         dataset_id = args_dict["dataset_id"]
         product_id = args_dict["product_id"]
-        if dataset_id not in Datastore().dataset_list():
+        snapshot = Datastore().snapshot
+        if dataset_id not in snapshot:
             raise exc.MissingDatasetError(dataset_id=dataset_id)
-        elif (
-            product_id is not None
-            and product_id not in Datastore().product_list(dataset_id)
+        elif product_id is not None and not snapshot.has_product(
+            dataset_id, product_id
         ):
             raise exc.MissingProductError(
                 dataset_id=dataset_id, product_id=product_id
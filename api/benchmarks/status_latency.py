@@ -0,0 +1,176 @@
+"""Load benchmark of the latency of `GET /requests/{request_id}/status`.
+
+The benchmark measures the latency of status checks in two phases:
+1. baseline - only status checks are sent,
+2. under load - status checks are sent while concurrent clients
+   continuously send heavy estimate requests.
+Percentiles (p50, p95, p99) of both phases are reported. With blocking
+work running outside the event loop, p99 should stay flat. Failed
+requests (HTTP errors, timeouts) are counted by reason and reported,
+so errors do not silently skew latencies.
+
+Only the standard library is used, e.g.:
+
+    python status_latency.py --url http://localhost/api \\
+        --user-token <user_id>:<api_key> --request-id 1 \\
+        --dataset era5-single-levels --product reanalysis \\
+        --estimate-query heavy_query.json
+"""
+import json
+import time
+import argparse
+import statistics
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _send(url: str, headers: dict, data: bytes | None = None) -> float:
+    request = urllib.request.Request(
+        url, data=data, headers=headers, method="POST" if data else "GET"
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def _error_reason(err: Exception) -> str:
+    if isinstance(err, urllib.error.HTTPError):
+        return f"HTTP {err.code}"
+    if isinstance(err, urllib.error.URLError):
+        return f"URLError: {err.reason}"
+    return type(err).__name__
+
+
+class _Errors:
+    """Thread-safe counter of failed requests by reason"""
+
+    def __init__(self) -> None:
+        self._counter: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, err: Exception) -> None:
+        with self._lock:
+            self._counter[_error_reason(err)] += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return dict(self._counter)
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        return {"count": len(latencies)}
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "count": len(latencies),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+def _status_clients(
+    args, stop: threading.Event, errors: _Errors
+) -> list[float]:
+    url = f"{args.url}/requests/{args.request_id}/status"
+    headers = {"User-Token": args.user_token}
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def client():
+        while not stop.is_set():
+            try:
+                latency = _send(url, headers)
+            except OSError as err:
+                errors.add(err)
+            else:
+                with lock:
+                    latencies.append(latency)
+            time.sleep(args.status_interval)
+
+    with ThreadPoolExecutor(max_workers=args.status_clients) as pool:
+        for _ in range(args.status_clients):
+            pool.submit(client)
+        stop.wait(args.duration)
+        stop.set()
+    return latencies
+
+
+def _estimate_clients(
+    args, stop: threading.Event, errors: _Errors
+) -> ThreadPoolExecutor:
+    url = (
+        f"{args.url}/datasets/{args.dataset}/{args.product}/estimate"
+    )
+    headers = {"Content-Type": "application/json"}
+    with open(args.estimate_query, "rb") as file:
+        body = file.read()
+
+    def client():
+        while not stop.is_set():
+            try:
+                _send(url, headers, data=body)
+            except OSError as err:
+                errors.add(err)
+
+    pool = ThreadPoolExecutor(max_workers=args.estimate_clients)
+    for _ in range(args.estimate_clients):
+        pool.submit(client)
+    return pool
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", required=True, help="API base URL")
+    parser.add_argument("--user-token", required=True)
+    parser.add_argument("--request-id", required=True, type=int)
+    parser.add_argument("--dataset", required=True)
+    parser.add_argument("--product", required=True)
+    parser.add_argument(
+        "--estimate-query",
+        required=True,
+        help="path to the JSON file with the heavy query to estimate",
+    )
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--status-clients", type=int, default=8)
+    parser.add_argument("--status-interval", type=float, default=0.05)
+    parser.add_argument("--estimate-clients", type=int, default=16)
+    args = parser.parse_args()
+
+    baseline_errors = _Errors()
+    baseline = _status_clients(args, threading.Event(), baseline_errors)
+
+    stop = threading.Event()
+    under_load_errors, estimate_errors = _Errors(), _Errors()
+    estimate_pool = _estimate_clients(args, stop, estimate_errors)
+    try:
+        under_load = _status_clients(args, stop, under_load_errors)
+    finally:
+        stop.set()
+        estimate_pool.shutdown(wait=True)
+
+    print(
+        json.dumps(
+            {
+                "baseline": {
+                    **_percentiles(baseline),
+                    "errors": baseline_errors.to_dict(),
+                },
+                "under_estimate_load": {
+                    **_percentiles(under_load),
+                    "errors": under_load_errors.to_dict(),
+                },
+                "estimate_errors": estimate_errors.to_dict(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Module with bounded caches of products"""
+from __future__ import annotations
+
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class ProductCache(ABC):
+    """Base class for thread-safe product caches bounded by the number
+    of entries and by the estimated footprint of entries.
+
+    Subclasses define the eviction policy by implementing `_touch` and
+    `_select_victim` methods.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of cached entries. Unbounded if `None`
+    max_bytes : int, optional
+        Maximum total estimated size of cached entries. Unbounded if `None`
+    sizeof : callable, optional
+        Function estimating the size (in bytes) of the cached value
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda _: 0)
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self._loading: dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def _touch(self, key: Hashable) -> None:
+        """Register the access to the cached entry"""
+
+    @abstractmethod
+    def _select_victim(self, protected: Hashable) -> Hashable:
+        """Select the key of the entry to be evicted, other than
+        the `protected` one, if possible"""
+
+    def _forget(self, key: Hashable) -> None:
+        """Remove policy-related state of the key"""
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get the cached value or `default` if the key is not cached"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._touch(key)
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Put the value into the cache evicting entries if necessary.
+        Values larger than `max_bytes` are not cached."""
+        size = self._sizeof(value)
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            self._touch(key)
+            while self._is_exceeded():
+                self._remove(self._select_victim(protected=key))
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Get the cached value or load it with `loader` and cache it.
+        Concurrent requests for the same key load the value only once."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._touch(key)
+                return self._entries[key][0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    self._touch(key)
+                    return self._entries[key][0]
+                self.misses += 1
+            try:
+                value = loader()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove the entry from the cache"""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """Get cache statistics"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _is_exceeded(self) -> bool:
+        if self.max_entries is not None and (
+            len(self._entries) > self.max_entries
+        ):
+            return True
+        if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+            return True
+        return False
+
+    def _remove(self, key: Hashable) -> None:
+        if key not in self._entries:
+            return
+        _, size = self._entries.pop(key)
+        self._total_bytes -= size
+        self._forget(key)
+
+
+class LRUProductCache(ProductCache):
+    """Product cache evicting the least recently used entries"""
+
+    def _touch(self, key: Hashable) -> None:
+        self._entries.move_to_end(key)
+
+    def _select_victim(self, protected: Hashable) -> Hashable:
+        return next(iter(self._entries))
+
+
+class LFUProductCache(ProductCache):
+    """Product cache evicting the least frequently used entries.
+    Ties are resolved in favour of the least recently used entry."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._counts: Counter = Counter()
+
+    def _touch(self, key: Hashable) -> None:
+        self._counts[key] += 1
+        self._entries.move_to_end(key)
+
+    def _select_victim(self, protected: Hashable) -> Hashable:
+        return min(
+            self._entries,
+            key=lambda key: (key == protected, self._counts[key]),
+        )
+
+    def _forget(self, key: Hashable) -> None:
+        self._counts.pop(key, None)
+
+
+class TTLCache:
+    """Thread-safe LRU cache of small values expiring after `ttl` seconds
+
+    Parameters
+    ----------
+    ttl : float
+        Time to live of entries in seconds
+    max_entries : int, optional
+        Maximum number of cached entries. Unbounded if `None`
+    """
+
+    def __init__(self, ttl: float, max_entries: int | None = None) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get the cached value or `default` if missing or expired"""
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Put the value into the cache evicting the least recently
+        used entries if necessary"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            if self.max_entries is None:
+                return
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove the entry from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Get cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_POLICIES: dict[str, type[ProductCache]] = {
+    "lru": LRUProductCache,
+    "lfu": LFUProductCache,
+}
+
+
+def make_product_cache(
+    policy: str = "lru",
+    max_entries: int | None = None,
+    max_bytes: int | None = None,
+    sizeof: Callable[[Any], int] | None = None,
+) -> ProductCache:
+    """Create the product cache with the given eviction policy
+
+    Parameters
+    ----------
+    policy : str, default="lru"
+        Eviction policy. One out of ["lru", "lfu"]
+    max_entries : int, optional
+        Maximum number of cached entries
+    max_bytes : int, optional
+        Maximum total estimated size of cached entries
+    sizeof : callable, optional
+        Function estimating the size (in bytes) of the cached value
+
+    Returns
+    -------
+    cache : ProductCache
+        The product cache
+
+    Raises
+    ------
+    ValueError
+        If the policy is not supported
+    """
+    if (cache_class := _POLICIES.get(policy.lower())) is None:
+        raise ValueError(
+            f"cache policy `{policy}` is not supported. use one of:"
+            f" {list(_POLICIES)}"
+        )
+    return cache_class(
+        max_entries=max_entries, max_bytes=max_bytes, sizeof=sizeof
+    )
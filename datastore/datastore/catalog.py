@@ -0,0 +1,214 @@
+"""Module with the immutable, indexed view of the intake catalog"""
+from __future__ import annotations
+
+import os
+import copy
+import hashlib
+import logging
+from types import MappingProxyType
+from typing import Any, Mapping
+
+import intake
+
+from .const import BaseRole
+
+_EXCLUDED_DATASETS = frozenset(
+    {
+        # NOTE: medsae cmip uses cftime.DatetimeNoLeap as time
+        # need to think how to handle it
+        "medsea-rea-e3r1",
+    }
+)
+
+
+def compute_file_hash(path: str | os.PathLike) -> str:
+    """Compute SHA-256 hash of the file content
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Path to the file
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal digest of the file content
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ProductEntry:
+    """Immutable description of the single product from the catalog"""
+
+    __slots__ = (
+        "dataset_id",
+        "product_id",
+        "description",
+        "metadata_caching",
+        "_metadata",
+    )
+
+    def __init__(
+        self,
+        dataset_id: str,
+        product_id: str,
+        description: str | None,
+        metadata: dict | None,
+        metadata_caching: bool = False,
+    ) -> None:
+        self.dataset_id = dataset_id
+        self.product_id = product_id
+        self.description = description
+        self.metadata_caching = bool(metadata_caching)
+        self._metadata = MappingProxyType(dict(metadata or {}))
+
+    @property
+    def metadata(self) -> dict:
+        """Deep copy of the product metadata, safe for modification"""
+        return copy.deepcopy(dict(self._metadata))
+
+    @property
+    def role(self) -> str | None:
+        """Name of the role eligible for the product"""
+        return self._metadata.get("role")
+
+
+class CatalogSnapshot:
+    """Immutable, indexed view of datasets, products and metadata
+    of the intake catalog parametrized once with `CACHE_DIR`.
+
+    The snapshot is identified by the `version` being the hash of
+    the catalog YAML file the snapshot was built from.
+    """
+
+    _LOG = logging.getLogger("geokube.CatalogSnapshot")
+
+    def __init__(
+        self, catalog_path: str, cache_dir: str, version: str
+    ) -> None:
+        self.catalog_path = catalog_path
+        self.version = version
+        self._catalog = intake.open_catalog(catalog_path)(
+            CACHE_DIR=cache_dir
+        )
+        datasets_catalogs: dict[str, Any] = {}
+        datasets_metadata: dict[str, Mapping] = {}
+        products: dict[str, dict[str, ProductEntry]] = {}
+        for dataset_id in sorted(self._catalog):
+            if dataset_id in _EXCLUDED_DATASETS:
+                continue
+            entry = self._catalog[dataset_id]
+            datasets_catalogs[dataset_id] = entry
+            datasets_metadata[dataset_id] = MappingProxyType(
+                dict(entry.metadata or {})
+            )
+            products[dataset_id] = {}
+            for product_id in entry:
+                prod_entry = entry[product_id]
+                products[dataset_id][product_id] = ProductEntry(
+                    dataset_id=dataset_id,
+                    product_id=product_id,
+                    description=prod_entry.description,
+                    metadata=prod_entry.metadata,
+                    metadata_caching=getattr(
+                        prod_entry, "metadata_caching", False
+                    ),
+                )
+        self._datasets_catalogs = MappingProxyType(datasets_catalogs)
+        self._datasets_metadata = MappingProxyType(datasets_metadata)
+        self._products = MappingProxyType(
+            {
+                dataset_id: MappingProxyType(prods)
+                for dataset_id, prods in products.items()
+            }
+        )
+        self.datasets = tuple(self._products)
+        self._build_eligibility_index()
+        self._LOG.info(
+            "catalog snapshot `%s` built with %d datasets and %d products",
+            self.version,
+            len(self.datasets),
+            sum(len(prods) for prods in self._products.values()),
+        )
+
+    def _build_eligibility_index(self) -> None:
+        all_products = set()
+        public_products = set()
+        products_by_role: dict[str, set[tuple[str, str]]] = {}
+        for dataset_id, prods in self._products.items():
+            for product_id, product in prods.items():
+                key = (dataset_id, product_id)
+                all_products.add(key)
+                role = product.role or BaseRole.PUBLIC
+                if role == BaseRole.PUBLIC:
+                    public_products.add(key)
+                else:
+                    products_by_role.setdefault(role, set()).add(key)
+        self._all_products = frozenset(all_products)
+        self._public_products = frozenset(public_products)
+        self._products_by_role = MappingProxyType(
+            {
+                role: frozenset(keys)
+                for role, keys in products_by_role.items()
+            }
+        )
+
+    def eligible_products(
+        self, role: str | list[str] | None = None
+    ) -> frozenset[tuple[str, str]]:
+        """Get the set of `(dataset_id, product_id)` pairs eligible for
+        the role(s). If `role` is `None`, the `public` role is considered.
+
+        Parameters
+        ----------
+        role : optional str or list of str, default=`None`
+            Role name or names
+
+        Returns
+        -------
+        products : frozenset of tuples
+            Set of `(dataset_id, product_id)` eligible for the role(s)
+        """
+        if not role:
+            return self._public_products
+        if isinstance(role, str):
+            role = [role]
+        if BaseRole.ADMIN in role:
+            return self._all_products
+        return self._public_products.union(
+            *(self._products_by_role.get(role_name, ()) for role_name in role)
+        )
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return dataset_id in self._products
+
+    def has_product(self, dataset_id: str, product_id: str) -> bool:
+        """Check if the product is defined for the dataset"""
+        return (
+            dataset_id in self._products
+            and product_id in self._products[dataset_id]
+        )
+
+    def product_list(self, dataset_id: str) -> list[str]:
+        """Get list of products of the dataset"""
+        return list(self._products[dataset_id])
+
+    def products(self, dataset_id: str) -> Mapping[str, ProductEntry]:
+        """Get read-only mapping of product entries of the dataset"""
+        return self._products[dataset_id]
+
+    def product(self, dataset_id: str, product_id: str) -> ProductEntry:
+        """Get the entry of the product"""
+        return self._products[dataset_id][product_id]
+
+    def dataset_metadata(self, dataset_id: str) -> dict:
+        """Get a copy of the dataset metadata"""
+        return copy.deepcopy(dict(self._datasets_metadata[dataset_id]))
+
+    def source(self, dataset_id: str, product_id: str):
+        """Get the intake source of the product, ready to be read"""
+        return self._datasets_catalogs[dataset_id][product_id]
@@ -3,22 +3,33 @@ from __future__ import annotations
 
 import os
 import logging
-import json
+import threading
 
-import intake
 from dask.delayed import Delayed
 
 from geoquery.geoquery import GeoQuery
+from utils.env import is_true
 
 from geokube.core.datacube import DataCube
 from geokube.core.dataset import Dataset
 
 from .singleton import Singleton
 from .util import log_execution_time
-from .const import BaseRole
-from .exception import UnauthorizedError
+from .catalog import CatalogSnapshot, compute_file_hash
+from .warmup import CacheWarmer, WarmupReport, DEFAULT_WARMUP_WORKERS
+from .cache import (
+    ProductCache,
+    LRUProductCache,
+    TTLCache,
+    make_product_cache,
+)
+from .estimator import ProductSchema, estimate_nbytes
+from .metadata_store import ProductMetadataStore
+from .exception import UnauthorizedError, EstimationNotSupportedError
 
 DEFAULT_MAX_REQUEST_SIZE_GB = 10
+DEFAULT_ESTIMATE_CACHE_TTL_SEC = 300
+DEFAULT_ESTIMATE_CACHE_MAX_ENTRIES = 10_000
 
 
 class Datastore(metaclass=Singleton):
@@ -43,10 +54,93 @@ class Datastore(metaclass=Singleton):
                 "'CACHE_PATH' environment variable was not set. catalog will"
                 " not be opened!"
             )
-        self.catalog = intake.open_catalog(os.environ["CATALOG_PATH"])
+        self.catalog_path = os.environ["CATALOG_PATH"]
         self.cache_dir = os.environ["CACHE_PATH"]
         self._LOG.info("cache dir set to %s", self.cache_dir)
-        self.cache = None
+        self.cache: ProductCache = make_product_cache(
+            policy=os.environ.get("PRODUCT_CACHE_POLICY", "lru"),
+            max_entries=Datastore._maybe_int(
+                os.environ.get("PRODUCT_CACHE_MAX_ENTRIES")
+            ),
+            max_bytes=Datastore._maybe_int(
+                os.environ.get("PRODUCT_CACHE_MAX_BYTES")
+            ),
+            sizeof=Datastore._estimate_metadata_footprint,
+        )
+        self._LOG.info(
+            "product cache: %s (max entries: %s, max bytes: %s)",
+            type(self.cache).__name__,
+            self.cache.max_entries,
+            self.cache.max_bytes,
+        )
+        self._schemas = LRUProductCache(
+            max_entries=Datastore._maybe_int(
+                os.environ.get("PRODUCT_SCHEMA_CACHE_MAX_ENTRIES")
+            )
+        )
+        self.estimate_cache = TTLCache(
+            ttl=float(
+                os.environ.get(
+                    "ESTIMATE_CACHE_TTL_SEC", DEFAULT_ESTIMATE_CACHE_TTL_SEC
+                )
+            ),
+            max_entries=int(
+                os.environ.get(
+                    "ESTIMATE_CACHE_MAX_ENTRIES",
+                    DEFAULT_ESTIMATE_CACHE_MAX_ENTRIES,
+                )
+            ),
+        )
+        self.metadata_store: ProductMetadataStore | None = None
+        if is_true(os.environ.get("PRODUCT_SNAPSHOTS", True)):
+            self.metadata_store = ProductMetadataStore(
+                os.environ.get(
+                    "PRODUCT_SNAPSHOTS_PATH",
+                    os.path.join(self.cache_dir, "product-snapshots"),
+                )
+            )
+        self._snapshot: CatalogSnapshot | None = None
+        self._snapshot_mtime_ns: int | None = None
+        self._snapshot_lock = threading.Lock()
+        self._warmer: CacheWarmer | None = None
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """Current snapshot of the catalog.
+
+        The snapshot is rebuilt only if the catalog YAML file was modified,
+        i.e. its modification time changed and its content hash differs from
+        the one the current snapshot was built from.
+        """
+        mtime_ns = os.stat(self.catalog_path).st_mtime_ns
+        if self._snapshot is not None and mtime_ns == self._snapshot_mtime_ns:
+            return self._snapshot
+        with self._snapshot_lock:
+            if (
+                self._snapshot is not None
+                and mtime_ns == self._snapshot_mtime_ns
+            ):
+                return self._snapshot
+            version = compute_file_hash(self.catalog_path)
+            if self._snapshot is None or version != self._snapshot.version:
+                self._LOG.info(
+                    "building catalog snapshot for version `%s`", version
+                )
+                self._snapshot = CatalogSnapshot(
+                    catalog_path=self.catalog_path,
+                    cache_dir=self.cache_dir,
+                    version=version,
+                )
+                self.cache.clear()
+                self._schemas.clear()
+                self.estimate_cache.clear()
+            self._snapshot_mtime_ns = mtime_ns
+            return self._snapshot
+
+    @property
+    def catalog_version(self) -> str:
+        """Version (content hash) of the current catalog snapshot"""
+        return self.snapshot.version
 
     @log_execution_time(_LOG)
     def get_cached_product_or_read(
@@ -55,6 +149,7 @@ class Datastore(metaclass=Singleton):
         """Get product from the cache instead of loading files indicated in
         the catalog if `metadata_caching` set to `True`.
         If might return `geokube.DataCube` or `geokube.Dataset`.
+        Products are loaded into the cache lazily, on the first use.
 
         Parameters
         -------
@@ -67,57 +162,110 @@ class Datastore(metaclass=Singleton):
         -------
         kube : DataCube or Dataset
         """
-        if self.cache is None:
-            self._load_cache()
-        if (
-            dataset_id not in self.cache
-            or product_id not in self.cache[dataset_id]
-        ):
+        snapshot = self.snapshot
+        if not snapshot.product(dataset_id, product_id).metadata_caching:
             self._LOG.info(
-                "dataset `%s` or product `%s` not found in cache! Reading"
-                " product!",
+                "`metadata_caching` for product %s.%s set to `False`."
+                " Reading product!",
                 dataset_id,
                 product_id,
             )
-            return self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][
-                product_id
-            ].read_chunked()
-        return self.cache[dataset_id][product_id]
+            return self.read_product(dataset_id, product_id)
+        return self.cache.get_or_load(
+            (snapshot.version, dataset_id, product_id),
+            lambda: self.read_product(dataset_id, product_id),
+        )
 
-    @log_execution_time(_LOG)
-    def _load_cache(self):
-        if self.cache is None:
-            self.cache = {}
-        for i, dataset_id in enumerate(self.dataset_list()):
-            self._LOG.info(
-                "loading cache for `%s` (%d/%d)",
-                dataset_id,
-                i + 1,
-                len(self.dataset_list()),
-            )
-            self.cache[dataset_id] = {}
-            for product_id in self.product_list(dataset_id):
-                catalog_entry = self.catalog(CACHE_DIR=self.cache_dir)[
-                    dataset_id
-                ][product_id]
-                if not catalog_entry.metadata_caching:
+    def read_product(self, dataset_id: str, product_id: str):
+        """Read the lazy product from its on-disk snapshot, if valid,
+        or directly from the catalog otherwise.
+
+        Parameters
+        -------
+        dataset_id : str
+            ID of the dataset
+        product_id : str
+            ID of the product
+
+        Returns
+        -------
+        kube : DataCube or Dataset
+        """
+        source = self.snapshot.source(dataset_id, product_id)
+        if self.metadata_store is None:
+            return source.read_chunked()
+        return self.metadata_store.load_or_read(
+            dataset_id, product_id, source
+        )
+
+    def cache_stats(self) -> dict:
+        """Get statistics (hits, misses, evictions, size) of the product
+        cache"""
+        return self.cache.stats()
+
+    def _make_cache_warmer(self) -> CacheWarmer:
+        snapshot = self.snapshot
+        products = []
+        for dataset_id in snapshot.datasets:
+            for product_id, product in snapshot.products(dataset_id).items():
+                if not product.metadata_caching:
                     self._LOG.info(
                         "`metadata_caching` for product %s.%s set to `False`",
                         dataset_id,
                         product_id,
                     )
                     continue
-                try:
-                    self.cache[dataset_id][
-                        product_id
-                    ] = catalog_entry.read_chunked()
-                except ValueError:
-                    self._LOG.error(
-                        "failed to load cache for `%s.%s`",
-                        dataset_id,
-                        product_id,
-                        exc_info=True,
-                    )
+                products.append((dataset_id, product_id))
+
+        def _on_loaded(dataset_id, product_id, kube):
+            self.cache.put((snapshot.version, dataset_id, product_id), kube)
+
+        return CacheWarmer(
+            products=products,
+            read_product=self.read_product,
+            on_loaded=_on_loaded,
+            max_workers=int(
+                os.environ.get("CACHE_WARMUP_WORKERS", DEFAULT_WARMUP_WORKERS)
+            ),
+            executor=os.environ.get("CACHE_WARMUP_EXECUTOR", "thread"),
+            subprocess_args=(self.catalog_path, self.cache_dir),
+        )
+
+    @log_execution_time(_LOG)
+    def _load_cache(self) -> WarmupReport:
+        """Load all products with `metadata_caching` concurrently and block
+        until finished"""
+        self._warmer = self._make_cache_warmer()
+        return self._warmer.run()
+
+    def start_cache_warmup(self) -> threading.Thread:
+        """Build the catalog snapshot and start loading products with
+        `metadata_caching` in the background. Products not loaded yet are
+        read directly from the catalog when requested.
+
+        Returns
+        -------
+        thread : threading.Thread
+            Thread running the warm-up
+        """
+        self._warmer = self._make_cache_warmer()
+        return self._warmer.start()
+
+    @property
+    def is_listing_ready(self) -> bool:
+        """If the catalog snapshot (and listing index) is built"""
+        return self._snapshot is not None
+
+    @property
+    def is_cache_ready(self) -> bool:
+        """If the cache warm-up is finished"""
+        return self._warmer is not None and self._warmer.done.is_set()
+
+    def cache_warmup_report(self) -> dict | None:
+        """Get the summary of the cache warm-up, if it was started"""
+        if self._warmer is None:
+            return None
+        return self._warmer.report.to_dict()
 
     @log_execution_time(_LOG)
     def dataset_list(self) -> list:
@@ -129,13 +277,7 @@ class Datastore(metaclass=Singleton):
         datasets : list
             List of datasets present in the catalog
         """
-        datasets = set(self.catalog(CACHE_DIR=self.cache_dir))
-        datasets -= {
-            "medsea-rea-e3r1",
-        }
-        # NOTE: medsae cmip uses cftime.DatetimeNoLeap as time
-        # need to think how to handle it
-        return sorted(list(datasets))
+        return list(self.snapshot.datasets)
 
     @log_execution_time(_LOG)
     def product_list(self, dataset_id: str):
@@ -152,7 +294,7 @@ class Datastore(metaclass=Singleton):
         products : list
             List of products for the dataset
         """
-        return list(self.catalog(CACHE_DIR=self.cache_dir)[dataset_id])
+        return self.snapshot.product_list(dataset_id)
 
     @log_execution_time(_LOG)
     def dataset_info(self, dataset_id: str):
@@ -169,18 +311,15 @@ class Datastore(metaclass=Singleton):
         info : dict
             Dict of short information about the dataset
         """
+        snapshot = self.snapshot
         info = {}
-        entry = self.catalog(CACHE_DIR=self.cache_dir)[dataset_id]
-        if entry.metadata:
-            info["metadata"] = entry.metadata
+        if metadata := snapshot.dataset_metadata(dataset_id):
+            info["metadata"] = metadata
             info["metadata"]["id"] = dataset_id
         info["products"] = {}
-        for product_id in entry:
-            prod_entry = entry[product_id]
-            info["products"][product_id] = prod_entry.metadata
-            info["products"][product_id][
-                "description"
-            ] = prod_entry.description
+        for product_id, product in snapshot.products(dataset_id).items():
+            info["products"][product_id] = product.metadata
+            info["products"][product_id]["description"] = product.description
         return info
 
     @log_execution_time(_LOG)
@@ -199,9 +338,7 @@ class Datastore(metaclass=Singleton):
         metadata : dict
             DatasetMetadata of the product
         """
-        return self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][
-            product_id
-        ].metadata
+        return self.snapshot.product(dataset_id, product_id).metadata
 
     @log_execution_time(_LOG)
     def first_eligible_product_details(
@@ -234,26 +371,13 @@ class Datastore(metaclass=Singleton):
         UnauthorizedError
             if none of product of the requested dataset is eligible for a role
         """
-        info = {}
-        product_ids = self.product_list(dataset_id)
-        for prod_id in product_ids:
-            if not self.is_product_valid_for_role(
-                dataset_id, prod_id, role=role
-            ):
+        eligible_products = self.eligible_products(role=role)
+        for prod_id in self.product_list(dataset_id):
+            if (dataset_id, prod_id) not in eligible_products:
                 continue
-            entry = self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][prod_id]
-            if entry.metadata:
-                info["metadata"] = entry.metadata
-            info["description"] = entry.description
-            info["id"] = prod_id
-            info["dataset"] = self.dataset_info(dataset_id=dataset_id)
-            if use_cache:
-                info["data"] = self.get_cached_product_or_read(
-                    dataset_id, prod_id
-                ).to_dict()
-            else:
-                info["data"] = entry.read_chunked().to_dict()
-            return info
+            return self.product_details(
+                dataset_id, prod_id, role=role, use_cache=use_cache
+            )
         raise UnauthorizedError()
 
     @log_execution_time(_LOG)
@@ -293,9 +417,9 @@ class Datastore(metaclass=Singleton):
             dataset_id, product_id, role=role
         ):
             raise UnauthorizedError()
-        entry = self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][product_id]
-        if entry.metadata:
-            info["metadata"] = entry.metadata
+        entry = self.snapshot.product(dataset_id, product_id)
+        if metadata := entry.metadata:
+            info["metadata"] = metadata
         info["description"] = entry.description
         info["id"] = product_id
         info["dataset"] = self.dataset_info(dataset_id=dataset_id)
@@ -304,22 +428,21 @@ class Datastore(metaclass=Singleton):
                 dataset_id, product_id
             ).to_dict()
         else:
-            info["data"] = entry.read_chunked().to_dict()
+            info["data"] = self.read_product(dataset_id, product_id).to_dict()
         return info
 
     def product_info(
         self, dataset_id: str, product_id: str, use_cache: bool = False
     ):
         info = {}
-        entry = self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][product_id]
-        if entry.metadata:
-            info["metadata"] = entry.metadata
+        if metadata := self.snapshot.product(dataset_id, product_id).metadata:
+            info["metadata"] = metadata
         if use_cache:
             info["data"] = self.get_cached_product_or_read(
                 dataset_id, product_id
             ).to_dict()
         else:
-            info["data"] = entry.read_chunked().to_dict()
+            info["data"] = self.read_product(dataset_id, product_id).to_dict()
         return info
 
     @log_execution_time(_LOG)
@@ -354,9 +477,7 @@ class Datastore(metaclass=Singleton):
         self._LOG.debug("processing GeoQuery: %s", geoquery)
         # NOTE: we always use catalog directly and single product cache
         self._LOG.debug("loading product...")
-        kube = self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][
-            product_id
-        ].read_chunked()
+        kube = self.read_product(dataset_id, product_id)
         self._LOG.debug("original kube len: %s", len(kube))
         return Datastore._process_query(kube, geoquery, compute)
 
@@ -386,34 +507,121 @@ class Datastore(metaclass=Singleton):
         self._LOG.debug("query: %s", query)
         geoquery: GeoQuery = GeoQuery.parse(query)
         self._LOG.debug("processing GeoQuery: %s", geoquery)
-        # NOTE: we always use catalog directly and single product cache
-        self._LOG.debug("loading product...")
+        key = (
+            dataset_id,
+            product_id,
+            geoquery.canonical_json(),
+            self.catalog_version,
+        )
+        if (size := self.estimate_cache.get(key)) is not None:
+            self._LOG.debug("estimate found in cache")
+            return size
+        size = self._estimate(dataset_id, product_id, geoquery)
+        self.estimate_cache.put(key, size)
+        return size
+
+    def _estimate(
+        self, dataset_id: str, product_id: str, geoquery: GeoQuery
+    ) -> int:
+        if (schema := self.product_schema(dataset_id, product_id)) is not None:
+            try:
+                return estimate_nbytes(schema, geoquery)
+            except EstimationNotSupportedError as err:
+                self._LOG.debug(
+                    "analytic estimation not supported: %s. processing query",
+                    err,
+                )
         # NOTE: for estimation we use cached products
+        self._LOG.debug("loading product...")
         kube = self.get_cached_product_or_read(dataset_id, product_id)
         self._LOG.debug("original kube len: %s", len(kube))
         return Datastore._process_query(kube, geoquery, False).nbytes
 
-    @log_execution_time(_LOG)
+    def product_schema(
+        self, dataset_id: str, product_id: str
+    ) -> ProductSchema | None:
+        """Get the schema (coordinates, fields shapes and dtypes) of
+        the product used for the analytic size estimation.
+
+        Parameters
+        ----------
+        dataset_id : str
+            ID of the dataset
+        product_id : str
+            ID of the product
+
+        Returns
+        -------
+        schema : ProductSchema or None
+            Schema of the product or `None` if the product is not
+            a `geokube.DataCube`
+        """
+
+        def _build_schema() -> ProductSchema | None:
+            kube = self.get_cached_product_or_read(dataset_id, product_id)
+            if not isinstance(kube, DataCube):
+                return None
+            try:
+                return ProductSchema.from_kube(kube)
+            except Exception:  # pylint: disable=broad-except
+                self._LOG.warning(
+                    "could not build schema of `%s.%s`",
+                    dataset_id,
+                    product_id,
+                    exc_info=True,
+                )
+                return None
+
+        return self._schemas.get_or_load(
+            (self.catalog_version, dataset_id, product_id), _build_schema
+        )
+
+    def eligible_products(
+        self, role: str | list[str] | None = None
+    ) -> frozenset[tuple[str, str]]:
+        """Get the set of `(dataset_id, product_id)` pairs eligible for
+        the `role`. If `role` is `None`, the `public` role is considered.
+
+        Parameters
+        ----------
+        role : optional str or list of str, default=`None`
+            Role code(s) for which eligible products should be returned
+
+        Returns
+        -------
+        products : frozenset of tuples
+            Eligible `(dataset_id, product_id)` pairs
+        """
+        return self.snapshot.eligible_products(role=role)
+
     def is_product_valid_for_role(
         self,
         dataset_id: str,
         product_id: str,
         role: str | list[str] | None = None,
     ):
-        entry = self.catalog(CACHE_DIR=self.cache_dir)[dataset_id][product_id]
-        product_role = BaseRole.PUBLIC
-        if entry.metadata:
-            product_role = entry.metadata.get("role", BaseRole.PUBLIC)
-        if product_role == BaseRole.PUBLIC:
-            return True
-        if not role:
-            # NOTE: it means, we consider the public profile
-            return False
-        if BaseRole.ADMIN in role:
-            return True
-        if product_role in role:
-            return True
-        return False
+        return (dataset_id, product_id) in self.eligible_products(role=role)
+
+    @staticmethod
+    def _maybe_int(value: str | None) -> int | None:
+        return None if value is None else int(value)
+
+    @staticmethod
+    def _estimate_metadata_footprint(kube: DataCube | Dataset) -> int:
+        """Estimate the number of bytes kept in memory by the lazy kube,
+        i.e. by its coordinates"""
+        if isinstance(kube, Delayed):
+            return 0
+        if isinstance(kube, Dataset):
+            return int(kube.data.memory_usage(index=True).sum()) + sum(
+                Datastore._estimate_metadata_footprint(cube)
+                for cube in kube.data[kube.DATACUBE_COL]
+            )
+        coords = {}
+        for field in kube.fields.values():
+            for name, coord in field.coords.items():
+                coords.setdefault(name, coord)
+        return sum(coord.nbytes for coord in coords.values())
 
     @staticmethod
     def _process_query(kube, query: GeoQuery, compute: None | bool = False):
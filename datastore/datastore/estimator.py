@@ -0,0 +1,272 @@
+"""Module with the metadata-only estimator of the query result size"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Mapping
+
+import numpy as np
+
+from geoquery.geoquery import GeoQuery
+
+from .exception import EstimationNotSupportedError
+
+AXES = ("time", "vertical", "latitude", "longitude")
+_TIME_COMPONENTS = ("year", "month", "day", "hour")
+
+
+@dataclass(frozen=True)
+class FieldSchema:
+    """Dimensions, shape and item size of the field"""
+
+    dims: tuple[str, ...]
+    shape: tuple[int, ...]
+    itemsize: int
+
+
+@dataclass(frozen=True)
+class AxisSchema:
+    """Dimension and sorted values of the 1-D coordinate of the axis"""
+
+    dim: str
+    values: np.ndarray
+
+
+@dataclass(frozen=True)
+class ProductSchema:
+    """Minimal description of a product required for the size estimation.
+
+    Axes which are present in the product but cannot be used for
+    the estimation (e.g. 2-D latitude of curvilinear grids) map to `None`.
+    """
+
+    fields: Mapping[str, FieldSchema]
+    axes: Mapping[str, AxisSchema | None]
+
+    @classmethod
+    def from_kube(cls, kube) -> "ProductSchema":
+        """Build the schema of `geokube.DataCube` using its metadata only
+
+        Parameters
+        ----------
+        kube : geokube.DataCube
+            Lazy datacube
+
+        Returns
+        -------
+        schema : ProductSchema
+            Schema of the datacube
+        """
+        axes = {}
+        for axis in AXES:
+            try:
+                coord = getattr(kube, axis)
+            except (AttributeError, KeyError):
+                continue
+            if coord is None:
+                continue
+            dims = tuple(coord.dim_names)
+            if len(dims) != 1:
+                axes[axis] = None
+                continue
+            axes[axis] = AxisSchema(
+                dim=dims[0], values=np.sort(np.asarray(coord.values))
+            )
+        fields = {}
+        for name, field in kube.fields.items():
+            shape = tuple(field.shape)
+            size = math.prod(shape)
+            fields[name] = FieldSchema(
+                dims=tuple(field.dim_names),
+                shape=shape,
+                itemsize=field.nbytes // size if size else 0,
+            )
+        return cls(fields=fields, axes=axes)
+
+    def axis(self, name: str) -> AxisSchema:
+        """Get the schema of the axis usable for the estimation
+
+        Raises
+        ------
+        EstimationNotSupportedError
+            If the axis is not present or is not 1-D
+        """
+        if (axis := self.axes.get(name)) is None:
+            raise EstimationNotSupportedError(
+                f"axis `{name}` is missing or is not one-dimensional"
+            )
+        return axis
+
+
+def _count_in_range(values: np.ndarray, low, high) -> int:
+    """Count sorted `values` in the closed range [low, high]"""
+    return int(
+        np.searchsorted(values, high, side="right")
+        - np.searchsorted(values, low, side="left")
+    )
+
+
+def _count_longitude(values: np.ndarray, west, east) -> int:
+    if values.size and values[-1] > 180.0:
+        west = None if west is None else west % 360.0
+        east = None if east is None else east % 360.0
+    low = -np.inf if west is None else west
+    high = np.inf if east is None else east
+    if low <= high:
+        return _count_in_range(values, low, high)
+    # NOTE: bounding box crossing the antimeridian
+    return _count_in_range(values, low, np.inf) + _count_in_range(
+        values, -np.inf, high
+    )
+
+
+def _to_datetime(value: str, dtype: np.dtype) -> tuple:
+    """Convert partial date string to the half-open range of datetimes
+    it represents, e.g. `2012-01` to [2012-01-01, 2012-02-01)"""
+    start = np.datetime64(value)
+    unit, _ = np.datetime_data(start.dtype)
+    stop = start + np.timedelta64(1, unit)
+    return start.astype(dtype), stop.astype(dtype)
+
+
+def _count_time(values: np.ndarray, time: dict) -> int:
+    if not np.issubdtype(values.dtype, np.datetime64):
+        raise EstimationNotSupportedError(
+            f"time coordinate of dtype `{values.dtype}` is not supported"
+        )
+    if "start" in time or "stop" in time:
+        if time.get("step") is not None:
+            raise EstimationNotSupportedError("time step is not supported")
+        low = (
+            np.searchsorted(
+                values, _to_datetime(time["start"], values.dtype)[0], "left"
+            )
+            if time.get("start") is not None
+            else 0
+        )
+        high = (
+            np.searchsorted(
+                values, _to_datetime(time["stop"], values.dtype)[1], "left"
+            )
+            if time.get("stop") is not None
+            else values.size
+        )
+        return max(int(high - low), 0)
+    if unknown := set(time) - set(_TIME_COMPONENTS):
+        raise EstimationNotSupportedError(
+            f"time components {sorted(unknown)} are not supported"
+        )
+    components = {
+        "year": values.astype("datetime64[Y]").astype(np.int64) + 1970,
+        "month": values.astype("datetime64[M]").astype(np.int64) % 12 + 1,
+        "day": (
+            values.astype("datetime64[D]") - values.astype("datetime64[M]")
+        ).astype(np.int64)
+        + 1,
+        "hour": (
+            values.astype("datetime64[h]") - values.astype("datetime64[D]")
+        ).astype(np.int64),
+    }
+    mask = np.ones(values.shape, dtype=bool)
+    for name, selected in time.items():
+        if not isinstance(selected, (list, tuple)):
+            selected = [selected]
+        mask &= np.isin(components[name], [int(item) for item in selected])
+    return int(np.count_nonzero(mask))
+
+
+def _count_vertical(values: np.ndarray, vertical) -> int:
+    if isinstance(vertical, dict):
+        if vertical.get("step") is not None:
+            raise EstimationNotSupportedError(
+                "vertical step is not supported"
+            )
+        low, high = vertical.get("start"), vertical.get("stop")
+        low = -np.inf if low is None else low
+        high = np.inf if high is None else high
+        return _count_in_range(values, min(low, high), max(low, high))
+    if isinstance(vertical, (list, tuple)):
+        # NOTE: nearest neighbours are selected for each level
+        return len(vertical)
+    return 1
+
+
+def _selected_counts(schema: ProductSchema, query: GeoQuery) -> dict:
+    """Compute the number of selected elements along affected dimensions"""
+    counts = {}
+    if query.area:
+        area = query.area
+        lat = schema.axis("latitude")
+        lon = schema.axis("longitude")
+        south = area.get("south", -np.inf)
+        north = area.get("north", np.inf)
+        counts[lat.dim] = _count_in_range(
+            lat.values, min(south, north), max(south, north)
+        )
+        counts[lon.dim] = _count_longitude(
+            lon.values, area.get("west"), area.get("east")
+        )
+    if query.location:
+        lat = schema.axis("latitude")
+        lon = schema.axis("longitude")
+        if lat.dim == lon.dim:
+            raise EstimationNotSupportedError(
+                "locations for point-based products are not supported"
+            )
+        points = query.location.get("latitude")
+        npoints = len(points) if isinstance(points, (list, tuple)) else 1
+        # NOTE: latitude and longitude dimensions are replaced by
+        # the single `points` dimension
+        counts[lat.dim] = npoints
+        counts[lon.dim] = 1
+    if query.time:
+        time = schema.axis("time")
+        counts[time.dim] = _count_time(time.values, query.time)
+    if query.vertical:
+        vertical = schema.axis("vertical")
+        counts[vertical.dim] = _count_vertical(vertical.values, query.vertical)
+    return counts
+
+
+def estimate_nbytes(schema: ProductSchema, query: GeoQuery) -> int:
+    """Estimate the size of the query result without building the subset.
+
+    Parameters
+    ----------
+    schema : ProductSchema
+        Schema of the product
+    query : GeoQuery
+        Query to be estimated
+
+    Returns
+    -------
+    size : int
+        Estimated number of bytes of the result
+
+    Raises
+    ------
+    EstimationNotSupportedError
+        If the query cannot be estimated analytically for the product
+    """
+    # NOTE: `query.filters` apply to `geokube.Dataset` only and are
+    # ignored for datacubes, exactly as in `Datastore._process_query`
+    if query.variable is None:
+        fields = list(schema.fields)
+    elif isinstance(query.variable, str):
+        fields = [query.variable]
+    else:
+        fields = list(query.variable)
+    if missing := set(fields) - set(schema.fields):
+        raise EstimationNotSupportedError(
+            f"fields {sorted(missing)} are not defined for the product"
+        )
+    counts = _selected_counts(schema, query)
+    nbytes = 0
+    for name in fields:
+        field = schema.fields[name]
+        size = math.prod(
+            counts.get(dim, length)
+            for dim, length in zip(field.dims, field.shape)
+        )
+        nbytes += size * field.itemsize
+    return nbytes
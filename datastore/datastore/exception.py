@@ -3,3 +3,7 @@
 
 class UnauthorizedError(ValueError):
     """Role is not authorized"""
+
+
+class EstimationNotSupportedError(ValueError):
+    """Size of the query result cannot be estimated analytically"""
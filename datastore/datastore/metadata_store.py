@@ -0,0 +1,201 @@
+"""Module with the persistent, on-disk store of product metadata snapshots"""
+from __future__ import annotations
+
+import os
+import json
+import glob
+import mmap
+import pickle
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from typing import Any
+
+import cloudpickle
+
+SNAPSHOT_FORMAT_VERSION = 1
+_MAGIC = b"GEOLAKE-PRODUCT-SNAPSHOT\n"
+_CONFIG_ATTRS = (
+    "path",
+    "pattern",
+    "field_id",
+    "delay_read_cubes",
+    "mapping",
+    "xarray_kwargs",
+)
+
+
+def _hash_json(item: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(item, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def source_config_hash(source) -> str:
+    """Compute hash of the intake source configuration which affects
+    the structure of the product"""
+    config = {attr: getattr(source, attr, None) for attr in _CONFIG_ATTRS}
+    config["driver"] = type(source).__qualname__
+    if (preprocess := getattr(source, "preprocess", None)) is not None:
+        config["preprocess"] = getattr(preprocess, "keywords", None)
+    return _hash_json(config)
+
+
+def source_files_hash(source) -> str | None:
+    """Compute hash of the list of files matching the `path` of the
+    source along with their sizes and modification times.
+    Returns `None` if the source does not define a local `path`."""
+    if not isinstance(path := getattr(source, "path", None), str):
+        return None
+    files = []
+    for file_path in sorted(glob.glob(path)):
+        stat = os.stat(file_path)
+        files.append((file_path, stat.st_size, stat.st_mtime_ns))
+    return _hash_json(files)
+
+
+class ProductMetadataStore:
+    """Versioned, on-disk snapshots of lazily opened products.
+
+    Each product is stored in a single file consisting of a JSON header
+    and the pickled lazy kube, i.e. its coordinates, fields schema, list
+    of files and, for `geokube.Dataset`, the per-file attribute table.
+    A snapshot is reused only if the format version, the source
+    configuration and the list of underlying files (with their sizes and
+    modification times) did not change. Invalid snapshots are rebuilt
+    independently for each product. If the directory cannot be created,
+    snapshots are disabled and products are always read from sources.
+
+    Parameters
+    ----------
+    path : str
+        Directory where snapshots are stored
+    """
+
+    _LOG = logging.getLogger("geokube.ProductMetadataStore")
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = path
+        self.enabled = True
+        try:
+            os.makedirs(self.path, exist_ok=True)
+        except OSError:
+            self._LOG.error(
+                "could not create snapshots directory `%s`. snapshots"
+                " are disabled",
+                self.path,
+                exc_info=True,
+            )
+            self.enabled = False
+
+    def _snapshot_path(self, dataset_id: str, product_id: str) -> str:
+        name = f"{dataset_id}.{product_id}".replace(os.sep, "_")
+        return os.path.join(self.path, f"{name}.kube")
+
+    def _expected_header(self, dataset_id, product_id, source) -> dict:
+        return {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "dataset_id": dataset_id,
+            "product_id": product_id,
+            "config_hash": source_config_hash(source),
+            "files_hash": source_files_hash(source),
+        }
+
+    def load(self, dataset_id: str, product_id: str, source):
+        """Load the snapshot of the product if it is still valid
+
+        Parameters
+        ----------
+        dataset_id : str
+            ID of the dataset
+        product_id : str
+            ID of the product
+        source : intake.source.base.DataSource
+            Source of the product in the catalog
+
+        Returns
+        -------
+        kube : DataCube or Dataset or None
+            Product restored from the snapshot or `None` if the snapshot
+            does not exist or is outdated
+        """
+        path = self._snapshot_path(dataset_id, product_id)
+        if not os.path.exists(path):
+            return None
+        expected = self._expected_header(dataset_id, product_id, source)
+        try:
+            with open(path, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buffer:
+                if buffer[: len(_MAGIC)] != _MAGIC:
+                    raise ValueError("not a product snapshot file")
+                header_end = buffer.find(b"\n", len(_MAGIC)) + 1
+                header = json.loads(buffer[len(_MAGIC) : header_end])
+                if any(header.get(k) != v for k, v in expected.items()):
+                    self._LOG.info(
+                        "snapshot of `%s.%s` is outdated",
+                        dataset_id,
+                        product_id,
+                    )
+                    return None
+                with memoryview(buffer) as view:
+                    return pickle.loads(view[header_end:])
+        except Exception:  # pylint: disable=broad-except
+            self._LOG.warning(
+                "could not load snapshot of `%s.%s`",
+                dataset_id,
+                product_id,
+                exc_info=True,
+            )
+            return None
+
+    def dump(self, dataset_id: str, product_id: str, source, kube) -> None:
+        """Store the snapshot of the product. The file is replaced
+        atomically so concurrent readers never see partial snapshots."""
+        header = self._expected_header(dataset_id, product_id, source)
+        header["created_on"] = datetime.utcnow().isoformat()
+        try:
+            payload = cloudpickle.dumps(kube, protocol=5)
+        except Exception:  # pylint: disable=broad-except
+            self._LOG.warning(
+                "product `%s.%s` cannot be pickled. snapshot skipped",
+                dataset_id,
+                product_id,
+                exc_info=True,
+            )
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(_MAGIC)
+                file.write(json.dumps(header).encode("utf-8") + b"\n")
+                file.write(payload)
+            os.replace(
+                tmp_path, self._snapshot_path(dataset_id, product_id)
+            )
+        except OSError:
+            self._LOG.warning(
+                "could not write snapshot of `%s.%s`",
+                dataset_id,
+                product_id,
+                exc_info=True,
+            )
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_or_read(self, dataset_id: str, product_id: str, source):
+        """Load the product from its snapshot or read it from the source
+        and store the new snapshot"""
+        if not self.enabled:
+            return source.read_chunked()
+        if (kube := self.load(dataset_id, product_id, source)) is not None:
+            self._LOG.debug(
+                "product `%s.%s` restored from snapshot",
+                dataset_id,
+                product_id,
+            )
+            return kube
+        kube = source.read_chunked()
+        self.dump(dataset_id, product_id, source, kube)
+        return kube
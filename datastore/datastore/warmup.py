@@ -0,0 +1,215 @@
+"""Module with the engine warming up the product metadata cache"""
+from __future__ import annotations
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from dataclasses import dataclass, field
+from typing import Callable
+
+import intake
+
+DEFAULT_WARMUP_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def read_product_in_subprocess(
+    catalog_path: str, cache_dir: str, dataset_id: str, product_id: str
+):
+    """Open the catalog and read the product lazily. Used as the target
+    of the process pool, where the parent catalog cannot be shared."""
+    catalog = intake.open_catalog(catalog_path)(CACHE_DIR=cache_dir)
+    return catalog[dataset_id][product_id].read_chunked()
+
+
+def _timed_call(func: Callable, *args):
+    start = time.monotonic()
+    try:
+        return func(*args), time.monotonic() - start
+    except Exception as err:
+        # NOTE: the attribute is pickled with the error by process pools
+        err.duration_sec = time.monotonic() - start
+        raise
+
+
+@dataclass(frozen=True)
+class ProductLoadRecord:
+    """Result of loading a single product during the warm-up"""
+
+    dataset_id: str
+    product_id: str
+    duration_sec: float
+    error: str | None = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+@dataclass
+class WarmupReport:
+    """Progress and per-product statistics of the warm-up"""
+
+    total: int = 0
+    records: list[ProductLoadRecord] = field(default_factory=list)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def loaded(self) -> int:
+        return sum(1 for rec in self.records if not rec.failed)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for rec in self.records if rec.failed)
+
+    def to_dict(self) -> dict:
+        """Return the summary of the warm-up"""
+        end = self.finished_at or time.monotonic()
+        return {
+            "total": self.total,
+            "loaded": self.loaded,
+            "failed": self.failed,
+            "elapsed_sec": (
+                round(end - self.started_at, 3) if self.started_at else None
+            ),
+            "failures": {
+                f"{rec.dataset_id}.{rec.product_id}": rec.error
+                for rec in self.records
+                if rec.failed
+            },
+        }
+
+
+class CacheWarmer:
+    """Load products concurrently in a bounded thread or process pool.
+
+    Loaded products are passed to the `on_loaded` callback as soon as
+    they are ready. Progress is available via `report` and completion
+    is signalled with the `done` event.
+    """
+
+    _LOG = logging.getLogger("geokube.CacheWarmer")
+
+    def __init__(
+        self,
+        products: list[tuple[str, str]],
+        read_product: Callable,
+        on_loaded: Callable,
+        max_workers: int | None = None,
+        executor: str = "thread",
+        subprocess_args: tuple[str, str] | None = None,
+    ) -> None:
+        if executor not in {"thread", "process"}:
+            raise ValueError(
+                f"executor `{executor}` is not supported. use one of:"
+                " `thread`, `process`"
+            )
+        if executor == "process" and subprocess_args is None:
+            raise ValueError(
+                "`subprocess_args` (catalog path and cache dir) are required"
+                " for the `process` executor"
+            )
+        self.products = list(products)
+        self.max_workers = max_workers or DEFAULT_WARMUP_WORKERS
+        self.executor = executor
+        self._read_product = read_product
+        self._on_loaded = on_loaded
+        self._subprocess_args = subprocess_args
+        self.report = WarmupReport(total=len(self.products))
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def _make_pool(self) -> Executor:
+        if self.executor == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="cache-warmup"
+        )
+
+    def _submit(self, pool: Executor, dataset_id: str, product_id: str):
+        if self.executor == "process":
+            return pool.submit(
+                _timed_call,
+                read_product_in_subprocess,
+                *self._subprocess_args,
+                dataset_id,
+                product_id,
+            )
+        return pool.submit(
+            _timed_call, self._read_product, dataset_id, product_id
+        )
+
+    def run(self) -> WarmupReport:
+        """Load all products and block until finished"""
+        self.report.started_at = time.monotonic()
+        self._LOG.info(
+            "warming up cache for %d products with %d %s workers",
+            len(self.products),
+            self.max_workers,
+            self.executor,
+        )
+        try:
+            with self._make_pool() as pool:
+                futures = {
+                    self._submit(pool, dataset_id, product_id): (
+                        dataset_id,
+                        product_id,
+                    )
+                    for dataset_id, product_id in self.products
+                }
+                for future in as_completed(futures):
+                    self._collect(future, *futures[future])
+        finally:
+            self.report.finished_at = time.monotonic()
+            self.done.set()
+        self._LOG.info("cache warm-up finished: %s", self.report.to_dict())
+        return self.report
+
+    def start(self) -> threading.Thread:
+        """Run the warm-up in the background daemon thread"""
+        thread = threading.Thread(
+            target=self.run, name="cache-warmup", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _collect(self, future, dataset_id, product_id):
+        error = None
+        duration_sec = 0.0
+        try:
+            kube, duration_sec = future.result()
+            self._on_loaded(dataset_id, product_id, kube)
+        except Exception as err:  # pylint: disable=broad-except
+            duration_sec = getattr(err, "duration_sec", 0.0)
+            self._LOG.error(
+                "failed to load cache for `%s.%s` in %.3f sec",
+                dataset_id,
+                product_id,
+                duration_sec,
+                exc_info=True,
+            )
+            error = f"{type(err).__name__}: {err}"
+        record = ProductLoadRecord(
+            dataset_id=dataset_id,
+            product_id=product_id,
+            duration_sec=duration_sec,
+            error=error,
+        )
+        with self._lock:
+            self.report.records.append(record)
+        if error is None:
+            self._LOG.info(
+                "loaded `%s.%s` in %.3f sec (%d/%d)",
+                dataset_id,
+                product_id,
+                record.duration_sec,
+                len(self.report.records),
+                self.report.total,
+            )
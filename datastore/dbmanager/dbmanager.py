@@ -7,6 +7,7 @@ import uuid
 import secrets
 from datetime import datetime
 from enum import auto, Enum as Enum_, unique
+from typing import Callable
 
 from sqlalchemy import (
     Column,
@@ -14,23 +15,40 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     Sequence,
     String,
     Table,
+    inspect,
+    insert,
+    text,
+    tuple_,
+    update,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 
+from utils.env import is_true
+
 from .singleton import Singleton
 
 
-def is_true(item) -> bool:
-    """If `item` represents `True` value"""
-    if isinstance(item, str):
-        return item.lower() in ["y", "yes", "true", "t"]
-    return bool(item)
+# NOTE: `create_all` does not alter existing tables, so columns and indices
+# added to existing tables are created with idempotent statements run
+# at startup (see `DBManager.upgrade_database`)
+_SCHEMA_UPGRADES = [
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS query_hash varchar(64)",
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS reused_request_id integer"
+    " REFERENCES requests (request_id)",
+    "CREATE INDEX IF NOT EXISTS ix_requests_query_hash"
+    " ON requests (query_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_requests_user_id_created_on"
+    " ON requests (user_id, created_on)",
+    "CREATE INDEX IF NOT EXISTS ix_requests_status ON requests (status)",
+]
+_SCHEMA_UPGRADE_LOCK_KEY = 0x6765_6F6C
 
 
 def generate_key() -> str:
@@ -101,8 +119,11 @@ class Worker(Base):
 
 class Request(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        Index("ix_requests_user_id_created_on", "user_id", "created_on"),
+    )
     request_id = Column(Integer, primary_key=True)
-    status = Column(Enum(RequestStatus), nullable=False)
+    status = Column(Enum(RequestStatus), nullable=False, index=True)
     priority = Column(Integer)
     user_id = Column(
         UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False
@@ -111,6 +132,8 @@ class Request(Base):
     dataset = Column(String(255))
     product = Column(String(255))
     query = Column(JSON())
+    query_hash = Column(String(64), index=True)
+    reused_request_id = Column(Integer, ForeignKey("requests.request_id"))
     estimate_size_bytes = Column(Integer)
     created_on = Column(DateTime, nullable=False)
     last_update = Column(DateTime)
@@ -142,6 +165,25 @@ class Storage(Base):
 
 class DBManager(metaclass=Singleton):
     _LOG = logging.getLogger("geokube.DBManager")
+    # NOTE: callbacks called with the ID of the user whose details
+    # (API key or roles) changed, e.g. to invalidate caches
+    _user_change_listeners: list = []
+
+    @classmethod
+    def add_user_change_listener(cls, listener) -> None:
+        """Register the callback called with the ID of the changed user"""
+        cls._user_change_listeners.append(listener)
+
+    def _notify_user_changed(self, user_id) -> None:
+        for listener in self._user_change_listeners:
+            try:
+                listener(user_id)
+            except Exception:  # pylint: disable=broad-except
+                self._LOG.warning(
+                    "user change listener failed for `%s`",
+                    user_id,
+                    exc_info=True,
+                )
 
     def __init__(self) -> None:
         for venv_key in [
@@ -171,9 +213,21 @@ class DBManager(metaclass=Singleton):
         url = f"postgresql://{user}:{password}@{host}:{port}/{database}"
         self._LOG.info("db connection: `%s`", url)
         self.__engine = create_engine(
-            url, echo=is_true(os.environ.get("DB_LOGGING", False))
+            url,
+            echo=is_true(os.environ.get("DB_LOGGING", False)),
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10)),
+            pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT_SEC", 30)),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE_SEC", 1800)),
+            pool_pre_ping=is_true(os.environ.get("DB_POOL_PRE_PING", True)),
         )
-        self.__session_maker = sessionmaker(bind=self.__engine)
+        # NOTE: objects are not expired on commit, so returning them
+        # (e.g. IDs of new rows) does not need additional round trips
+        self.__session_maker = sessionmaker(
+            bind=self.__engine, expire_on_commit=False
+        )
+        if is_true(os.environ.get("DB_UPGRADE_ON_STARTUP", True)):
+            self.upgrade_database()
 
     def _create_database(self):
         try:
@@ -183,6 +237,29 @@ class DBManager(metaclass=Singleton):
                 "could not create a database due to an error", exc_info=True
             )
             raise exception
+        self.upgrade_database()
+
+    def upgrade_database(self) -> None:
+        """Add columns and indices missing in existing tables. Statements
+        are idempotent, so they are safe to run on each startup."""
+        try:
+            with self.__engine.begin() as connection:
+                # NOTE: services starting concurrently upgrade one by one
+                connection.execute(
+                    text("SELECT pg_advisory_xact_lock(:key)"),
+                    {"key": _SCHEMA_UPGRADE_LOCK_KEY},
+                )
+                if not inspect(connection).has_table(Request.__tablename__):
+                    # NOTE: tables are created with the current schema
+                    return
+                for statement in _SCHEMA_UPGRADES:
+                    connection.execute(text(statement))
+        except Exception as exception:
+            self._LOG.error(
+                "could not upgrade the database due to an error",
+                exc_info=True,
+            )
+            raise exception
 
     def add_user(
         self,
@@ -206,6 +283,7 @@ class DBManager(metaclass=Singleton):
                 )
             session.add(user)
             session.commit()
+            self._notify_user_changed(user.user_id)
             return user
 
     def get_user_details(self, user_id: int):
@@ -243,9 +321,10 @@ class DBManager(metaclass=Singleton):
         product: str | None = None,
         query: str | None = None,
         worker_id: int | None = None,
-        priority: str | None = None,
+        priority: int | None = None,
         estimate_size_bytes: int | None = None,
         status: RequestStatus = RequestStatus.PENDING,
+        query_hash: str | None = None,
     ) -> int:
         # TODO: Add more request-related parameters to this method.
         with self.__session_maker() as session:
@@ -257,6 +336,7 @@ class DBManager(metaclass=Singleton):
                 dataset=dataset,
                 product=product,
                 query=query,
+                query_hash=query_hash,
                 estimate_size_bytes=estimate_size_bytes,
                 created_on=datetime.utcnow(),
             )
@@ -264,6 +344,193 @@ class DBManager(metaclass=Singleton):
             session.commit()
             return request.request_id
 
+    @staticmethod
+    def _reusable_requests(
+        session, query_hash: str, created_after: datetime | None = None
+    ):
+        query = session.query(Request).where(
+            Request.query_hash == query_hash,
+            Request.reused_request_id.is_(None),
+            Request.status.in_(
+                [
+                    RequestStatus.DONE,
+                    RequestStatus.PENDING,
+                    RequestStatus.RUNNING,
+                ]
+            ),
+        )
+        if created_after is not None:
+            query = query.where(Request.created_on >= created_after)
+        return query.order_by(Request.created_on.desc())
+
+    def get_reusable_requests(
+        self,
+        query_hash: str,
+        created_after: datetime | None = None,
+    ) -> list[Request]:
+        """Get requests with the given `query_hash` which are either done
+        (and have downloads) or still pending or running, newest first.
+        Requests linked to other ones are skipped."""
+        with self.__session_maker() as session:
+            return self._reusable_requests(
+                session, query_hash, created_after
+            ).all()
+
+    @staticmethod
+    def _link_request(
+        session,
+        reused_request_id: int,
+        user_id,
+        query: str | None,
+        estimate_size_bytes: int | None,
+        is_result_available: Callable[[str], bool],
+    ) -> int | None:
+        # NOTE: the reused request is locked until the transaction ends,
+        # so its status cannot change before the linked request exists
+        # and `update_requests` propagates the status to the new one
+        reused_request = (
+            session.query(Request)
+            .where(Request.request_id == reused_request_id)
+            .with_for_update()
+            .one_or_none()
+        )
+        if reused_request is None or reused_request.status not in (
+            RequestStatus.DONE,
+            RequestStatus.PENDING,
+            RequestStatus.RUNNING,
+        ):
+            return None
+        download = reused_request.download
+        if reused_request.status is RequestStatus.DONE and (
+            download is None
+            or not download.location_path
+            or not is_result_available(download.location_path)
+        ):
+            return None
+        now = datetime.utcnow()
+        request = Request(
+            status=reused_request.status,
+            priority=reused_request.priority,
+            user_id=user_id,
+            worker_id=reused_request.worker_id,
+            dataset=reused_request.dataset,
+            product=reused_request.product,
+            query=query,
+            query_hash=reused_request.query_hash,
+            reused_request_id=reused_request.request_id,
+            estimate_size_bytes=estimate_size_bytes,
+            fail_reason=reused_request.fail_reason,
+            created_on=now,
+            last_update=now,
+        )
+        session.add(request)
+        session.flush()
+        if reused_request.status is RequestStatus.DONE:
+            session.add(
+                Download(
+                    location_path=download.location_path,
+                    storage_id=download.storage_id,
+                    request_id=request.request_id,
+                    created_on=now,
+                    download_uri=f"/download/{request.request_id}",
+                    size_bytes=download.size_bytes,
+                )
+            )
+        return request.request_id
+
+    def create_linked_request(
+        self,
+        reused_request_id: int,
+        user_id,
+        query: str | None = None,
+        estimate_size_bytes: int | None = None,
+        is_result_available: Callable[[str], bool] = os.path.exists,
+    ) -> int | None:
+        """Create the request reusing the execution of the request with
+        `reused_request_id`. The reused request is locked and its current
+        status is copied in the same transaction. If it is done, the new
+        request is done immediately and gets its own download pointing
+        to the same file. Otherwise, it follows the status of the reused
+        request.
+
+        Returns
+        -------
+        request_id : int or None
+            ID of the new request or `None` if the reused request failed
+            in the meantime or its result is not available
+        """
+        with self.__session_maker() as session, session.begin():
+            return self._link_request(
+                session,
+                reused_request_id,
+                user_id=user_id,
+                query=query,
+                estimate_size_bytes=estimate_size_bytes,
+                is_result_available=is_result_available,
+            )
+
+    def create_or_link_request(
+        self,
+        user_id,
+        dataset: str,
+        product: str,
+        query: str,
+        query_hash: str,
+        created_after: datetime | None = None,
+        priority: int | None = None,
+        estimate_size_bytes: int | None = None,
+        is_result_available: Callable[[str], bool] = os.path.exists,
+    ) -> tuple[int, int | None]:
+        """Link the new request to the newest identical one which can be
+        reused (see `create_linked_request`) or create the new pending
+        request if there is none. Requests with the same `query_hash` are
+        created one by one, so identical requests submitted concurrently
+        are linked, too.
+
+        Returns
+        -------
+        request_id : int
+            ID of the new request
+        reused_request_id : int or None
+            ID of the reused request or `None` if the new request should
+            be executed
+        """
+        with self.__session_maker() as session, session.begin():
+            session.execute(
+                text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                {"key": query_hash},
+            )
+            candidates = (
+                self._reusable_requests(session, query_hash, created_after)
+                .with_entities(Request.request_id)
+                .all()
+            )
+            for (candidate_id,) in candidates:
+                request_id = self._link_request(
+                    session,
+                    candidate_id,
+                    user_id=user_id,
+                    query=query,
+                    estimate_size_bytes=estimate_size_bytes,
+                    is_result_available=is_result_available,
+                )
+                if request_id is not None:
+                    return request_id, candidate_id
+            request = Request(
+                status=RequestStatus.PENDING,
+                priority=priority,
+                user_id=user_id,
+                dataset=dataset,
+                product=product,
+                query=query,
+                query_hash=query_hash,
+                estimate_size_bytes=estimate_size_bytes,
+                created_on=datetime.utcnow(),
+            )
+            session.add(request)
+            session.flush()
+            return request.request_id, None
+
     def update_request(
         self,
         request_id: int,
@@ -273,25 +540,113 @@ class DBManager(metaclass=Singleton):
         size_bytes: int = None,
         fail_reason: str = None,
     ) -> int:
-        with self.__session_maker() as session:
-            request = session.query(Request).get(request_id)
-            request.status = status
-            request.worker_id = worker_id
-            request.last_update = datetime.utcnow()
-            request.fail_reason = fail_reason
-            session.commit()
+        results = None
+        if status is RequestStatus.DONE:
+            results = {request_id: (location_path, size_bytes)}
+        self.update_requests(
+            request_ids=[request_id],
+            worker_id=worker_id,
+            status=status,
+            fail_reason=fail_reason,
+            results=results,
+        )
+        return request_id
+
+    def update_requests(
+        self,
+        request_ids: list[int],
+        worker_id: int,
+        status: RequestStatus,
+        fail_reason: str = None,
+        results: dict[int, tuple[str, int | None]] | None = None,
+    ) -> list[int]:
+        """Change the status of many requests in a single transaction.
+        The status is propagated to the pending requests linked to them.
+
+        Parameters
+        ----------
+        request_ids : list of int
+            IDs of requests
+        worker_id : int
+            ID of the worker
+        status : RequestStatus
+            New status of requests
+        fail_reason : str, optional
+            Reason of the failure
+        results : dict, optional
+            Location path and size (in bytes) of the result, keyed by
+            the request ID. Required for the `DONE` status
+
+        Returns
+        -------
+        request_ids : list of int
+            IDs of updated requests, without the linked ones
+
+        Raises
+        -------
+        IndexError
+            If none of requests exist
+        ValueError
+            If results are missing for the `DONE` status
+        """
+        if status is RequestStatus.DONE and (
+            results is None or set(request_ids) - set(results)
+        ):
+            raise ValueError("results are required for done requests")
+        now = datetime.utcnow()
+        values = {
+            "status": status,
+            "worker_id": worker_id,
+            "last_update": now,
+            "fail_reason": fail_reason,
+        }
+        with self.__session_maker() as session, session.begin():
+            updated_ids = (
+                session.execute(
+                    update(Request)
+                    .where(Request.request_id.in_(request_ids))
+                    .values(**values)
+                    .returning(Request.request_id)
+                    .execution_options(synchronize_session=False)
+                )
+                .scalars()
+                .all()
+            )
+            if not updated_ids:
+                raise IndexError(
+                    f"Requests with ids: `{request_ids}` do not exist!"
+                )
+            linked = session.execute(
+                update(Request)
+                .where(
+                    Request.reused_request_id.in_(updated_ids),
+                    Request.status.in_(
+                        [RequestStatus.PENDING, RequestStatus.RUNNING]
+                    ),
+                )
+                .values(**values)
+                .returning(Request.request_id, Request.reused_request_id)
+                .execution_options(synchronize_session=False)
+            ).all()
             if status is RequestStatus.DONE:
-                download = Download(
-                    location_path=location_path,
-                    storage_id=0,
-                    request_id=request.request_id,
-                    created_on=datetime.utcnow(),
-                    download_uri=f"/download/{request_id}",
-                    size_bytes=size_bytes,
+                owners = [(rid, rid) for rid in updated_ids] + [
+                    (row.request_id, row.reused_request_id) for row in linked
+                ]
+                session.execute(
+                    insert(Download),
+                    [
+                        {
+                            "location_path": results[reused_id][0],
+                            "storage_id": 0,
+                            "request_id": rid,
+                            "created_on": now,
+                            "download_uri": f"/download/{rid}",
+                            "size_bytes": results[reused_id][1],
+                        }
+                        for rid, reused_id in owners
+                    ],
                 )
-                session.add(download)
-                session.commit()
-            return request.request_id
+        return updated_ids
 
     def get_request_status_and_reason(
         self, request_id
@@ -303,10 +658,160 @@ class DBManager(metaclass=Singleton):
                 f"Request with id: `{request_id}` does not exist!"
             )
 
+    def get_requests_statuses(
+        self, request_ids: list[int], user_id=None
+    ) -> list[dict]:
+        """Get status, fail reason, size and download URI of requests
+        in a single query. Only the required columns are selected.
+
+        Parameters
+        ----------
+        request_ids : list of int
+            IDs of requests
+        user_id : optional
+            If passed, only requests of the user are returned
+
+        Returns
+        -------
+        statuses : list of dict
+            Details of found requests
+        """
+        if not request_ids:
+            return []
+        with self.__session_maker() as session:
+            query = (
+                session.query(
+                    Request.request_id,
+                    Request.status,
+                    Request.fail_reason,
+                    Download.size_bytes,
+                    Download.download_uri,
+                )
+                .outerjoin(Download, Download.request_id == Request.request_id)
+                .where(Request.request_id.in_(request_ids))
+            )
+            if user_id is not None:
+                query = query.where(Request.user_id == user_id)
+            return [row._asdict() for row in query]
+
+    def get_request_download(self, request_id: int) -> dict | None:
+        """Get status of the request and location of its result
+        in a single query
+
+        Parameters
+        ----------
+        request_id : int
+            ID of the request
+
+        Returns
+        -------
+        download : dict or None
+            Status, location path and size of the result, or `None`
+            if the request does not exist
+        """
+        with self.__session_maker() as session:
+            row = (
+                session.query(
+                    Request.status,
+                    Download.location_path,
+                    Download.size_bytes,
+                )
+                .outerjoin(Download, Download.request_id == Request.request_id)
+                .where(Request.request_id == request_id)
+                .first()
+            )
+            return None if row is None else row._asdict()
+
     def get_requests_for_user_id(self, user_id) -> list[Request]:
         with self.__session_maker() as session:
             return session.query(User).get(user_id).requests
 
+    def get_requests_page_for_user_id(
+        self,
+        user_id,
+        limit: int | None,
+        after: tuple[datetime, int] | None = None,
+        statuses: list[RequestStatus] | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        columns: list[str] | None = None,
+        with_download: bool = True,
+    ) -> list[dict]:
+        """Get the page of requests of the user, from the newest ones.
+        Requests are ordered by the creation time and ID, so the page
+        is selected with the keyset (`after`), using
+        the `(user_id, created_on)` index.
+
+        Parameters
+        ----------
+        user_id
+            ID of the user
+        limit : int or None
+            Maximum number of requests. All requests if `None`
+        after : tuple of datetime and int, optional
+            Creation time and ID of the last request of the previous page
+        statuses : list of RequestStatus, optional
+            If passed, only requests with those statuses are returned
+        created_from, created_to : datetime, optional
+            If passed, only requests created in the range are returned
+        columns : list of str, optional
+            Names of columns of requests to select. All if `None`
+        with_download : bool, default=True
+            If details of downloads should be returned, too
+
+        Returns
+        -------
+        requests : list of dict
+            Selected columns of requests. `created_on` and `request_id`
+            are always included. Downloads details are under
+            the `download` key
+        """
+        if columns is None:
+            columns = list(Request.__table__.columns.keys())
+        columns = list(
+            dict.fromkeys(["request_id", "created_on"] + list(columns))
+        )
+        entities = [getattr(Request, column) for column in columns]
+        download_columns = list(Download.__table__.columns.keys())
+        if with_download:
+            entities += [
+                getattr(Download, column).label(f"download_{column}")
+                for column in download_columns
+            ]
+        with self.__session_maker() as session:
+            query = session.query(*entities).where(Request.user_id == user_id)
+            if with_download:
+                query = query.outerjoin(
+                    Download, Download.request_id == Request.request_id
+                )
+            if statuses:
+                query = query.where(Request.status.in_(statuses))
+            if created_from is not None:
+                query = query.where(Request.created_on >= created_from)
+            if created_to is not None:
+                query = query.where(Request.created_on < created_to)
+            if after is not None:
+                query = query.where(
+                    tuple_(Request.created_on, Request.request_id)
+                    < tuple_(*after)
+                )
+            query = query.order_by(
+                Request.created_on.desc(), Request.request_id.desc()
+            ).limit(limit)
+            requests = []
+            for row in query:
+                item = {column: getattr(row, column) for column in columns}
+                if with_download:
+                    download = {
+                        column: getattr(row, f"download_{column}")
+                        for column in download_columns
+                    }
+                    if download["download_id"] is None:
+                        download = None
+                    item["download"] = download
+                requests.append(item)
+            return requests
+
     def get_download_details_for_request_id(self, request_id) -> Download:
         with self.__session_maker() as session:
             request_details = session.query(Request).get(request_id)
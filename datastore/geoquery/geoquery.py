@@ -1,4 +1,5 @@
 import json
+import hashlib
 from typing import Optional, List, Dict, Union, Mapping, Any, TypeVar
 
 from pydantic import BaseModel, root_validator, validator
@@ -6,6 +7,78 @@ from pydantic import BaseModel, root_validator, validator
 TGeoQuery = TypeVar("TGeoQuery")
 
 
+def _maybe_number(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return float(value) if "." in value else int(value)
+        except ValueError:
+            return value.strip()
+    return value
+
+
+def _canonical_variable(variable):
+    if variable is None:
+        return None
+    if isinstance(variable, str):
+        variable = [variable]
+    return sorted(set(variable))
+
+
+def _canonical_time(time):
+    if not time:
+        return None
+    if "start" in time or "stop" in time:
+        return {k: str(v).strip() for k, v in sorted(time.items())}
+    res = {}
+    for key, values in sorted(time.items()):
+        if not isinstance(values, list):
+            values = [values]
+        res[key] = sorted(
+            {_maybe_number(value) for value in values},
+            key=lambda value: (isinstance(value, str), value),
+        )
+    return res
+
+
+def _canonical_floats_dict(values):
+    if not values:
+        return None
+    return {
+        key: (
+            [float(item) for item in value]
+            if isinstance(value, list)
+            else float(value)
+        )
+        for key, value in sorted(values.items())
+    }
+
+
+def _canonical_vertical(vertical):
+    if vertical is None:
+        return None
+    if isinstance(vertical, dict):
+        return {
+            key: None if value is None else float(value)
+            for key, value in sorted(vertical.items())
+        }
+    if isinstance(vertical, list):
+        return [float(value) for value in vertical]
+    return float(vertical)
+
+
+def _canonical_filters(filters):
+    if not filters:
+        return None
+    return {
+        key: (
+            sorted({str(item) for item in value})
+            if isinstance(value, (list, tuple, set))
+            else str(value)
+        )
+        for key, value in sorted(filters.items())
+    }
+
+
 class GeoQuery(BaseModel, extra="allow"):
     variable: Optional[Union[str, List[str]]]
     # TODO: Check how `time` is to be represented
@@ -54,6 +127,36 @@ class GeoQuery(BaseModel, extra="allow"):
         res = dict(filter(lambda item: item[1] is not None, res.items()))
         return json.dumps(res)
 
+    def canonical(self) -> dict:
+        """Return the canonical form of the query, where equivalent queries
+        have equal representations: keys are sorted, empty values are
+        skipped, variables and time components are sorted lists and
+        numeric values are normalized"""
+        res = {
+            "variable": _canonical_variable(self.variable),
+            "time": _canonical_time(self.time),
+            "area": _canonical_floats_dict(self.area),
+            "location": _canonical_floats_dict(self.location),
+            "vertical": _canonical_vertical(self.vertical),
+            "filters": _canonical_filters(self.filters),
+            "format": self.format.lower() if self.format else None,
+        }
+        return {
+            key: value
+            for key, value in sorted(res.items())
+            if value not in (None, {}, [])
+        }
+
+    def canonical_json(self) -> str:
+        """Return the canonical JSON representation of the query"""
+        return json.dumps(self.canonical(), sort_keys=True)
+
+    def canonical_hash(self) -> str:
+        """Return SHA-256 digest of the canonical form of the query"""
+        return hashlib.sha256(
+            self.canonical_json().encode("utf-8")
+        ).hexdigest()
+
     @classmethod
     def parse(
         cls, load: TGeoQuery | dict | str | bytes | bytearray
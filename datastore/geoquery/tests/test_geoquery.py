@@ -63,3 +63,33 @@ def test_emtpy_filters():
     query = GeoQuery(**query_dict)
     assert isinstance(query.filters, dict)
     assert len(query.filters) == 0
+
+
+def test_canonical_form_of_equivalent_queries():
+    query1 = GeoQuery(
+        variable=["v2", "v1"],
+        time={"year": ["2020", "2019"], "month": ["03", "1"]},
+        area={"north": 10, "south": 0, "east": 5, "west": 1},
+        resolution="0.1",
+    )
+    query2 = GeoQuery.parse(
+        '{"resolution": "0.1", "area": {"west": 1.0, "east": 5.0, "south":'
+        ' 0.0, "north": 10.0}, "time": {"month": ["1", "3"], "year":'
+        ' ["2019", "2020"]}, "variable": ["v1", "v2", "v1"]}'
+    )
+    assert query1.canonical_json() == query2.canonical_json()
+    assert query1.canonical_hash() == query2.canonical_hash()
+
+
+def test_canonical_form_skips_empty_values():
+    query = GeoQuery(variable="wind_speed", format="NetCDF")
+    assert query.canonical() == {
+        "format": "netcdf",
+        "variable": ["wind_speed"],
+    }
+
+
+def test_canonical_form_of_different_queries_differ():
+    query1 = GeoQuery(variable="wind_speed", vertical=[1000, 850])
+    query2 = GeoQuery(variable="wind_speed", vertical=[850, 1000])
+    assert query1.canonical_hash() != query2.canonical_hash()
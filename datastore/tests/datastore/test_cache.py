@@ -0,0 +1,95 @@
+import pytest
+
+from datastore.cache import (
+    LFUProductCache,
+    LRUProductCache,
+    TTLCache,
+    make_product_cache,
+)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUProductCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert "a" in cache
+    assert "c" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = LFUProductCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("b")
+    cache.get("b")
+    cache.get("a")
+    cache.put("c", 3)
+    assert "a" not in cache
+    assert "b" in cache
+
+
+def test_evict_by_size():
+    cache = LRUProductCache(max_bytes=10, sizeof=len)
+    cache.put("a", "x" * 6)
+    cache.put("b", "x" * 6)
+    assert "a" not in cache
+    assert cache.stats()["bytes"] == 6
+
+
+def test_value_larger_than_limit_not_cached():
+    cache = LRUProductCache(max_bytes=5, sizeof=len)
+    cache.put("a", "x" * 6)
+    assert len(cache) == 0
+
+
+def test_get_or_load_counts_hits_and_misses():
+    cache = LRUProductCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "kube"
+
+    assert cache.get_or_load("a", loader) == "kube"
+    assert cache.get_or_load("a", loader) == "kube"
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_raise_on_unknown_policy():
+    with pytest.raises(ValueError, match=r"cache policy `fifo`*"):
+        _ = make_product_cache(policy="fifo")
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("datastore.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_ttl_cache_bounded():
+    cache = TTLCache(ttl=10, max_entries=1)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(ttl=10)
+    cache.put("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+    assert len(cache) == 0
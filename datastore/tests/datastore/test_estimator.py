@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from geoquery.geoquery import GeoQuery
+from datastore.estimator import (
+    AxisSchema,
+    FieldSchema,
+    ProductSchema,
+    estimate_nbytes,
+)
+from datastore.exception import EstimationNotSupportedError
+
+
+@pytest.fixture
+def schema():
+    time = np.arange(
+        "2012-01-01T00", "2012-03-01T00", dtype="datetime64[h]"
+    ).astype("datetime64[ns]")
+    yield ProductSchema(
+        fields={
+            "tas": FieldSchema(
+                dims=("time", "lat", "lon"),
+                shape=(time.size, 10, 20),
+                itemsize=4,
+            ),
+            "orog": FieldSchema(dims=("lat", "lon"), shape=(10, 20), itemsize=8),
+        },
+        axes={
+            "time": AxisSchema(dim="time", values=time),
+            "latitude": AxisSchema(
+                dim="lat", values=np.linspace(36.0, 45.0, 10)
+            ),
+            "longitude": AxisSchema(
+                dim="lon", values=np.linspace(0.0, 342.0, 20)
+            ),
+        },
+    )
+
+
+def test_estimate_whole_product(schema):
+    query = GeoQuery()
+    assert estimate_nbytes(schema, query) == 1440 * 200 * 4 + 200 * 8
+
+
+def test_estimate_time_slice_is_inclusive(schema):
+    query = GeoQuery(
+        variable="tas", time={"start": "2012-01-01", "stop": "2012-01-15"}
+    )
+    assert estimate_nbytes(schema, query) == 15 * 24 * 200 * 4
+
+
+def test_estimate_time_components(schema):
+    query = GeoQuery(
+        variable=["tas"],
+        time={"month": ["2"], "day": ["1", "2"], "hour": ["0", "12"]},
+    )
+    assert estimate_nbytes(schema, query) == 4 * 200 * 4
+
+
+def test_estimate_area_crossing_antimeridian(schema):
+    query = GeoQuery(
+        variable="orog",
+        area={"north": 40.0, "south": 36.0, "west": -20.0, "east": 20.0},
+    )
+    assert estimate_nbytes(schema, query) == 5 * 3 * 8
+
+
+def test_estimate_locations(schema):
+    query = GeoQuery(
+        variable="tas",
+        location={"latitude": [40.0, 41.0], "longitude": [10.0, 11.0]},
+    )
+    assert estimate_nbytes(schema, query) == 1440 * 2 * 4
+
+
+def test_raise_when_axis_missing(schema):
+    query = GeoQuery(variable="tas", vertical=[1000.0])
+    with pytest.raises(EstimationNotSupportedError):
+        _ = estimate_nbytes(schema, query)
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from datastore.metadata_store import ProductMetadataStore
+
+
+class _FakeSource:
+    def __init__(self, path):
+        self.path = path
+        self.pattern = None
+        self.reads = 0
+
+    def read_chunked(self):
+        self.reads += 1
+        return {"coords": [1, 2, 3]}
+
+
+@pytest.fixture
+def source(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.nc").write_bytes(b"a")
+    yield _FakeSource(path=str(data_dir / "*.nc"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    yield ProductMetadataStore(tmp_path / "snapshots")
+
+
+def test_reuse_snapshot(store, source):
+    kube = store.load_or_read("era5", "reanalysis", source)
+    assert store.load_or_read("era5", "reanalysis", source) == kube
+    assert source.reads == 1
+
+
+def test_invalidate_when_files_change(store, source):
+    _ = store.load_or_read("era5", "reanalysis", source)
+    source_dir = os.path.dirname(source.path)
+    with open(os.path.join(source_dir, "b.nc"), "wb") as file:
+        file.write(b"b")
+    assert store.load("era5", "reanalysis", source) is None
+    _ = store.load_or_read("era5", "reanalysis", source)
+    assert source.reads == 2
+
+
+def test_invalidate_only_changed_product(store, source, tmp_path):
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    (other_dir / "c.nc").write_bytes(b"c")
+    other = _FakeSource(path=str(other_dir / "*.nc"))
+    _ = store.load_or_read("era5", "reanalysis", source)
+    _ = store.load_or_read("era5", "other", other)
+    (other_dir / "d.nc").write_bytes(b"d")
+    assert store.load("era5", "reanalysis", source) is not None
+    assert store.load("era5", "other", other) is None
+
+
+def test_disable_snapshots_when_directory_not_created(tmp_path, source):
+    blocker = tmp_path / "blocker"
+    blocker.write_bytes(b"")
+    store = ProductMetadataStore(blocker / "snapshots")
+    assert not store.enabled
+    _ = store.load_or_read("era5", "reanalysis", source)
+    _ = store.load_or_read("era5", "reanalysis", source)
+    assert source.reads == 2
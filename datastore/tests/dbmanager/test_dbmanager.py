@@ -0,0 +1,145 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from dbmanager import dbmanager
+from dbmanager.dbmanager import DBManager, RequestStatus, User
+from dbmanager.singleton import Singleton
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _add_postgres_functions(connection, _):
+        # NOTE: locks are no-ops in the single-connection database
+        connection.create_function("hashtext", 1, hash)
+        connection.create_function("pg_advisory_xact_lock", 1, lambda _: 1)
+
+    for key in (
+        "POSTGRES_USER",
+        "POSTGRES_PASSWORD",
+        "DB_SERVICE_HOST",
+        "DB_SERVICE_PORT",
+        "POSTGRES_DB",
+    ):
+        monkeypatch.setenv(key, "test")
+    monkeypatch.setenv("DB_UPGRADE_ON_STARTUP", "false")
+    monkeypatch.setattr(dbmanager, "create_engine", lambda *_, **__: engine)
+    Singleton._instances.pop(DBManager, None)
+    dbmanager.Base.metadata.create_all(engine)
+    yield DBManager()
+    Singleton._instances.pop(DBManager, None)
+
+
+@pytest.fixture
+def user_id(db):
+    user_id = uuid.uuid4()
+    with db._DBManager__session_maker() as session:
+        session.add(User(user_id=user_id, api_key="key"))
+        session.commit()
+    yield user_id
+
+
+def _create(db, user_id, **kwargs):
+    return db.create_or_link_request(
+        user_id=user_id,
+        dataset="era5",
+        product="reanalysis",
+        query="{}",
+        query_hash="hash",
+        is_result_available=lambda _: True,
+        **kwargs,
+    )
+
+
+def test_identical_request_is_linked_to_pending_one(db, user_id):
+    first_id, reused_id = _create(db, user_id)
+    assert reused_id is None
+    second_id, reused_id = _create(db, user_id)
+    assert reused_id == first_id
+    db.update_request(
+        first_id,
+        worker_id=None,
+        status=RequestStatus.DONE,
+        location_path="/downloads/result.nc",
+        size_bytes=10,
+    )
+    second = db.get_request_details(second_id)
+    assert second.status is RequestStatus.DONE
+    assert second.download.location_path == "/downloads/result.nc"
+
+
+def test_link_when_original_finished_between_lookup_and_link(db, user_id):
+    original_id, _ = _create(db, user_id)
+    (candidate,) = db.get_reusable_requests(query_hash="hash")
+    assert candidate.status is RequestStatus.PENDING
+    db.update_request(
+        original_id,
+        worker_id=None,
+        status=RequestStatus.DONE,
+        location_path="/downloads/result.nc",
+        size_bytes=10,
+    )
+    request_id = db.create_linked_request(
+        candidate.request_id,
+        user_id=user_id,
+        is_result_available=lambda _: True,
+    )
+    request = db.get_request_details(request_id)
+    assert request.status is RequestStatus.DONE
+    assert request.reused_request_id == original_id
+    assert request.download.location_path == "/downloads/result.nc"
+    assert request.download.download_uri == f"/download/{request_id}"
+
+
+def test_no_link_when_original_failed_between_lookup_and_link(db, user_id):
+    original_id, _ = _create(db, user_id)
+    (candidate,) = db.get_reusable_requests(query_hash="hash")
+    db.update_request(
+        original_id,
+        worker_id=None,
+        status=RequestStatus.FAILED,
+        fail_reason="error",
+    )
+    assert (
+        db.create_linked_request(candidate.request_id, user_id=user_id)
+        is None
+    )
+
+
+def test_unavailable_result_is_not_reused(db, user_id):
+    original_id, _ = _create(db, user_id)
+    db.update_request(
+        original_id,
+        worker_id=None,
+        status=RequestStatus.DONE,
+        location_path="/downloads/removed.nc",
+        size_bytes=10,
+    )
+    request_id, reused_id = db.create_or_link_request(
+        user_id=user_id,
+        dataset="era5",
+        product="reanalysis",
+        query="{}",
+        query_hash="hash",
+        is_result_available=lambda _: False,
+    )
+    assert reused_id is None
+    assert db.get_request_details(request_id).status is RequestStatus.PENDING
+
+
+def test_old_requests_are_not_reused(db, user_id):
+    _create(db, user_id)
+    _, reused_id = _create(
+        db, user_id, created_after=datetime.utcnow() + timedelta(seconds=1)
+    )
+    assert reused_id is None
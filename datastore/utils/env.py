@@ -0,0 +1,8 @@
+"""Module with helpers of the configuration with environment variables"""
+
+
+def is_true(item) -> bool:
+    """If `item` represents `True` value"""
+    if isinstance(item, str):
+        return item.lower() in ["y", "yes", "true", "t"]
+    return bool(item)
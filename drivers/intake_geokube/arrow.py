@@ -0,0 +1,176 @@
+"""Conversion of geokube (xarray) data to Arrow tables and Parquet files."""
+import json
+import itertools
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xarray as xr
+
+TIME_DIMS = ("time", "xtime")
+DEFAULT_BATCH_ROWS = 1024**2
+
+
+def _default_series_dims(dset: xr.Dataset) -> list:
+    dims = [dim for dim in dset.dims if str(dim).lower() in TIME_DIMS]
+    # NOTE: without time, all data go to the single batch
+    return dims or list(dset.dims)
+
+
+def _to_array(values: np.ndarray) -> pa.Array:
+    # NOTE: numeric and datetime arrays without nulls (NaNs are values)
+    # wrap NumPy buffers without copying
+    return pa.array(np.ascontiguousarray(values))
+
+
+def _chunk_slices(dset: xr.Dataset, dims: list) -> Iterator[dict]:
+    """Iterate over slices of Dask chunks along `dims` (the whole
+    dimensions for loaded data)"""
+    bounds = []
+    for dim in dims:
+        sizes = dset.chunksizes.get(dim, (dset.sizes[dim],))
+        ends = np.cumsum(sizes).tolist()
+        bounds.append(
+            [slice(end - size, end) for size, end in zip(sizes, ends)]
+        )
+    for slices in itertools.product(*bounds):
+        yield dict(zip(dims, slices))
+
+
+def _make_schema(dset: xr.Dataset, names: list, arrays: list) -> pa.Schema:
+    fields = []
+    for name, array in zip(names, arrays):
+        attrs = dset[name].attrs
+        metadata = {"units": str(attrs["units"])} if "units" in attrs else None
+        fields.append(pa.field(name, array.type, metadata=metadata))
+    return pa.schema(
+        fields,
+        metadata={"geokube": json.dumps(dset.attrs, default=str)},
+    )
+
+
+def to_record_batches(
+    dset: xr.Dataset,
+    series_dims: Optional[Sequence] = None,
+    max_rows: int = DEFAULT_BATCH_ROWS,
+) -> Iterator[pa.RecordBatch]:
+    """Convert the dataset to Arrow record batches of whole series.
+
+    Dimensions other than `series_dims` (e.g. `points` of location
+    extractions or `latitude` and `longitude`) identify points. Each
+    batch contains the series (e.g. the time series) of consecutive
+    points, with columns of all coordinates and variables, and at most
+    `max_rows` rows unless the series of a single point is longer.
+    The series of a point is never split between batches.
+
+    Lazy data are computed block by block along Dask chunks of point
+    dimensions, so only one block is held in memory. Points are ordered
+    by blocks and in the row-major order within blocks.
+
+    Parameters
+    ----------
+    dset : xarray.Dataset
+        Dataset to convert, e.g. the result of `DataCube.to_xarray`
+    series_dims : sequence, optional
+        Dimensions of the series. Time dimensions by default
+    max_rows : int
+        Maximum number of rows of the batch
+
+    Yields
+    ------
+    batch : pyarrow.RecordBatch
+        Record batch with the series of consecutive points
+    """
+    if series_dims is None:
+        series_dims = _default_series_dims(dset)
+    series_dims = list(series_dims)
+    point_dims = [dim for dim in dset.dims if dim not in series_dims]
+    n_rows = int(np.prod([dset.sizes[dim] for dim in series_dims]))
+    points_per_batch = max(1, max_rows // max(n_rows, 1))
+    # NOTE: columns of point coordinates go first, then those of series
+    names = sorted(
+        dset.variables,
+        key=lambda name: (
+            not set(dset[name].dims) <= set(point_dims),
+            not set(dset[name].dims) <= set(series_dims),
+        ),
+    )
+    dset = dset.unify_chunks()
+
+    schema = None
+    for slices in _chunk_slices(dset, point_dims):
+        block = dset.isel(slices).compute()
+        n_points = int(np.prod([block.sizes[dim] for dim in point_dims]))
+        matrices = {}
+        for name in names:
+            # NOTE: broadcasting and transposing give views of data
+            values = block[name].variable.set_dims(dict(block.sizes))
+            values = values.transpose(*point_dims, *series_dims).values
+            matrices[name] = values.reshape(n_points, n_rows)
+        for start in range(0, n_points, points_per_batch):
+            stop = start + points_per_batch
+            # NOTE: columns are copied once, to contiguous buffers
+            arrays = [
+                _to_array(matrix[start:stop].reshape(-1))
+                for matrix in matrices.values()
+            ]
+            if schema is None:
+                schema = _make_schema(dset, names, arrays)
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def to_table(
+    dset: xr.Dataset,
+    series_dims: Optional[Sequence] = None,
+    max_rows: int = DEFAULT_BATCH_ROWS,
+) -> pa.Table:
+    """Convert the dataset to the Arrow table (see `to_record_batches`)"""
+    return pa.Table.from_batches(
+        list(to_record_batches(dset, series_dims, max_rows))
+    )
+
+
+def write_parquet(
+    dset: xr.Dataset,
+    path: str,
+    series_dims: Optional[Sequence] = None,
+    compression: str = "zstd",
+    max_rows: int = DEFAULT_BATCH_ROWS,
+) -> str:
+    """Write the dataset to the Parquet file with one row group per
+    record batch (see `to_record_batches`), so the series of points
+    can be read without reading the whole file.
+    """
+    writer = None
+    try:
+        for batch in to_record_batches(dset, series_dims, max_rows):
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    path, batch.schema, compression=compression
+                )
+            writer.write_batch(batch, row_group_size=max(batch.num_rows, 1))
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def write_arrow(
+    dset: xr.Dataset,
+    path: str,
+    series_dims: Optional[Sequence] = None,
+    max_rows: int = DEFAULT_BATCH_ROWS,
+) -> str:
+    """Write the dataset to the Arrow IPC file with the record batches
+    of `to_record_batches`"""
+    writer = None
+    try:
+        for batch in to_record_batches(dset, series_dims, max_rows):
+            if writer is None:
+                writer = pa.ipc.new_file(path, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
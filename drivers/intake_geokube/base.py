@@ -69,8 +69,37 @@ class GeokubeSource(DataSource):
         return self.read_chunked()
 
     def to_pyarrow(self):
-        """Return an in-memory pyarrow object"""
-        raise NotImplementedError
+        """Return an in-memory pyarrow table with record batches of
+        series of points (see `intake_geokube.arrow.to_record_batches`).
+        Tables of cubes of a Dataset are concatenated, with columns of
+        the Dataset attributes first."""
+        import pyarrow as pa
+
+        from .arrow import to_table
+
+        kube = self.read()
+        if not isinstance(kube, Dataset):
+            return to_table(kube.to_xarray())
+        attrs = kube._Dataset__attrs
+        tables = []
+        for _, item in kube.data.iterrows():
+            cube = item[kube.DATACUBE_COL]
+            if hasattr(cube, "compute"):
+                # NOTE: cubes of a Dataset can be Delayed
+                cube = cube.compute()
+            dset = cube.to_xarray()
+            if 0 in dset.sizes.values():
+                continue
+            table = to_table(dset)
+            for i, attr in enumerate(attrs):
+                table = table.add_column(
+                    i, attr, pa.repeat(item[attr], table.num_rows)
+                )
+            tables.append(table)
+        if not tables:
+            return pa.table({attr: pa.array([]) for attr in attrs})
+        # NOTE: cubes can have different variables
+        return pa.concat_tables(tables, promote_options="default")
 
     def close(self):
         """Delete open file from memory"""
@@ -13,7 +13,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/geokube/intake-geokube",
     packages=setuptools.find_packages(),
-    install_requires=["intake", "pytest"],
+    install_requires=["intake", "pytest", "pyarrow>=14"],
     entry_points={
         "intake.drivers": [
             "geokube_netcdf = intake_geokube.netcdf:NetCDFSource",
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import xarray as xr
+
+from intake_geokube.arrow import to_record_batches, to_table, write_parquet
+
+
+@pytest.fixture
+def points_dataset():
+    time = pd.date_range("2001-01-01", periods=24, freq="h")
+    temperature = np.arange(3 * 24, dtype="float32").reshape(24, 3)
+    yield xr.Dataset(
+        {
+            "tas": (
+                ("time", "points"),
+                temperature,
+                {"units": "K"},
+            )
+        },
+        coords={
+            "time": time,
+            "latitude": ("points", [40.0, 41.5, 43.0]),
+            "longitude": ("points", [10.0, 12.5, 15.0]),
+        },
+        attrs={"institution": "CMCC"},
+    )
+
+
+def test_record_batches_keep_whole_series(points_dataset):
+    batches = list(to_record_batches(points_dataset, max_rows=50))
+    assert [batch.num_rows for batch in batches] == [48, 24]
+    table = pa.Table.from_batches(batches)
+    for i in range(3):
+        rows = slice(i * 24, (i + 1) * 24)
+        assert table.column("latitude").to_pylist()[rows] == [
+            points_dataset.latitude.values[i]
+        ] * 24
+        np.testing.assert_array_equal(
+            table.column("tas").to_numpy()[rows],
+            points_dataset.tas.values[:, i],
+        )
+        np.testing.assert_array_equal(
+            table.column("time").to_numpy()[rows], points_dataset.time.values
+        )
+
+
+def test_record_batches_of_dask_blocks(points_dataset):
+    lazy = points_dataset.chunk({"points": 2})
+    batches = list(to_record_batches(lazy))
+    assert [batch.num_rows for batch in batches] == [48, 24]
+    assert pa.Table.from_batches(batches).equals(to_table(points_dataset))
+
+
+def test_gridded_dataset_gives_grouped_batches():
+    dset = xr.Dataset(
+        {"tas": (("time", "latitude", "longitude"), np.ones((4, 10, 20)))},
+        coords={"time": pd.date_range("2001-01-01", periods=4)},
+    )
+    batches = list(to_record_batches(dset, max_rows=400))
+    assert [batch.num_rows for batch in batches] == [400, 400]
+
+
+def test_table_keeps_units(points_dataset):
+    table = to_table(points_dataset)
+    assert table.num_rows == 3 * 24
+    assert table.schema.field("tas").metadata == {b"units": b"K"}
+    assert b"CMCC" in table.schema.metadata[b"geokube"]
+
+
+def test_no_time_dimension_gives_single_batch(points_dataset):
+    batches = list(to_record_batches(points_dataset.isel(time=0)))
+    assert len(batches) == 1
+    assert batches[0].num_rows == 3
+
+
+def test_parquet_row_group_per_batch(points_dataset, tmp_path):
+    path = write_parquet(
+        points_dataset, str(tmp_path / "points.parquet"), max_rows=24
+    )
+    file = pq.ParquetFile(path)
+    assert file.num_row_groups == 3
+    second_point = file.read_row_group(1).to_pandas()
+    assert (second_point["longitude"] == 12.5).all()
+    np.testing.assert_array_equal(
+        second_point["tas"].to_numpy(), points_dataset.tas.values[:, 1]
+    )
@@ -0,0 +1,254 @@
+"""Module with the builder of archives of multi-file results"""
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tarfile
+import zipfile
+from typing import BinaryIO, Optional
+
+import zstandard
+
+from meta import LoggableMeta
+
+_BLOCK_SIZE = 1024**2
+MANIFEST_NAME = "manifest.json"
+DEFAULT_ARCHIVE_COMPRESSION = "stored"
+ARCHIVE_EXTENSIONS = {
+    "stored": "zip",
+    "deflate": "zip",
+    "zstd": "tar.zst",
+    "tar.zst": "tar.zst",
+}
+
+
+class _HashingReader(io.RawIOBase):
+    """Reader computing SHA-256 digest of the data read"""
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self.sha256 = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self.sha256.update(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class ArchiveBuilder(metaclass=LoggableMeta):
+    """Builder of the archive which files are added to as soon as they
+    are produced.
+
+    Files are written to disk first and then copied into the archive
+    in blocks, so they are never loaded into memory, and are removed
+    right after adding them. The data are therefore written twice, and
+    the additional disk space is bounded by the files written but not
+    yet added (one per concurrent writer). Writers do not produce
+    archive entries directly: NetCDF (HDF5) files need a seekable file,
+    and cubes are written in parallel, while archive entries are
+    written one by one. SHA-256 checksums of files are
+    computed while copying and (unless `manifest` is `False`) written
+    to `manifest.json` included in the archive and to the sidecar file
+    `<archive>.manifest.json`.
+    The archive is written under the temporary name and renamed once
+    completed.
+
+    Supported compression methods are:
+    * `stored` - ZIP archive without compression,
+    * `deflate` - ZIP archive with the deflate compression,
+    * `tar.zst` (or `zstd`) - tar archive compressed with Zstandard
+      using all cores.
+    Only Zstandard compresses on many cores; deflate uses one thread.
+    ZIP archives use ZIP64 extensions for large files.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Path of the archive without the extension
+    compression : str
+        Compression method
+    level : int, optional
+        Compression level. The default level of the method if not given
+    threads : int
+        Number of threads compressing the Zstandard stream. Negative
+        value means the number of cores
+    manifest : bool
+        If the manifest should be written
+    """
+
+    _LOG = logging.getLogger("geokube.ArchiveBuilder")
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        compression: str = DEFAULT_ARCHIVE_COMPRESSION,
+        level: Optional[int] = None,
+        threads: int = -1,
+        manifest: bool = True,
+    ) -> None:
+        if compression not in ARCHIVE_EXTENSIONS:
+            raise ValueError(
+                f"archive compression `{compression}` is not supported"
+            )
+        self.compression = compression
+        self.manifest = manifest
+        self.path = f"{path}.{ARCHIVE_EXTENSIONS[compression]}"
+        self._part_path = f"{self.path}.part"
+        self._entries: list[dict] = []
+        self._closed = False
+        self._zstd_writer = None
+        self._zip = None
+        self._tar = None
+        if ARCHIVE_EXTENSIONS[compression] == "zip":
+            self._zip = zipfile.ZipFile(
+                self._part_path,
+                "w",
+                compression=(
+                    zipfile.ZIP_DEFLATED
+                    if compression == "deflate"
+                    else zipfile.ZIP_STORED
+                ),
+                compresslevel=level,
+                allowZip64=True,
+            )
+        else:
+            compressor = zstandard.ZstdCompressor(
+                level=3 if level is None else level, threads=threads
+            )
+            self._zstd_writer = compressor.stream_writer(
+                open(self._part_path, "wb")
+            )
+            self._tar = tarfile.open(fileobj=self._zstd_writer, mode="w|")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(
+        self,
+        file_path: str | os.PathLike,
+        arcname: Optional[str] = None,
+        remove: bool = True,
+    ) -> None:
+        """Add the file to the archive
+
+        Parameters
+        ----------
+        file_path : str or os.PathLike
+            Path of the file to add
+        arcname : str, optional
+            Name of the file in the archive. Base name of the file
+            if not given
+        remove : bool
+            If the file should be removed once added
+        """
+        arcname = arcname or os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as file:
+            reader = _HashingReader(file)
+            if self._zip is not None:
+                # NOTE: ZIP64 is used if the size requires it
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                zinfo.compress_type = self._zip.compression
+                # NOTE: set the same way as by `ZipFile.write`
+                zinfo._compresslevel = self._zip.compresslevel
+                with self._zip.open(zinfo, "w") as dst:
+                    shutil.copyfileobj(reader, dst, _BLOCK_SIZE)
+            else:
+                tarinfo = self._tar.gettarinfo(file_path, arcname)
+                self._tar.addfile(
+                    tarinfo, io.BufferedReader(reader, _BLOCK_SIZE)
+                )
+        self._entries.append(
+            {
+                "name": arcname,
+                "size": size,
+                "sha256": reader.sha256.hexdigest(),
+            }
+        )
+        if remove:
+            os.remove(file_path)
+
+    def _write_manifest(self) -> bytes:
+        manifest = json.dumps(
+            {"compression": self.compression, "files": self._entries},
+            indent=2,
+        ).encode("utf-8")
+        if self._zip is not None:
+            self._zip.writestr(MANIFEST_NAME, manifest)
+        else:
+            tarinfo = tarfile.TarInfo(MANIFEST_NAME)
+            tarinfo.size = len(manifest)
+            tarinfo.mtime = int(time.time())
+            self._tar.addfile(tarinfo, io.BytesIO(manifest))
+        return manifest
+
+    def _close_archive(self) -> None:
+        self._closed = True
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+            # NOTE: closes the underlying file, too
+            self._zstd_writer.close()
+
+    def close(self) -> str:
+        """Write the manifest (if enabled), complete the archive and get
+        its path"""
+        if self._closed:
+            return self.path
+        manifest = self._write_manifest() if self.manifest else None
+        self._close_archive()
+        os.replace(self._part_path, self.path)
+        if manifest is not None:
+            with open(f"{self.path}.{MANIFEST_NAME}", "wb") as file:
+                file.write(manifest)
+        self._LOG.debug(
+            "archive %s with %d files completed",
+            self.path,
+            len(self._entries),
+            extra={"track_id": os.path.basename(self.path)},
+        )
+        return self.path
+
+    def abort(self) -> None:
+        """Discard the incomplete archive"""
+        if self._closed:
+            return
+        try:
+            self._close_archive()
+        finally:
+            if os.path.exists(self._part_path):
+                os.remove(self._part_path)
+
+    def __enter__(self) -> "ArchiveBuilder":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def make_archive_builder(path: str | os.PathLike) -> ArchiveBuilder:
+    """Create the archive builder configured with environment variables"""
+    level = os.environ.get("ARCHIVE_COMPRESSION_LEVEL")
+    return ArchiveBuilder(
+        path,
+        compression=os.environ.get(
+            "ARCHIVE_COMPRESSION", DEFAULT_ARCHIVE_COMPRESSION
+        ),
+        level=int(level) if level else None,
+        threads=int(os.environ.get("ARCHIVE_ZSTD_THREADS", -1)),
+    )
@@ -1,14 +1,17 @@
 import os
-import time
+import json
 import datetime
 import pika
 import logging
 import asyncio
 import threading, functools
-from zipfile import ZipFile
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 
 import numpy as np
-from dask.distributed import Client, LocalCluster, Nanny, Status
+from dask.distributed import Client, Future, LocalCluster, Nanny, Status
+from dask.distributed import as_completed, get_worker, worker_client
 from dask.delayed import Delayed
 from geokube.core.datacube import DataCube
 from geokube.core.dataset import Dataset
@@ -18,11 +21,48 @@ from datastore.datastore import Datastore
 from workflow import Workflow
 from geoquery.geoquery import GeoQuery
 from dbmanager.dbmanager import DBManager, RequestStatus
+from intake_geokube.arrow import write_arrow, write_parquet
 
 from meta import LoggableMeta
 from messaging import Message, MessageType
+from scheduler import AdmissionScheduler, Job
+from watchdog import DeadlineWatchdog
+from archives import make_archive_builder
+from writers import make_netcdf_writer, write_zipped_zarr
 
 _BASE_DOWNLOAD_PATH = "/downloads"
+DEFAULT_PROCESSING_TIMEOUT_SEC = 300
+# NOTE: fanout exchange with events of request status changes
+REQUEST_STATUS_EXCHANGE = os.environ.get(
+    "REQUEST_STATUS_EXCHANGE", "request_status"
+)
+# NOTE: the API routes small queries to the separate lane, so they are
+# not blocked by large ones
+_LANES = {"query": ["query_small_queue", "query_queue"]}
+DEFAULT_LANE_WEIGHTS = "query_small_queue:4,query_queue:1"
+
+
+def _default_processing_timeout() -> float:
+    if "PROCESSING_TIMEOUT_SEC" in os.environ:
+        return float(os.environ["PROCESSING_TIMEOUT_SEC"])
+    if "RESULT_CHECK_RETRIES" in os.environ:
+        # NOTE: deprecated. the number of result checks every 10 seconds
+        return 10.0 * int(os.environ["RESULT_CHECK_RETRIES"])
+    return DEFAULT_PROCESSING_TIMEOUT_SEC
+
+
+def _parse_lane_weights(value: str) -> dict[str, float]:
+    """Parse weights of lanes given as `lane1:weight1,lane2:weight2`"""
+    weights = {}
+    for item in filter(None, map(str.strip, value.split(","))):
+        lane, _, weight = item.partition(":")
+        weights[lane.strip()] = float(weight or 1)
+    return weights
+
+
+def get_lanes(etype: str) -> list[str]:
+    """Get names of queues consumed for the executor type"""
+    return _LANES.get(etype, [f"{etype}_queue"])
 
 
 def get_file_name_for_climate_downscaled(kube: DataCube, message: Message):
@@ -85,6 +125,33 @@ def get_history_message():
     )
 
 
+def _write_datacube(
+    kube: DataCube, base_path: str | os.PathLike, path: str, format: str
+) -> str:
+    """Write the cube to the file `path` in `base_path` (the extension
+    is added according to `format`) and get the path of the file"""
+    match format:
+        case "netcdf":
+            full_path = os.path.join(base_path, f"{path}.nc")
+            make_netcdf_writer().write(kube.to_xarray(), full_path)
+        case "geojson":
+            full_path = os.path.join(base_path, f"{path}.json")
+            kube.to_geojson(full_path)
+        case "zarr":
+            full_path = write_zipped_zarr(
+                kube.to_xarray(), os.path.join(base_path, f"{path}.zarr")
+            )
+        case "parquet":
+            full_path = os.path.join(base_path, f"{path}.parquet")
+            write_parquet(kube.to_xarray(), full_path)
+        case "arrow":
+            full_path = os.path.join(base_path, f"{path}.arrow")
+            write_arrow(kube.to_xarray(), full_path)
+        case _:
+            raise ValueError(f"format `{format}` is not supported")
+    return full_path
+
+
 def persist_datacube(
     kube: DataCube,
     message: Message,
@@ -112,16 +179,75 @@ def persist_datacube(
         format = message.content.format
     else:
         format = "netcdf"
-    match format:
-        case "netcdf":
-            full_path = os.path.join(base_path, f"{path}.nc")
-            kube.to_netcdf(full_path)
-        case "geojson":
-            full_path = os.path.join(base_path, f"{path}.json")
-            kube.to_geojson(full_path)
-        case _:
-            raise ValueError(f"format `{format}` is not supported")
-    return full_path
+    return _write_datacube(kube, base_path, path, format)
+
+
+def _is_empty_datacube(dcube: DataCube) -> bool:
+    """Check from the metadata (without computing) if the cube is empty"""
+    if len(dcube) == 0:
+        return True
+    return any(0 in field.shape for field in dcube.fields.values())
+
+
+def _persist_dataset_datacube(
+    dcube: DataCube | Delayed,
+    name_parts: list[str],
+    base_path: str | os.PathLike,
+    format: str,
+) -> str | None:
+    if isinstance(dcube, Delayed):
+        dcube = dcube.compute()
+    if _is_empty_datacube(dcube):
+        return None
+    if len(dcube) == 1:
+        name_parts = [next(iter(dcube.fields.keys())), *name_parts]
+    path = "_".join(name_parts)
+    return _write_datacube(dcube, base_path, path, format)
+
+
+def _persist_datacubes_in_parallel(
+    items: list[tuple[DataCube | Delayed, list[str]]],
+    base_path: str | os.PathLike,
+    format: str,
+) -> Iterator[str | None]:
+    """Persist cubes as independent tasks and yield paths of files
+    in the order of completion. Cubes are submitted to the cluster if
+    called from the task running on a Dask worker."""
+    try:
+        get_worker()
+    except ValueError:
+        with ThreadPoolExecutor(thread_name_prefix="persist") as pool:
+            futures = [
+                pool.submit(
+                    _persist_dataset_datacube,
+                    dcube,
+                    name_parts,
+                    base_path,
+                    format,
+                )
+                for dcube, name_parts in items
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        return
+    with worker_client() as client:
+        futures = [
+            client.submit(
+                _persist_dataset_datacube,
+                (
+                    client.compute(dcube)
+                    if isinstance(dcube, Delayed)
+                    else dcube
+                ),
+                name_parts,
+                base_path,
+                format,
+                pure=False,
+            )
+            for dcube, name_parts in items
+        ]
+        for future in as_completed(futures):
+            yield future.result()
 
 
 def persist_dataset(
@@ -129,70 +255,53 @@ def persist_dataset(
     message: Message,
     base_path: str | os.PathLike,
 ):
-    def _get_attr_comb(dataframe_item, attrs):
-        return "_".join([dataframe_item[attr_name] for attr_name in attrs])
-
-    def _persist_single_datacube(dataframe_item, base_path, format):
-        dcube = dataframe_item[dset.DATACUBE_COL]
-        if isinstance(dcube, Delayed):
-            dcube = dcube.compute()
-        if len(dcube) == 0:
-            return None
-        for field in dcube.fields.values():
-            if 0 in field.shape:
-                return None
-        attr_str = _get_attr_comb(dataframe_item, dset._Dataset__attrs)
-        var_names = list(dcube.fields.keys())
-        if len(dcube) == 1:
-            path = "_".join(
-                [
-                    var_names[0],
-                    message.dataset_id,
-                    message.product_id,
-                    attr_str,
-                    message.request_id,
-                ]
-            )
-        else:
-            path = "_".join(
-                [
-                    message.dataset_id,
-                    message.product_id,
-                    attr_str,
-                    message.request_id,
-                ]
-            )
-        match format:
-            case "netcdf":
-                full_path = os.path.join(base_path, f"{path}.nc")
-                dcube.to_netcdf(full_path)
-            case "geojson":
-                full_path = os.path.join(base_path, f"{path}.json")
-                dcube.to_geojson(full_path)
-        return full_path
-
     if isinstance(message.content, GeoQuery):
         format = message.content.format
     else:
         format = "netcdf"
-    datacubes_paths = dset.data.apply(
-        _persist_single_datacube, base_path=base_path, format=format, axis=1
-    )
-    paths = datacubes_paths[~datacubes_paths.isna()]
-    if len(paths) == 0:
-        return None
-    elif len(paths) == 1:
-        return paths.iloc[0]
-    zip_name = "_".join(
+    items = []
+    for _, dataframe_item in dset.data.iterrows():
+        dcube = dataframe_item[dset.DATACUBE_COL]
+        # NOTE: empty cubes are skipped before computing anything.
+        # Delayed cubes are checked once computed
+        if not isinstance(dcube, Delayed) and _is_empty_datacube(dcube):
+            continue
+        attr_str = "_".join(
+            [dataframe_item[attr_name] for attr_name in dset._Dataset__attrs]
+        )
+        name_parts = [
+            message.dataset_id,
+            message.product_id,
+            attr_str,
+            message.request_id,
+        ]
+        items.append((dcube, name_parts))
+    archive_name = "_".join(
         [message.dataset_id, message.product_id, message.request_id]
     )
-    path = os.path.join(base_path, f"{zip_name}.zip")
-    with ZipFile(path, "w") as archive:
-        for file in paths:
-            archive.write(file, arcname=os.path.basename(file))
-    for file in paths:
-        os.remove(file)
-    return path
+    first_path, archive = None, None
+    try:
+        # NOTE: files are added to the archive as soon as they are written
+        for file in _persist_datacubes_in_parallel(items, base_path, format):
+            if file is None:
+                continue
+            if first_path is None:
+                first_path = file
+                continue
+            if archive is None:
+                archive = make_archive_builder(
+                    os.path.join(base_path, archive_name)
+                )
+                archive.add(first_path)
+            archive.add(file)
+    except BaseException:
+        if archive is not None:
+            archive.abort()
+        raise
+    if archive is None:
+        # NOTE: the single file is not archived
+        return first_path
+    return archive.close()
 
 
 def process(message: Message, compute: bool):
@@ -238,7 +347,54 @@ class Executor(metaclass=LoggableMeta):
         )
         self._conn = broker_conn
         self._channel = broker_conn.channel()
+        self._channel.exchange_declare(
+            exchange=REQUEST_STATUS_EXCHANGE, exchange_type="fanout"
+        )
         self._db = DBManager()
+        self._max_in_flight = int(os.environ.get("EXECUTOR_MAX_IN_FLIGHT", 4))
+        self._default_timeout = _default_processing_timeout()
+        self._workers = ThreadPoolExecutor(
+            max_workers=self._max_in_flight, thread_name_prefix="request"
+        )
+        self._watchdog = DeadlineWatchdog()
+        self._in_flight: dict[str, Future | None] = {}
+        self._lock = threading.Lock()
+        self._restart_requested = False
+        self._restart_lock = threading.RLock()
+        self._scheduler = AdmissionScheduler(
+            max_in_flight=self._max_in_flight,
+            memory_limit=self.get_cluster_memory_limit,
+            memory_factor=float(
+                os.environ.get("EXECUTOR_MEMORY_FACTOR", 2.0)
+            ),
+            starvation_sec=float(
+                os.environ.get("EXECUTOR_STARVATION_SEC", 300)
+            ),
+            lane_weights=_parse_lane_weights(
+                os.environ.get("EXECUTOR_LANE_WEIGHTS", DEFAULT_LANE_WEIGHTS)
+            ),
+        )
+        # NOTE: each lane prefetches up to that number of messages, so
+        # the scheduler can choose among lanes
+        self._lane_prefetch = int(
+            os.environ.get("EXECUTOR_LANE_PREFETCH", self._max_in_flight)
+        )
+
+    def get_cluster_memory_limit(self) -> int:
+        """Get the total memory limit of workers of the Dask cluster"""
+        client = getattr(self, "_dask_client", None)
+        if client is None:
+            return 0
+        try:
+            workers = client.scheduler_info()["workers"].values()
+        except Exception as err:
+            self._LOG.warning(
+                "could not get info about the cluster workers: %s",
+                err,
+                extra={"track_id": self._worker_id},
+            )
+            return 0
+        return sum(worker.get("memory_limit") or 0 for worker in workers)
 
     def create_dask_cluster(self, dask_cluster_opts: dict = None):
         if dask_cluster_opts is None:
@@ -273,24 +429,45 @@ class Executor(metaclass=LoggableMeta):
         self._dask_client = Client(dask_cluster)
         self._nanny = Nanny(self._dask_client.cluster.scheduler.address)
 
-    def maybe_restart_cluster(self, status: RequestStatus):
-        if status is RequestStatus.TIMEOUT:
-            self._LOG.info("recreating the cluster due to timeout")
-            self._dask_client.cluster.close()
-            self.create_dask_cluster()
-        if self._dask_client.cluster.status is Status.failed:
-            self._LOG.info("attempt to restart the cluster...")
-            try:
-                asyncio.run(self._nanny.restart())
-            except Exception as err:
-                self._LOG.error(
-                    "couldn't restart the cluster due to an error: %s", err
-                )
-                self._LOG.info("closing the cluster")
+    def request_cluster_restart(self):
+        """Stop admitting requests, so the cluster can be recreated
+        as soon as running requests finish"""
+        with self._restart_lock:
+            if self._restart_requested:
+                return
+            self._LOG.info(
+                "cluster will be recreated due to timeout when running"
+                " requests finish"
+            )
+            self._restart_requested = True
+            self._scheduler.pause()
+
+    def maybe_restart_cluster(self):
+        with self._restart_lock:
+            if (
+                self._restart_requested
+                and self._scheduler.stats()["running"] == 0
+            ):
+                self._LOG.info("recreating the cluster due to timeout")
                 self._dask_client.cluster.close()
-        if self._dask_client.cluster.status is Status.closed:
-            self._LOG.info("recreating the cluster")
-            self.create_dask_cluster()
+                self.create_dask_cluster()
+                self._restart_requested = False
+                self._scheduler.refresh_memory_limit()
+                self._scheduler.resume()
+            if self._dask_client.cluster.status is Status.failed:
+                self._LOG.info("attempt to restart the cluster...")
+                try:
+                    asyncio.run(self._nanny.restart())
+                except Exception as err:
+                    self._LOG.error(
+                        "couldn't restart the cluster due to an error: %s",
+                        err,
+                    )
+                    self._LOG.info("closing the cluster")
+                    self._dask_client.cluster.close()
+            if self._dask_client.cluster.status is Status.closed:
+                self._LOG.info("recreating the cluster")
+                self.create_dask_cluster()
 
     def ack_message(self, channel, delivery_tag):
         """Note that `channel` must be the same pika channel instance via which
@@ -304,104 +481,206 @@ class Executor(metaclass=LoggableMeta):
             )
             pass
 
-    def retry_until_timeout(
-        self,
-        future,
-        message: Message,
-        retries: int = 30,
-        sleep_time: int = 10,
-    ):
-        assert retries is not None, "`retries` cannot be `None`"
-        assert sleep_time is not None, "`sleep_time` cannot be `None`"
-        status = fail_reason = location_path = None
+    def publish_status(self, channel, request_id, status: RequestStatus):
+        """Publish the event of the request status change. Like
+        `ack_message`, it must be called in the thread of the connection.
+        The event is transient, as the database holds the status.
+        """
+        if not channel.is_open:
+            self._LOG.info(
+                "cannot publish status event. channel is closed!",
+                extra={"track_id": request_id},
+            )
+            return
         try:
-            self._LOG.debug(
-                "attempt to get result for the request",
-                extra={"track_id": message.request_id},
+            channel.basic_publish(
+                exchange=REQUEST_STATUS_EXCHANGE,
+                routing_key="",
+                body=json.dumps(
+                    {"request_id": int(request_id), "status": status.name}
+                ),
             )
-            for _ in range(retries):
-                if future.done():
-                    self._LOG.debug(
-                        "result is done",
-                        extra={"track_id": message.request_id},
-                    )
-                    location_path = future.result()
-                    status = RequestStatus.DONE
-                    self._LOG.debug(
-                        "result save under: %s",
-                        location_path,
-                        extra={"track_id": message.request_id},
-                    )
-                    break
-                self._LOG.debug(
-                    f"result is not ready yet. sleeping {sleep_time} sec",
-                    extra={"track_id": message.request_id},
-                )
-                time.sleep(sleep_time)
-            else:
-                self._LOG.info(
-                    "processing timout",
-                    extra={"track_id": message.request_id},
-                )
-                future.cancel()
-                status = RequestStatus.TIMEOUT
-                fail_reason = "Processing timeout"
-        except Exception as e:
-            self._LOG.error(
-                "failed to get result due to an error: %s",
-                e,
-                exc_info=True,
-                stack_info=True,
-                extra={"track_id": message.request_id},
+        except Exception as err:
+            self._LOG.warning(
+                "failed to publish status event: %s",
+                err,
+                extra={"track_id": request_id},
             )
-            status = RequestStatus.FAILED
-            fail_reason = f"{type(e).__name__}: {str(e)}"
-        return (location_path, status, fail_reason)
 
-    def handle_message(self, connection, channel, delivery_tag, body):
-        message: Message = Message(body)
-        self._LOG.debug(
-            "executing query: `%s`",
-            message.content,
-            extra={"track_id": message.request_id},
+    def notify_status(
+        self, connection, channel, request_id, status: RequestStatus
+    ):
+        cb = functools.partial(
+            self.publish_status, channel, request_id, status
         )
+        connection.add_callback_threadsafe(cb)
 
-        # TODO: estimation size should be updated, too
-        self._db.update_request(
+    def get_processing_timeout(self, message: Message) -> float:
+        """Get the processing timeout (in seconds) of the request. It is
+        defined by `processing_timeout_seconds` in the product metadata
+        or, by default, by the `PROCESSING_TIMEOUT_SEC` environment
+        variable"""
+        try:
+            metadata = Datastore().product_metadata(
+                message.dataset_id, message.product_id
+            )
+        except Exception:
+            metadata = {}
+        if (timeout := metadata.get("processing_timeout_seconds")) is not None:
+            return float(timeout)
+        return self._default_timeout
+
+    def admit_message(self, connection, channel, delivery_tag, body, lane):
+        """Pass the message to the scheduler with the estimated size,
+        the user and the lane of the request"""
+        message: Message = Message(body)
+        request = self._db.get_request_details(message.request_id)
+        job = Job(
             request_id=message.request_id,
-            worker_id=self._worker_id,
-            status=RequestStatus.RUNNING,
+            user_id=str(request.user_id) if request else "N/A",
+            estimate_bytes=request.estimate_size_bytes if request else None,
+            lane=lane,
+            start=functools.partial(
+                self._workers.submit,
+                self.handle_message,
+                connection,
+                channel,
+                delivery_tag,
+                message,
+            ),
+        )
+        self._scheduler.submit(job)
+
+    def handle_message(self, connection, channel, delivery_tag, message):
+        """Mark the request as running and submit it to the cluster.
+        The result is recorded by `finish_request` as soon as the job
+        completes or its deadline passes. No thread waits for the job."""
+        finish = functools.partial(
+            self._workers.submit,
+            self.finish_request,
+            connection,
+            channel,
+            delivery_tag,
+            message,
         )
-
         self._LOG.debug(
-            "submitting job for workflow request",
+            "executing query: `%s`",
+            message.content,
             extra={"track_id": message.request_id},
         )
-        future = self._dask_client.submit(
-            process,
-            message=message,
-            compute=False,
-        )
-        location_path, status, fail_reason = self.retry_until_timeout(
-            future,
-            message=message,
-            retries=int(os.environ.get("RESULT_CHECK_RETRIES")),
-        )
-        self._db.update_request(
-            request_id=message.request_id,
-            worker_id=self._worker_id,
-            status=status,
-            location_path=location_path,
-            size_bytes=self.get_size(location_path),
-            fail_reason=fail_reason,
+        try:
+            # TODO: estimation size should be updated, too
+            self._db.update_request(
+                request_id=message.request_id,
+                worker_id=self._worker_id,
+                status=RequestStatus.RUNNING,
+            )
+            self.notify_status(
+                connection, channel, message.request_id, RequestStatus.RUNNING
+            )
+            self._LOG.debug(
+                "submitting job for workflow request",
+                extra={"track_id": message.request_id},
+            )
+            future = self._dask_client.submit(
+                process,
+                message=message,
+                compute=False,
+            )
+        except Exception as err:
+            self._LOG.error(
+                "failed to submit the request due to an error: %s",
+                err,
+                exc_info=True,
+                extra={"track_id": message.request_id},
+            )
+            with self._lock:
+                self._in_flight[message.request_id] = None
+            finish(future=None, error=err)
+            return
+        with self._lock:
+            self._in_flight[message.request_id] = future
+        timeout = self.get_processing_timeout(message)
+        self._watchdog.watch(
+            message.request_id,
+            timeout,
+            on_expire=functools.partial(finish, future=future, timed_out=True),
         )
+        future.add_done_callback(lambda fut: finish(future=fut))
         self._LOG.debug(
-            "acknowledging request", extra={"track_id": message.request_id}
+            "job submitted with the timeout of %s sec",
+            timeout,
+            extra={"track_id": message.request_id},
         )
-        cb = functools.partial(self.ack_message, channel, delivery_tag)
-        connection.add_callback_threadsafe(cb)
 
-        self.maybe_restart_cluster(status)
+    def finish_request(
+        self,
+        connection,
+        channel,
+        delivery_tag,
+        message,
+        future,
+        timed_out: bool = False,
+        error: Exception | None = None,
+    ):
+        """Record the result of the request, acknowledge the message and
+        release the slot of the scheduler. Called once per request, either
+        on completion or on the deadline, whichever comes first."""
+        with self._lock:
+            if message.request_id not in self._in_flight:
+                return
+            del self._in_flight[message.request_id]
+        self._watchdog.cancel(message.request_id)
+        location_path = fail_reason = None
+        if timed_out:
+            self._LOG.info(
+                "processing timout", extra={"track_id": message.request_id}
+            )
+            future.cancel()
+            status = RequestStatus.TIMEOUT
+            fail_reason = "Processing timeout"
+        elif error is not None:
+            status = RequestStatus.FAILED
+            fail_reason = f"{type(error).__name__}: {str(error)}"
+        else:
+            try:
+                location_path = future.result()
+                status = RequestStatus.DONE
+                self._LOG.debug(
+                    "result save under: %s",
+                    location_path,
+                    extra={"track_id": message.request_id},
+                )
+            except Exception as e:
+                self._LOG.error(
+                    "failed to get result due to an error: %s",
+                    e,
+                    exc_info=True,
+                    stack_info=True,
+                    extra={"track_id": message.request_id},
+                )
+                status = RequestStatus.FAILED
+                fail_reason = f"{type(e).__name__}: {str(e)}"
+        try:
+            self._db.update_request(
+                request_id=message.request_id,
+                worker_id=self._worker_id,
+                status=status,
+                location_path=location_path,
+                size_bytes=self.get_size(location_path),
+                fail_reason=fail_reason,
+            )
+            self.notify_status(connection, channel, message.request_id, status)
+        finally:
+            self._LOG.debug(
+                "acknowledging request", extra={"track_id": message.request_id}
+            )
+            cb = functools.partial(self.ack_message, channel, delivery_tag)
+            connection.add_callback_threadsafe(cb)
+            if status is RequestStatus.TIMEOUT:
+                self.request_cluster_restart()
+            self._scheduler.release(message.request_id)
+            self.maybe_restart_cluster()
         self._LOG.debug(
             "request acknowledged", extra={"track_id": message.request_id}
         )
@@ -410,27 +689,35 @@ class Executor(metaclass=LoggableMeta):
         (connection, threads) = args
         delivery_tag = method_frame.delivery_tag
         t = threading.Thread(
-            target=self.handle_message,
-            args=(connection, channel, delivery_tag, body),
+            target=self.admit_message,
+            args=(
+                connection,
+                channel,
+                delivery_tag,
+                body,
+                method_frame.routing_key,
+            ),
         )
         t.start()
         threads.append(t)
 
     def subscribe(self, etype):
-        self._LOG.debug(
-            "subscribe channel: %s_queue", etype, extra={"track_id": "N/A"}
-        )
-        self._channel.queue_declare(queue=f"{etype}_queue", durable=True)
-        self._channel.basic_qos(prefetch_count=1)
-
         threads = []
         on_message_callback = functools.partial(
             self.on_message, args=(self._conn, threads)
         )
-
-        self._channel.basic_consume(
-            queue=f"{etype}_queue", on_message_callback=on_message_callback
-        )
+        for lane in get_lanes(etype):
+            self._LOG.debug(
+                "subscribe channel: %s", lane, extra={"track_id": "N/A"}
+            )
+            self._channel.queue_declare(queue=lane, durable=True)
+            # NOTE: prefetch count applies to consumers created
+            # afterwards, so each lane gets its own limit. The scheduler
+            # admits up to `max_in_flight` requests of all lanes
+            self._channel.basic_qos(prefetch_count=self._lane_prefetch)
+            self._channel.basic_consume(
+                queue=lane, on_message_callback=on_message_callback
+            )
 
     def listen(self):
         while True:
@@ -0,0 +1,214 @@
+"""Module with the admission scheduler of requests running concurrently"""
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from meta import LoggableMeta
+
+
+@dataclass
+class Job:
+    """Request waiting for the admission or running"""
+
+    request_id: str
+    user_id: str
+    estimate_bytes: int
+    start: Callable[[], None]
+    lane: str = "default"
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+class AdmissionScheduler(metaclass=LoggableMeta):
+    """Scheduler admitting requests for the concurrent execution.
+
+    A request is admitted if the number of running requests is below
+    `max_in_flight` and its estimated size (multiplied by
+    `memory_factor`) fits into the memory of the cluster not reserved
+    by the running requests. If nothing is running, the request is
+    admitted regardless of its size.
+
+    Jobs are grouped in lanes (e.g. queues of small and large requests)
+    served in the smooth weighted round-robin manner, according to
+    `lane_weights`. Within the lane, users are served in the round-robin
+    manner, so the user submitting many requests does not block others.
+    If the oldest waiting request waits longer than `starvation_sec`,
+    no other request is admitted until it starts, so large requests
+    are not starved by small ones.
+
+    Parameters
+    ----------
+    max_in_flight : int
+        Maximum number of requests running concurrently
+    memory_limit : callable
+        Function returning the total memory of the cluster (in bytes).
+        It can query the cluster, so it is called without holding
+        the lock, and its result is cached for `memory_limit_ttl_sec`
+    memory_factor : float
+        Ratio of the memory needed to process the request to its
+        estimated size
+    starvation_sec : float
+        Maximum waiting time before the request gets the precedence
+    lane_weights : dict, optional
+        Weights of lanes. Missing lanes have the weight of 1
+    memory_limit_ttl_sec : float
+        Time after which the memory limit is read again
+    """
+
+    _LOG = logging.getLogger("geokube.AdmissionScheduler")
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        memory_limit: Callable[[], int],
+        memory_factor: float = 2.0,
+        starvation_sec: float = 300.0,
+        lane_weights: dict[str, float] | None = None,
+        memory_limit_ttl_sec: float = 30.0,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.memory_factor = memory_factor
+        self.starvation_sec = starvation_sec
+        self._memory_limit = memory_limit
+        self.memory_limit_ttl_sec = memory_limit_ttl_sec
+        self._memory_limit_bytes = 0
+        self._memory_limit_expires_at = 0.0
+        self.lane_weights = dict(lane_weights or {})
+        self._lanes: dict[str, OrderedDict[str, deque[Job]]] = {}
+        self._lane_credits: dict[str, float] = {}
+        self._running: dict[str, Job] = {}
+        self._reserved_bytes = 0
+        self._paused = False
+        self._lock = threading.Lock()
+
+    def refresh_memory_limit(self) -> None:
+        """Read the memory limit again on the next admission, e.g. after
+        workers of the cluster changed"""
+        self._memory_limit_expires_at = 0.0
+
+    def _get_memory_limit(self) -> int:
+        if time.monotonic() >= self._memory_limit_expires_at:
+            limit_bytes = self._memory_limit()
+            # NOTE: the limit is unknown (e.g. the cluster is starting),
+            # so it is read again next time
+            if limit_bytes > 0:
+                self._memory_limit_expires_at = (
+                    time.monotonic() + self.memory_limit_ttl_sec
+                )
+            self._memory_limit_bytes = limit_bytes
+        return self._memory_limit_bytes
+
+    def _required_bytes(self, job: Job) -> int:
+        return int((job.estimate_bytes or 0) * self.memory_factor)
+
+    def submit(self, job: Job) -> None:
+        """Enqueue the job and start jobs which can be admitted"""
+        with self._lock:
+            self._lanes.setdefault(job.lane, OrderedDict()).setdefault(
+                job.user_id, deque()
+            ).append(job)
+        self._dispatch()
+
+    def release(self, request_id: str) -> None:
+        """Mark the job as finished and start jobs which can be admitted"""
+        with self._lock:
+            if (job := self._running.pop(request_id, None)) is not None:
+                self._reserved_bytes -= self._required_bytes(job)
+        self._dispatch()
+
+    def pause(self) -> None:
+        """Stop admitting new jobs. Running jobs are not affected"""
+        with self._lock:
+            self._paused = True
+
+    def resume(self) -> None:
+        """Resume admitting jobs"""
+        with self._lock:
+            self._paused = False
+        self._dispatch()
+
+    def _fits(self, job: Job, limit_bytes: int) -> bool:
+        if not self._running:
+            return True
+        return (
+            self._reserved_bytes + self._required_bytes(job) <= limit_bytes
+        )
+
+    def _heads(self, lane: str):
+        return (queue[0] for queue in self._lanes[lane].values())
+
+    def _oldest_starving_job(self) -> Job | None:
+        heads = [job for lane in self._lanes for job in self._heads(lane)]
+        if not heads:
+            return None
+        oldest = min(heads, key=lambda job: job.submitted_at)
+        if time.monotonic() - oldest.submitted_at > self.starvation_sec:
+            return oldest
+        return None
+
+    def _select(self, limit_bytes: int) -> Job | None:
+        if self._paused or len(self._running) >= self.max_in_flight:
+            return None
+        if (starving := self._oldest_starving_job()) is not None:
+            return starving if self._fits(starving, limit_bytes) else None
+        candidates = {}
+        for lane in self._lanes:
+            for job in self._heads(lane):
+                if self._fits(job, limit_bytes):
+                    candidates[lane] = job
+                    break
+        if not candidates:
+            return None
+        # NOTE: smooth weighted round-robin among lanes with jobs
+        # which can be admitted
+        total = 0.0
+        for lane in candidates:
+            weight = self.lane_weights.get(lane, 1.0)
+            self._lane_credits[lane] = self._lane_credits.get(lane, 0) + weight
+            total += weight
+        lane = max(candidates, key=lambda name: self._lane_credits[name])
+        self._lane_credits[lane] -= total
+        return candidates[lane]
+
+    def _dispatch(self) -> None:
+        to_start = []
+        if not self._lanes:
+            return
+        # NOTE: read outside the lock, so `submit` and `release` do not
+        # wait for the round trip to the cluster
+        limit_bytes = self._get_memory_limit()
+        with self._lock:
+            while (job := self._select(limit_bytes)) is not None:
+                queues = self._lanes[job.lane]
+                queue = queues.pop(job.user_id)
+                queue.popleft()
+                if queue:
+                    # NOTE: the user goes to the end of the round-robin
+                    queues[job.user_id] = queue
+                elif not queues:
+                    del self._lanes[job.lane]
+                self._running[job.request_id] = job
+                self._reserved_bytes += self._required_bytes(job)
+                to_start.append(job)
+        for job in to_start:
+            self._LOG.debug(
+                "admitting request with estimated size %s bytes",
+                job.estimate_bytes,
+                extra={"track_id": job.request_id},
+            )
+            job.start()
+
+    def stats(self) -> dict:
+        """Get the number of running and waiting jobs"""
+        with self._lock:
+            return {
+                "running": len(self._running),
+                "paused": self._paused,
+                "waiting": {
+                    lane: sum(len(queue) for queue in queues.values())
+                    for lane, queues in self._lanes.items()
+                },
+                "reserved_bytes": self._reserved_bytes,
+            }
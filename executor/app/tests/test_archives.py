@@ -0,0 +1,105 @@
+import io
+import os
+import json
+import hashlib
+import tarfile
+import zipfile
+
+import pytest
+import zstandard
+
+from archives import MANIFEST_NAME, ArchiveBuilder
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for name, size in (("a.nc", 3000), ("b.nc", 10)):
+        path = tmp_path / name
+        path.write_bytes(os.urandom(size))
+        paths.append(path)
+    yield paths
+
+
+def _digests(paths):
+    return {
+        path.name: hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in paths
+    }
+
+
+def test_zip_round_trip_with_manifest(files, tmp_path):
+    expected = _digests(files)
+    contents = {path.name: path.read_bytes() for path in files}
+    with ArchiveBuilder(tmp_path / "result", compression="deflate") as archive:
+        for path in files:
+            archive.add(path)
+    assert archive.path == f"{tmp_path / 'result'}.zip"
+    assert not any(path.exists() for path in files)
+    with zipfile.ZipFile(archive.path) as zip_file:
+        for name, data in contents.items():
+            assert zip_file.read(name) == data
+        manifest = json.loads(zip_file.read(MANIFEST_NAME))
+    assert manifest["compression"] == "deflate"
+    assert {
+        entry["name"]: entry["sha256"] for entry in manifest["files"]
+    } == expected
+    with open(f"{archive.path}.{MANIFEST_NAME}", "rb") as file:
+        assert json.load(file) == manifest
+
+
+def test_zip64_is_used_for_large_files(files, tmp_path, monkeypatch):
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1024)
+    with ArchiveBuilder(tmp_path / "result", compression="stored") as archive:
+        for path in files:
+            archive.add(path)
+    with zipfile.ZipFile(archive.path) as zip_file:
+        assert zip_file.getinfo("a.nc").extract_version == (
+            zipfile.ZIP64_VERSION
+        )
+        assert zip_file.testzip() is None
+
+
+def test_tar_zst_round_trip(files, tmp_path):
+    contents = {path.name: path.read_bytes() for path in files}
+    with ArchiveBuilder(
+        tmp_path / "result", compression="zstd", threads=2
+    ) as archive:
+        for path in files:
+            archive.add(path)
+    assert archive.path.endswith(".tar.zst")
+    with open(archive.path, "rb") as file:
+        data = zstandard.ZstdDecompressor().stream_reader(file).read()
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        for name, content in contents.items():
+            assert tar.extractfile(name).read() == content
+        manifest = json.load(tar.extractfile(MANIFEST_NAME))
+    assert len(manifest["files"]) == len(files)
+
+
+def test_part_file_is_renamed_on_close(files, tmp_path):
+    archive = ArchiveBuilder(tmp_path / "result")
+    archive.add(files[0])
+    assert os.path.exists(f"{archive.path}.part")
+    assert not os.path.exists(archive.path)
+    archive.close()
+    assert os.path.exists(archive.path)
+    assert not os.path.exists(f"{archive.path}.part")
+
+
+def test_incomplete_archive_is_removed_on_failure(files, tmp_path):
+    with pytest.raises(RuntimeError):
+        with ArchiveBuilder(tmp_path / "result") as archive:
+            archive.add(files[0])
+            raise RuntimeError
+    assert not os.path.exists(archive.path)
+    assert not os.path.exists(f"{archive.path}.part")
+    assert not os.path.exists(f"{archive.path}.{MANIFEST_NAME}")
+
+
+def test_manifest_can_be_skipped(files, tmp_path):
+    with ArchiveBuilder(tmp_path / "result", manifest=False) as archive:
+        archive.add(files[0])
+    with zipfile.ZipFile(archive.path) as zip_file:
+        assert zip_file.namelist() == ["a.nc"]
+    assert not os.path.exists(f"{archive.path}.{MANIFEST_NAME}")
@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+from scheduler import AdmissionScheduler, Job
+
+
+@pytest.fixture
+def started():
+    yield []
+
+
+def _job(started, request_id, user_id="user", size=0, lane="default"):
+    return Job(
+        request_id=request_id,
+        user_id=user_id,
+        estimate_bytes=size,
+        start=lambda: started.append(request_id),
+        lane=lane,
+    )
+
+
+def _scheduler(max_in_flight=1, memory_bytes=100, **kwargs):
+    return AdmissionScheduler(
+        max_in_flight=max_in_flight,
+        memory_limit=lambda: memory_bytes,
+        memory_factor=1.0,
+        **kwargs,
+    )
+
+
+def _drain(scheduler, started):
+    while sum(scheduler.stats()["waiting"].values()):
+        scheduler.release(started[-1])
+
+
+def test_admission_by_estimated_size(started):
+    scheduler = _scheduler(max_in_flight=4)
+    scheduler.submit(_job(started, "a", user_id="a", size=60))
+    scheduler.submit(_job(started, "b", user_id="b", size=60))
+    scheduler.submit(_job(started, "c", user_id="c", size=40))
+    assert started == ["a", "c"]
+    assert scheduler.stats()["reserved_bytes"] == 100
+    scheduler.release("a")
+    assert started == ["a", "c", "b"]
+
+
+def test_large_request_admitted_when_idle(started):
+    scheduler = _scheduler(max_in_flight=4)
+    scheduler.submit(_job(started, "a", size=1000))
+    assert started == ["a"]
+
+
+def test_max_in_flight(started):
+    scheduler = _scheduler(max_in_flight=2)
+    for request_id in "abc":
+        scheduler.submit(_job(started, request_id))
+    assert started == ["a", "b"]
+    assert scheduler.stats()["waiting"] == {"default": 1}
+
+
+def test_users_served_round_robin(started):
+    scheduler = _scheduler()
+    scheduler.pause()
+    for request_id in ("a1", "a2", "a3"):
+        scheduler.submit(_job(started, request_id, user_id="a"))
+    scheduler.submit(_job(started, "b1", user_id="b"))
+    scheduler.resume()
+    _drain(scheduler, started)
+    assert started == ["a1", "b1", "a2", "a3"]
+
+
+def test_lanes_served_according_to_weights(started):
+    scheduler = _scheduler(lane_weights={"small": 3, "large": 1})
+    scheduler.pause()
+    for i in range(8):
+        scheduler.submit(_job(started, f"s{i}", user_id=str(i), lane="small"))
+        scheduler.submit(_job(started, f"l{i}", user_id=str(i), lane="large"))
+    scheduler.resume()
+    _drain(scheduler, started)
+    first = started[:8]
+    assert sum(request_id.startswith("s") for request_id in first) == 6
+    assert sum(request_id.startswith("l") for request_id in first) == 2
+
+
+def test_starving_request_takes_precedence(started):
+    scheduler = _scheduler(max_in_flight=4, starvation_sec=60)
+    scheduler.submit(_job(started, "running", size=50))
+    starving = _job(started, "large", user_id="a", size=80)
+    starving.submitted_at = time.monotonic() - 120
+    scheduler.submit(starving)
+    scheduler.submit(_job(started, "small", user_id="b", size=10))
+    assert started == ["running"]
+    scheduler.release("running")
+    assert started == ["running", "large", "small"]
+
+
+def test_requests_not_starving_are_admitted_out_of_order(started):
+    scheduler = _scheduler(max_in_flight=4, starvation_sec=60)
+    scheduler.submit(_job(started, "running", size=50))
+    scheduler.submit(_job(started, "large", user_id="a", size=80))
+    scheduler.submit(_job(started, "small", user_id="b", size=10))
+    assert started == ["running", "small"]
+
+
+def test_memory_limit_read_outside_lock_and_cached(started):
+    calls = []
+
+    def memory_limit():
+        assert not scheduler._lock.locked()
+        calls.append(1)
+        return 100
+
+    scheduler = AdmissionScheduler(
+        max_in_flight=4, memory_limit=memory_limit, memory_limit_ttl_sec=60
+    )
+    for request_id in "abc":
+        scheduler.submit(_job(started, request_id, size=10))
+        scheduler.release(request_id)
+    assert len(calls) == 1
+    scheduler.refresh_memory_limit()
+    scheduler.submit(_job(started, "d"))
+    assert len(calls) == 2
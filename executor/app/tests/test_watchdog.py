@@ -0,0 +1,72 @@
+import time
+import threading
+
+import pytest
+
+from watchdog import DeadlineWatchdog
+
+
+@pytest.fixture
+def watchdog():
+    yield DeadlineWatchdog()
+
+
+class _Expired:
+    def __init__(self):
+        self.request_ids = []
+        self.event = threading.Event()
+
+    def callback(self, request_id):
+        def on_expire():
+            self.request_ids.append(request_id)
+            self.event.set()
+
+        return on_expire
+
+
+def test_callbacks_called_in_order_of_deadlines(watchdog):
+    expired = _Expired()
+    watchdog.watch("late", 0.2, expired.callback("late"))
+    watchdog.watch("early", 0.05, expired.callback("early"))
+    time.sleep(0.4)
+    assert expired.request_ids == ["early", "late"]
+
+
+def test_callback_not_called_before_deadline(watchdog):
+    expired = _Expired()
+    start = time.monotonic()
+    watchdog.watch("a", 0.1, expired.callback("a"))
+    assert expired.event.wait(timeout=1)
+    assert time.monotonic() - start >= 0.1
+
+
+def test_cancelled_request_does_not_expire(watchdog):
+    expired = _Expired()
+    watchdog.watch("finished", 0.05, expired.callback("finished"))
+    watchdog.watch("running", 0.1, expired.callback("running"))
+    watchdog.cancel("finished")
+    time.sleep(0.3)
+    assert expired.request_ids == ["running"]
+
+
+def test_watching_again_replaces_deadline(watchdog):
+    expired = _Expired()
+    watchdog.watch("a", 0.05, expired.callback("a"))
+    watchdog.watch("a", 0.3, expired.callback("a"))
+    time.sleep(0.15)
+    assert expired.request_ids == []
+    assert expired.event.wait(timeout=1)
+    time.sleep(0.1)
+    assert expired.request_ids == ["a"]
+
+
+def test_failing_callback_does_not_stop_watchdog(watchdog):
+    expired = _Expired()
+
+    def fail():
+        raise RuntimeError("callback error")
+
+    watchdog.watch("failing", 0.01, fail)
+    watchdog.watch("a", 0.05, expired.callback("a"))
+    assert expired.event.wait(timeout=1)
+    assert expired.request_ids == ["a"]
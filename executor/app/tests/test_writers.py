@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from writers import NetCDFWriter
+
+
+def _block_nbytes(dset):
+    return max(
+        var.data.blocks[index].nbytes
+        for var in dset.data_vars.values()
+        for index in np.ndindex(var.data.numblocks)
+    )
+
+
+@pytest.fixture
+def timeless_dataset():
+    yield xr.Dataset(
+        {
+            "orog": (
+                ("latitude", "longitude"),
+                np.random.rand(50, 200).astype("float32"),
+            ),
+            "lsm": (("longitude",), np.ones(200, dtype="float32")),
+        },
+        coords={
+            "latitude": np.linspace(30, 50, 50),
+            "longitude": np.linspace(0, 40, 200),
+        },
+    )
+
+
+def test_time_dataset_split_along_time():
+    dset = xr.Dataset(
+        {"tas": (("time", "points"), np.zeros((100, 10)))},
+        coords={"time": pd.date_range("2001-01-01", periods=100, freq="h")},
+    )
+    split = NetCDFWriter(memory_budget_bytes=800)._split(dset)
+    assert split.chunks["time"][0] == 10
+    assert _block_nbytes(split) <= 800
+
+
+def test_timeless_dataset_blocks_stay_under_budget(timeless_dataset):
+    budget = 4 * 1024
+    split = NetCDFWriter(memory_budget_bytes=budget)._split(timeless_dataset)
+    assert len(split.chunks["longitude"]) > 1
+    assert _block_nbytes(split) <= budget
+
+
+def test_timeless_dataset_round_trip(timeless_dataset, tmp_path):
+    path = NetCDFWriter(memory_budget_bytes=4 * 1024).write(
+        timeless_dataset, tmp_path / "orog.nc"
+    )
+    with xr.open_dataset(path) as result:
+        xr.testing.assert_allclose(result, timeless_dataset)
@@ -0,0 +1,69 @@
+"""Module with the watchdog of deadlines of running requests"""
+import time
+import heapq
+import logging
+import threading
+from typing import Callable
+
+from meta import LoggableMeta
+
+
+class DeadlineWatchdog(metaclass=LoggableMeta):
+    """Single background thread calling `on_expire` callbacks of requests
+    whose deadlines passed. Callbacks of cancelled (finished) requests are
+    not called.
+    """
+
+    _LOG = logging.getLogger("geokube.DeadlineWatchdog")
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, str]] = []
+        self._callbacks: dict[str, tuple[float, Callable[[], None]]] = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="deadline-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def watch(
+        self, request_id: str, timeout: float, on_expire: Callable[[], None]
+    ) -> None:
+        """Call `on_expire` if the request is not cancelled within
+        `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._callbacks[request_id] = (deadline, on_expire)
+            heapq.heappush(self._heap, (deadline, request_id))
+            self._cond.notify()
+
+    def cancel(self, request_id: str) -> None:
+        """Stop watching the request"""
+        with self._cond:
+            self._callbacks.pop(request_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, request_id = self._heap[0]
+                if (delay := deadline - time.monotonic()) > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                heapq.heappop(self._heap)
+                entry = self._callbacks.get(request_id)
+                # NOTE: skip cancelled requests and stale deadlines
+                # of requests watched again
+                if entry is None or entry[0] != deadline:
+                    continue
+                del self._callbacks[request_id]
+                on_expire = entry[1]
+            try:
+                on_expire()
+            except Exception as err:
+                self._LOG.error(
+                    "deadline callback failed: %s",
+                    err,
+                    exc_info=True,
+                    extra={"track_id": request_id},
+                )
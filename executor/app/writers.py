@@ -0,0 +1,234 @@
+"""Module with writers of results streaming data with bounded memory"""
+import os
+import shutil
+import logging
+from typing import Optional
+
+import numpy as np
+import xarray as xr
+from dask.delayed import Delayed
+from distributed import get_worker, worker_client
+
+from meta import LoggableMeta
+from archives import ArchiveBuilder
+
+DEFAULT_WRITER_MEMORY_BUDGET_BYTES = 256 * 1024**2
+DEFAULT_NETCDF_COMPRESSION_LEVEL = 4
+_TIME_DIMS = ("time", "xtime")
+
+
+def _parse_chunks(value: str) -> dict[str, int]:
+    """Parse chunk sizes given as `dim1:size1,dim2:size2`"""
+    chunks = {}
+    for item in filter(None, map(str.strip, value.split(","))):
+        dim, _, size = item.partition(":")
+        chunks[dim.strip()] = int(size)
+    return chunks
+
+
+def _find_time_dim(dset: xr.Dataset) -> Optional[str]:
+    for dim in dset.dims:
+        if str(dim).lower() in _TIME_DIMS:
+            return dim
+        if dim in dset.coords and np.issubdtype(
+            dset[dim].dtype, np.datetime64
+        ):
+            return dim
+    return None
+
+
+def _compute(delayed: Delayed) -> None:
+    """Compute the delayed object with the cluster. If called from
+    the task running on a Dask worker, the task leaves the worker's
+    thread pool while waiting, so it does not block other tasks."""
+    try:
+        get_worker()
+    except ValueError:
+        delayed.compute()
+        return
+    with worker_client() as client:
+        client.compute(delayed).result()
+
+
+class NetCDFWriter(metaclass=LoggableMeta):
+    """Writer of netCDF files streaming data chunk by chunk.
+
+    The dataset is split along the time dimension (or the largest one
+    if there is no time) into blocks whose size does not exceed
+    `memory_budget_bytes`, unless a single step along that dimension
+    does. Blocks are computed by Dask and written one by one, so
+    the whole result is never held in memory.
+    The file is written under the temporary name and renamed once
+    completed, so partial files are never visible.
+
+    Parameters
+    ----------
+    memory_budget_bytes : int
+        Maximum size (in bytes) of the block of data computed at once
+    compression_level : int
+        Level of the zlib compression (`0` disables compression)
+    chunks : dict, optional
+        Sizes of netCDF chunks along dimensions. Chunks along other
+        dimensions are aligned to blocks
+    """
+
+    _LOG = logging.getLogger("geokube.NetCDFWriter")
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = DEFAULT_WRITER_MEMORY_BUDGET_BYTES,
+        compression_level: int = DEFAULT_NETCDF_COMPRESSION_LEVEL,
+        chunks: Optional[dict[str, int]] = None,
+    ) -> None:
+        self.memory_budget_bytes = memory_budget_bytes
+        self.compression_level = compression_level
+        self.chunks = dict(chunks or {})
+
+    def _steps_per_block(self, dset: xr.Dataset, dim: str) -> int:
+        step_bytes = sum(
+            var.nbytes // max(var.sizes[dim], 1)
+            for var in dset.data_vars.values()
+            if dim in var.dims
+        )
+        if step_bytes == 0:
+            return dset.sizes[dim]
+        return max(1, self.memory_budget_bytes // step_bytes)
+
+    def _split(self, dset: xr.Dataset) -> xr.Dataset:
+        """Split the dataset along the time dimension or, without time,
+        along the largest dimension of data variables"""
+        if (dim := _find_time_dim(dset)) is None:
+            dims = {
+                dim: size
+                for var in dset.data_vars.values()
+                for dim, size in var.sizes.items()
+            }
+            if not dims:
+                return dset.chunk()
+            dim = max(dims, key=dims.get)
+        steps = self._steps_per_block(dset, dim)
+        return dset.chunk({dim: steps})
+
+    def _encoding(self, dset: xr.Dataset) -> None:
+        for var in dset.data_vars.values():
+            if var.ndim == 0:
+                continue
+            chunksizes = tuple(
+                min(self.chunks.get(dim, var.chunksizes[dim][0]), size)
+                for dim, size in var.sizes.items()
+            )
+            var.encoding.update(
+                zlib=self.compression_level > 0,
+                complevel=self.compression_level,
+                shuffle=self.compression_level > 0,
+                contiguous=False,
+                chunksizes=chunksizes,
+            )
+            # NOTE: encoding of the source could conflict with the new one
+            var.encoding.pop("compression", None)
+            var.encoding.pop("original_shape", None)
+
+    def write(self, dset: xr.Dataset, path: str | os.PathLike) -> str:
+        """Write the dataset to the netCDF file
+
+        Parameters
+        ----------
+        dset : xarray.Dataset
+            Lazy (or loaded) dataset to write
+        path : str or os.PathLike
+            Path of the netCDF file
+
+        Returns
+        -------
+        path : str
+            Path of the written file
+        """
+        dset = self._split(dset)
+        self._encoding(dset)
+        part_path = f"{path}.part"
+        self._LOG.debug(
+            "writing netCDF file %s in blocks of %s",
+            path,
+            dict(dset.chunks),
+            extra={"track_id": os.path.basename(path)},
+        )
+        try:
+            delayed = dset.to_netcdf(part_path, compute=False)
+            _compute(delayed)
+            os.replace(part_path, path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        return str(path)
+
+
+def make_netcdf_writer() -> NetCDFWriter:
+    """Create the netCDF writer configured with environment variables"""
+    return NetCDFWriter(
+        memory_budget_bytes=int(
+            os.environ.get(
+                "WRITER_MEMORY_BUDGET_BYTES",
+                DEFAULT_WRITER_MEMORY_BUDGET_BYTES,
+            )
+        ),
+        compression_level=int(
+            os.environ.get(
+                "NETCDF_COMPRESSION_LEVEL", DEFAULT_NETCDF_COMPRESSION_LEVEL
+            )
+        ),
+        chunks=_parse_chunks(os.environ.get("NETCDF_CHUNKS", "")),
+    )
+
+
+def _align_chunks(dset: xr.Dataset) -> xr.Dataset:
+    """Make chunks of all variables uniform along each dimension (except
+    for the last chunk), as required by Zarr. Source chunks are kept
+    where they are already uniform. Loaded data are split into chunks
+    of the size bounded by Dask (`array.chunk-size`)."""
+    dset = dset.chunk("auto") if not dset.chunks else dset.unify_chunks()
+    return dset.chunk({dim: sizes[0] for dim, sizes in dset.chunks.items()})
+
+
+def write_zipped_zarr(dset: xr.Dataset, path: str | os.PathLike) -> str:
+    """Write the dataset to the Zarr store zipped without compression
+    (chunks are already compressed), so it can be read lazily, e.g. with
+    `zarr.storage.ZipStore`.
+
+    Chunks of the store are aligned to Dask chunks, so each task writes
+    its own chunk files and data are not gathered in one process.
+
+    Parameters
+    ----------
+    dset : xarray.Dataset
+        Lazy (or loaded) dataset to write
+    path : str or os.PathLike
+        Path of the store without the `.zip` extension
+
+    Returns
+    -------
+    path : str
+        Path of the zipped store
+    """
+    dset = _align_chunks(dset)
+    for var in dset.variables.values():
+        # NOTE: encoding of the source could conflict with new chunks
+        for key in ("chunks", "preferred_chunks", "chunksizes"):
+            var.encoding.pop(key, None)
+    store_path = f"{path}.part"
+    try:
+        _compute(dset.to_zarr(store_path, mode="w", compute=False))
+        # NOTE: the manifest would be put in the root of the store
+        with ArchiveBuilder(
+            path, compression="stored", manifest=False
+        ) as archive:
+            for root, _, files in os.walk(store_path):
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    archive.add(
+                        file_path,
+                        arcname=os.path.relpath(file_path, store_path),
+                    )
+    finally:
+        shutil.rmtree(store_path, ignore_errors=True)
+    return archive.path